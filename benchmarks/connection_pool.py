@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""
+Measure how many requests per second the client can make against a local stub slick server, comparing a new
+connection per request (what the module level requests.get did) with the pooled keep-alive session owned by
+SlickConnection.
+
+Usage: python benchmarks/connection_pool.py [--requests N] [--threads N]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import requests
+
+from slickqa import SlickConnection
+from slickqa.tests.stubserver import StubSlickServer
+
+
+def run(label, func, count, threads):
+    per_thread = count // threads
+    workers = [threading.Thread(target=lambda: [func() for i in range(per_thread)]) for t in range(threads)]
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - start
+    print("%-32s %8.1f requests/sec" % (label, (per_thread * threads) / elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=1)
+    args = parser.parse_args()
+
+    with StubSlickServer() as server:
+        server.add_route('GET', '/api/projects/1', {'id': '1', 'name': 'benchmark'})
+        url = server.url + '/api/projects/1'
+
+        run("requests.get (no pool)", lambda: requests.get(url), args.requests, args.threads)
+
+        slick = SlickConnection(server.url, keep_alive=False)
+        run("SlickConnection keep_alive=False", lambda: slick.projects('1').get(), args.requests, args.threads)
+        slick.close()
+
+        slick = SlickConnection(server.url, pool_maxsize=max(10, args.threads))
+        run("SlickConnection (pooled)", lambda: slick.projects('1').get(), args.requests, args.threads)
+        slick.close()
+
+
+if __name__ == '__main__':
+    main()
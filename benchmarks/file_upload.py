@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""
+Measure file upload throughput (MB/s) of StoredFileApiPart.upload_local_file against a local stub slick server,
+comparing sending each chunk in turn (max_in_flight=0) with pipelined reading/hashing, for a few chunk sizes.
+
+Usage: python benchmarks/file_upload.py [--size MB] [--latency MS]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from slickqa import SlickConnection
+from slickqa.tests.stubserver import StubSlickServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=64, help="size of the uploaded file in MB")
+    parser.add_argument('--latency', type=float, default=2.0, help="simulated server time per chunk in ms")
+    args = parser.parse_args()
+
+    def addchunk(request):
+        time.sleep(args.latency / 1000.0)
+        return 200, {}
+
+    with StubSlickServer() as server:
+        server.add_route('POST', '/api/files', lambda request: (200, dict(request.json(), id='f1')))
+        server.add_route('POST', '/api/files/f1/addchunk', addchunk)
+        server.add_route('PUT', '/api/files/f1', lambda request: (200, request.json()))
+        slick = SlickConnection(server.url)
+
+        with tempfile.NamedTemporaryFile(suffix='.bin') as local_file:
+            local_file.write(os.urandom(args.size * 1024 * 1024))
+            local_file.flush()
+            for chunk_size in (256 * 1024, 1024 * 1024, 4 * 1024 * 1024):
+                for max_in_flight in (0, 4):
+                    start = time.time()
+                    slick.files.upload_local_file(local_file.name, chunk_size=chunk_size, max_in_flight=max_in_flight)
+                    elapsed = time.time() - start
+                    print("chunk size %5d KB, max_in_flight %d: %8.1f MB/s" % (chunk_size // 1024, max_in_flight,
+                                                                            args.size / elapsed))
+        slick.close()
+
+
+if __name__ == '__main__':
+    main()
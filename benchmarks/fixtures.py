@@ -0,0 +1,127 @@
+"""
+Generated payloads shaped like the large objects slick returns, for the benchmarks.  The same seed always generates
+the same payloads, so numbers from different runs (and commits) are comparable.
+"""
+import random
+
+BASE_TIME = 1500000000000
+
+
+def _id(rand):
+    return '%024x' % rand.getrandbits(96)
+
+
+def _words(rand, count):
+    return ' '.join(rand.choice(('test', 'slick', 'result', 'build', 'step', 'verify', 'login', 'page', 'timeout',
+                                 'element', 'clicked', 'expected', 'actual', 'value', 'request'))
+                    for _ in range(count))
+
+
+def log_entry(rand, i):
+    entry = {
+        'entryTime': BASE_TIME + i * 37,
+        'level': rand.choice(('DEBUG', 'INFO', 'WARN', 'ERROR')),
+        'loggerName': 'tests.suite.module%d' % rand.randint(1, 20),
+        'message': _words(rand, rand.randint(4, 30)),
+    }
+    if rand.random() < 0.05:
+        entry['exceptionClassName'] = 'AssertionError'
+        entry['exceptionMessage'] = _words(rand, 8)
+        entry['exceptionStackTrace'] = ['  File "test_%d.py", line %d, in test' % (rand.randint(1, 50), n)
+                                        for n in range(rand.randint(3, 15))]
+    return entry
+
+
+def result(log_entries=2000, seed=1):
+    """A Result with log_entries LogEntry items (and the usual references, files, links and history)."""
+    rand = random.Random(seed)
+    return {
+        'id': _id(rand),
+        'testrun': {'testrunId': _id(rand), 'name': 'Nightly Regression'},
+        'config': {'configId': _id(rand), 'name': 'Chrome', 'configType': 'ENVIRONMENT', 'filename': 'chrome.xml'},
+        'testcase': {'testcaseId': _id(rand), 'name': 'Login with a valid user', 'automationId': 'tests.login.valid',
+                     'automationKey': 'login-valid', 'automationTool': 'pytest'},
+        'recorded': BASE_TIME,
+        'started': BASE_TIME - 60000,
+        'finished': BASE_TIME,
+        'status': 'FAIL',
+        'runstatus': 'FINISHED',
+        'reason': _words(rand, 20),
+        'attributes': {'browser': 'chrome', 'retry': '0', 'worker': 'gw3'},
+        'files': [{'id': _id(rand), 'filename': 'screenshot%d.png' % i, 'chunkSize': 262144, 'mimetype': 'image/png',
+                   'md5': '%032x' % rand.getrandbits(128), 'length': rand.randint(10000, 900000)}
+                  for i in range(5)],
+        'links': [{'name': 'link %d' % i, 'url': 'http://ci.example.com/job/%d' % i} for i in range(3)],
+        'log': [log_entry(rand, i) for i in range(log_entries)],
+        'project': {'id': _id(rand), 'name': 'Web Store'},
+        'component': {'id': _id(rand), 'name': 'Login', 'code': 'login'},
+        'release': {'releaseId': _id(rand), 'name': '4.2'},
+        'build': {'buildId': _id(rand), 'name': '4.2.1187'},
+        'runlength': 60000,
+        'history': [{'resultId': _id(rand), 'status': rand.choice(('PASS', 'FAIL')), 'recorded': BASE_TIME - i * 86400000,
+                     'build': {'buildId': _id(rand), 'name': '4.2.%d' % (1187 - i)}} for i in range(10)],
+        'hostname': 'ci-worker-3',
+        'requirements': ['REQ-%d' % i for i in range(4)],
+    }
+
+
+def project(releases=300, builds_per_release=10, seed=2):
+    """A Project with releases Releases, each with builds_per_release Builds, and some components."""
+    rand = random.Random(seed)
+    return {
+        'id': _id(rand),
+        'name': 'Web Store',
+        'description': _words(rand, 30),
+        'configuration': {'id': _id(rand), 'name': 'Web Store Configuration', 'configurationType': 'PROJECT',
+                          'configurationData': {'owner': 'qa', 'notify': 'true'}},
+        'defaultRelease': _id(rand),
+        'releases': [{'id': _id(rand), 'name': '%d.%d' % (r // 10, r % 10), 'target': BASE_TIME + r * 86400000,
+                      'defaultBuild': _id(rand), 'status': 'active',
+                      'builds': [{'id': _id(rand), 'name': '%d.%d.%d' % (r // 10, r % 10, b),
+                                  'built': BASE_TIME + r * 86400000 + b * 3600000, 'description': _words(rand, 5)}
+                                 for b in range(builds_per_release)]}
+                     for r in range(releases)],
+        'lastUpdated': BASE_TIME,
+        'tags': ['web', 'store', 'nightly'],
+        'attributes': {'team': 'checkout'},
+        'automationTools': ['pytest', 'selenium'],
+        'components': [{'id': _id(rand), 'name': 'Component %d' % c, 'code': 'c%d' % c, 'description': _words(rand, 6),
+                        'features': [{'id': _id(rand), 'name': 'Feature %d' % f, 'description': _words(rand, 6)}
+                                     for f in range(5)]}
+                       for c in range(20)],
+        'datadrivenProperties': [],
+    }
+
+
+def testrungroup(testruns=50, seed=3):
+    """A TestrunGroup with testruns nested Testruns, each with a summary."""
+    rand = random.Random(seed)
+    statuses = ['PASS', 'FAIL', 'BROKEN_TEST', 'NOT_TESTED', 'SKIPPED', 'NO_RESULT', 'CANCELLED', 'PASSED_ON_RETRY']
+    return {
+        'id': _id(rand),
+        'name': 'Release 4.2 Certification',
+        'created': BASE_TIME,
+        'groupType': 'PARALLEL',
+        'testruns': [{'id': _id(rand), 'name': 'Testrun %d' % t, 'testplanId': _id(rand),
+                      'config': {'configId': _id(rand), 'name': 'Chrome', 'configType': 'ENVIRONMENT'},
+                      'project': {'id': _id(rand), 'name': 'Web Store'},
+                      'dateCreated': BASE_TIME, 'runStarted': BASE_TIME, 'runFinshed': BASE_TIME + 3600000,
+                      'release': {'releaseId': _id(rand), 'name': '4.2'},
+                      'build': {'buildId': _id(rand), 'name': '4.2.1187'},
+                      'summary': {'totalTime': rand.randint(1000, 100000),
+                                  'resultsByStatus': dict((status, rand.randint(0, 500)) for status in statuses),
+                                  'statusListOrdered': statuses, 'total': 2000},
+                      'files': [], 'links': [], 'info': _words(rand, 10), 'state': 'FINISHED',
+                      'attributes': {'jenkins': 'job-%d' % t}, 'requirements': []}
+                     for t in range(testruns)],
+        'groupSummary': {'totalTime': 0, 'resultsByStatus': dict((status, 0) for status in statuses),
+                         'statusListOrdered': statuses, 'total': 0},
+    }
+
+
+# name: (model class name in slickqa.data, payload generator)
+FIXTURES = {
+    'result_2000_logs': ('Result', result),
+    'project_300_releases': ('Project', project),
+    'testrungroup_50_testruns': ('TestrunGroup', testrungroup),
+}
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Measure parsing ISO-8601 timestamps (like DateTimeField does) with PySO8601.parse, with and without it's memo, comparing
+it with the parser it replaced, which tried each format's regex in turn and ran strptime on every match.
+
+The timestamps are mostly the extended format slick and python write (some with fractions, some with offsets), with
+a few in other formats, and repeat the way the timestamps in a big response do.
+
+Usage: python benchmarks/iso8601.py [--count N] [--distinct N] [--memo-size N]
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, '..'))
+
+from slickqa.micromodels.packages import PySO8601
+from slickqa.micromodels.packages.PySO8601 import datetimestamps
+
+
+def previous_parse(representation):
+    """PySO8601.parse as it was before the extended format fast path, for dates (which is all this benchmark uses)."""
+    datestring = str(representation).upper().strip()
+    for regex, pattern in datetimestamps.DATE_FORMATS:
+        if regex.match(datestring):
+            found = regex.search(datestring).groupdict()
+            dt = datetime.datetime.utcnow().strptime(found['matched'], pattern)
+            if 'fraction' in found and found['fraction'] is not None:
+                dt = dt.replace(microsecond=int(found['fraction'][1:]))
+            if 'timezone' in found and found['timezone'] is not None:
+                dt = dt.replace(tzinfo=PySO8601.Timezone(found.get('timezone', '')))
+            return dt
+    raise PySO8601.ParseError()
+
+
+def timestamps(count, distinct):
+    rand = random.Random(5)
+    start = datetime.datetime(2017, 7, 14, 2, 40)
+    formats = ['%Y-%m-%dT%H:%M:%SZ'] * 5 + ['%Y-%m-%dT%H:%M:%S.%fZ'] * 2 + ['%Y-%m-%dT%H:%M:%S-05:00',
+               '%Y-%m-%dT%H:%M:%S', '%Y%m%dT%H%M%S+0200', '%Y-%m-%d %H:%M:%S']
+    unique = [(start + datetime.timedelta(seconds=rand.randint(0, 86400 * 365), microseconds=rand.randint(0, 999999)))
+              .strftime(rand.choice(formats)) for _ in range(distinct)]
+    return [rand.choice(unique) for _ in range(count)]
+
+
+def measure(parse, strings):
+    start = time.perf_counter()
+    for string in strings:
+        parse(string)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=1000000, help="number of timestamps parsed")
+    parser.add_argument('--distinct', type=int, default=50000, help="number of different timestamps among them")
+    parser.add_argument('--memo-size', type=int, default=65536, help="PySO8601.set_memo_size for the memo run")
+    args = parser.parse_args()
+
+    strings = timestamps(args.count, args.distinct)
+    print("%d timestamps, %d distinct" % (len(strings), len(set(strings))))
+
+    baseline = measure(previous_parse, strings)
+    print("%-16s %8.3f s  %9.0f/s" % ('previous parser', baseline, len(strings) / baseline))
+    for name, memo_size in (('parse', 0), ('parse with memo', args.memo_size)):
+        PySO8601.set_memo_size(memo_size)
+        elapsed = measure(PySO8601.parse, strings)
+        print("%-16s %8.3f s  %9.0f/s  (%.1fx faster)" % (name, elapsed, len(strings) / elapsed, baseline / elapsed))
+    PySO8601.set_memo_size(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+Compare the json backends (see slickqa.micromodels.jsonbackend) on the Result payload in fixtures.py: decoding the
+response bytes (alone, and into a Result with from_dict), and encoding a Result (alone, and to request bytes with
+to_json_bytes).  Only the backends installed here are measured.
+
+Usage: python benchmarks/json_backends.py [--log-entries N] [--repeat N] [--min-time SECONDS]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, '..'))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from slickqa.data import Result
+from slickqa.micromodels import jsonbackend
+import fixtures
+
+
+def operations(backend, body, result):
+    serial = result.to_dict(serial=True)
+    return [
+        ('loads', lambda: backend.loads(body)),
+        ('bytes -> Result', lambda: Result.from_dict(body, is_json=True)),
+        ('dumps_bytes', lambda: backend.dumps_bytes(serial)),
+        ('Result -> bytes', lambda: result.to_json_bytes()),
+    ]
+
+
+def best_rate(operation, repeat, min_time):
+    best = 0
+    for _ in range(repeat):
+        count = 0
+        start = time.perf_counter()
+        elapsed = 0
+        while elapsed < min_time:
+            operation()
+            count += 1
+            elapsed = time.perf_counter() - start
+        best = max(best, count / elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--log-entries', type=int, default=2000, help="number of log entries in the result")
+    parser.add_argument('--repeat', type=int, default=5, help="number of timed runs, the best one is reported")
+    parser.add_argument('--min-time', type=float, default=0.2, help="minimum length of each timed run in seconds")
+    args = parser.parse_args()
+
+    body = json.dumps(fixtures.result(log_entries=args.log_entries)).encode('utf-8')
+    print("Result of %d KB, backends: %s" % (len(body) // 1024, ', '.join(jsonbackend.available_backends())))
+    default = jsonbackend.get_backend()
+    baselines = {}
+    try:
+        for name in reversed(jsonbackend.available_backends()):
+            backend = jsonbackend.set_backend(name)
+            result = Result.from_dict(body, is_json=True)
+            for operation_name, operation in operations(backend, body, result):
+                rate = best_rate(operation, args.repeat, args.min_time)
+                baseline = baselines.setdefault(operation_name, rate)
+                print("%-12s %-16s %10.1f ops/s  (%.2fx json)" % (name, operation_name, rate, rate / baseline))
+    finally:
+        jsonbackend.set_backend(default)
+
+
+if __name__ == '__main__':
+    main()
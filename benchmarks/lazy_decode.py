@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+"""
+Measure counting the statuses of a list of results (like the response to slick.results.find), comparing parsing the
+JSON alone with also decoding the results into models eagerly, and lazily (Model.from_dict(D, lazy=True)).
+
+Usage: python benchmarks/lazy_decode.py [--count N] [--log-entries N]
+"""
+import argparse
+import collections
+import json
+import os
+import sys
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, '..'))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from slickqa.data import Result
+import fixtures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=10000, help="number of results in the response")
+    parser.add_argument('--log-entries', type=int, default=20, help="number of log entries of each result")
+    args = parser.parse_args()
+
+    result = fixtures.result(log_entries=args.log_entries)
+    statuses = ['PASS', 'FAIL', 'BROKEN_TEST', 'SKIPPED']
+    body = json.dumps([dict(result, id='%024x' % i, status=statuses[i % len(statuses)]) for i in range(args.count)])
+
+    def parse_only():
+        return collections.Counter(dct['status'] for dct in json.loads(body))
+
+    def eager():
+        return collections.Counter(Result.from_dict(dct).status for dct in json.loads(body))
+
+    def lazy():
+        return collections.Counter(Result.from_dict(dct, lazy=True).status for dct in json.loads(body))
+
+    print("%d results of %d KB each" % (args.count, len(body) // args.count // 1024))
+    baseline = None
+    for name, count_statuses in (('json.loads only', parse_only), ('eager decode', eager), ('lazy decode', lazy)):
+        start = time.perf_counter()
+        counts = count_statuses()
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        assert sum(counts.values()) == args.count
+        print("%-16s %8.3f s  (%.2fx json.loads)" % (name, elapsed, elapsed / baseline))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+"""
+Measure how fast the micromodels decode and encode big slick payloads: Model.from_dict, set_data, to_dict(serial=True)
+and to_json on the generated fixtures in fixtures.py (a Result with 2000 log entries, a Project with 300 releases of
+10 builds, a TestrunGroup with 50 testruns).
+
+For each it reports operations per second (best of --repeat runs), the peak memory used by one operation, and the
+memory (and number of blocks) still allocated by it's result, as measured by tracemalloc.
+
+--save writes the numbers to benchmarks/results/<name>.json (name defaults to the current git commit), and --compare
+prints the change from a previously saved file, so a regression can be tracked down to a commit.
+
+Usage: python benchmarks/micromodels.py [--repeat N] [--min-time SECONDS] [--only FIXTURE] [--save [NAME]]
+                                        [--compare FILE]
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, '..'))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from slickqa import data
+from fixtures import FIXTURES
+
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, 'results')
+
+
+def operations(cls, payload):
+    """(name, setup, operation) for each operation measured on payload, setup returns the argument operation gets."""
+    def set_data(payload):
+        cls().set_data(payload)
+    return [
+        ('from_dict', lambda: payload, cls.from_dict),
+        ('set_data', lambda: payload, set_data),
+        ('to_dict', lambda: cls.from_dict(payload), lambda model: model.to_dict(serial=True)),
+        ('to_json', lambda: cls.from_dict(payload), lambda model: model.to_json()),
+    ]
+
+
+def time_operation(setup, operation, repeat, min_time):
+    """Best operations per second out of repeat runs, each run repeating the operation for at least min_time."""
+    argument = setup()
+    best = 0
+    for _ in range(repeat):
+        count = 0
+        start = time.perf_counter()
+        elapsed = 0
+        while elapsed < min_time:
+            operation(argument)
+            count += 1
+            elapsed = time.perf_counter() - start
+        best = max(best, count / elapsed)
+    return best
+
+
+def measure_memory(setup, operation):
+    """Peak and retained KB, and retained blocks, of a single operation."""
+    argument = setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        if hasattr(tracemalloc, 'reset_peak'):
+            # don't count the snapshot itself
+            tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        result = operation(argument)
+        current, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename'))
+    del result
+    return {'peak_kb': (peak - baseline) / 1024.0, 'retained_kb': (current - baseline) / 1024.0,
+            'retained_blocks': blocks}
+
+
+def run(args):
+    results = {}
+    for fixture_name in sorted(FIXTURES):
+        if args.only and fixture_name not in args.only:
+            continue
+        class_name, generate = FIXTURES[fixture_name]
+        cls = getattr(data, class_name)
+        payload = generate()
+        for name, setup, operation in operations(cls, payload):
+            key = '%s.%s' % (fixture_name, name)
+            results[key] = dict(ops_per_sec=time_operation(setup, operation, args.repeat, args.min_time),
+                                **measure_memory(setup, operation))
+            print_result(key, results[key], args.baseline.get(key) if args.baseline else None)
+    return results
+
+
+def print_result(key, result, baseline):
+    line = "%-40s %10.1f ops/s  peak %9.1f KB  retained %9.1f KB %8d blocks" % (
+        key, result['ops_per_sec'], result['peak_kb'], result['retained_kb'], result['retained_blocks'])
+    if baseline:
+        line += "  (%+6.1f%% ops/s, %+6.1f%% peak)" % (change(baseline['ops_per_sec'], result['ops_per_sec']),
+                                                       change(baseline['peak_kb'], result['peak_kb']))
+    print(line)
+
+
+def change(before, after):
+    return (after - before) * 100.0 / before if before else 0.0
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARKS_DIR,
+                                       stderr=subprocess.STDOUT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help="number of timed runs, the best one is reported")
+    parser.add_argument('--min-time', type=float, default=0.2, help="minimum length of each timed run in seconds")
+    parser.add_argument('--only', action='append', choices=sorted(FIXTURES), help="only run this fixture")
+    parser.add_argument('--save', nargs='?', const='', metavar='NAME',
+                        help="save the results to benchmarks/results/NAME.json (NAME defaults to the git commit)")
+    parser.add_argument('--compare', metavar='FILE', help="show the change from results saved with --save")
+    args = parser.parse_args()
+
+    args.baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            args.baseline = json.load(baseline_file)['results']
+
+    commit = git_commit()
+    print("python %s, commit %s" % (platform.python_version(), commit))
+    results = run(args)
+
+    if args.save is not None:
+        name = args.save or commit or datetime.datetime.now().strftime('%Y%m%d%H%M%S')
+        if not os.path.isdir(RESULTS_DIR):
+            os.makedirs(RESULTS_DIR)
+        path = os.path.join(RESULTS_DIR, name + '.json')
+        with open(path, 'w') as results_file:
+            json.dump({'commit': commit, 'python': platform.python_version(),
+                       'implementation': platform.python_implementation(),
+                       'date': datetime.datetime.now().isoformat(), 'results': results},
+                      results_file, indent=2, sort_keys=True)
+        print("saved to %s" % path)
+
+
+if __name__ == '__main__':
+    main()
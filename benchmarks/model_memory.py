@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+Measure the memory used per model instance, comparing a regular (__dict__ backed) and a compact (__slots__ backed, see
+micromodels.Model) version of some slick model classes, along with how fast from_dict creates them.
+
+The instances are decoded from the generated payloads in fixtures.py, and only the memory of the instance itself is
+counted (the values in it are shared with the payload where they can be, like strings).
+
+Usage: python benchmarks/model_memory.py [--count N]
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, '..'))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+import random
+
+from slickqa import data, micromodels
+import fixtures
+
+
+def payloads(count):
+    rand = random.Random(4)
+    result = fixtures.result(log_entries=0)
+    return {
+        'LogEntry': [fixtures.log_entry(rand, i) for i in range(count)],
+        'BuildReference': [{'buildId': '%024x' % i, 'name': '4.2.%d' % i} for i in range(count)],
+        'Link': [{'name': 'link %d' % i, 'url': 'http://ci.example.com/job/%d' % i} for i in range(count)],
+        'Result': [dict(result, id='%024x' % i) for i in range(count)],
+    }
+
+
+def variant(cls, compact):
+    """A copy of model class cls (with the same fields), compact or not."""
+    attrs = dict(cls._clsfields, _compact=compact)
+    return type(cls)('%s%s' % ('Compact' if compact else 'Regular', cls.__name__), (micromodels.Model,), attrs)
+
+
+def measure(cls, items):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        instances = [cls.from_dict(item) for item in items]
+        end, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # don't count the list holding them
+    per_instance = (end - start - sys.getsizeof(instances)) / float(len(instances))
+    del instances
+
+    started = time.perf_counter()
+    for item in items:
+        cls.from_dict(item)
+    return per_instance, len(items) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=20000, help="number of instances of each class")
+    args = parser.parse_args()
+
+    for name, items in sorted(payloads(args.count).items()):
+        cls = getattr(data, name)
+        regular_bytes, regular_rate = measure(variant(cls, False), items)
+        compact_bytes, compact_rate = measure(variant(cls, True), items)
+        print("%-16s regular %8.0f bytes %9.0f/s   compact %8.0f bytes %9.0f/s   (%+.0f%% memory)" % (
+            name, regular_bytes, regular_rate, compact_bytes, compact_rate,
+            (compact_bytes - regular_bytes) * 100.0 / regular_bytes))
+
+
+if __name__ == '__main__':
+    main()
@@ -6,12 +6,9 @@ import time
 
 slick = SlickQA('http://localhost:8080', 'EP', '10.7', '5', 'My Testplan', environment_name='Example', test_run_group_name='example.py testruns')
 
-results = []
-results.append(slick.file_result("First Test", status=ResultStatus.NO_RESULT, runstatus=RunStatus.TO_BE_RUN))
-results.append(slick.file_result("Second Test", status=ResultStatus.NO_RESULT, runstatus=RunStatus.TO_BE_RUN))
-results.append(slick.file_result("Third Test", status=ResultStatus.NO_RESULT, runstatus=RunStatus.TO_BE_RUN))
-results.append(slick.file_result("Fourth Test", status=ResultStatus.NO_RESULT, runstatus=RunStatus.TO_BE_RUN))
-results.append(slick.file_result("Fifth Test", status=ResultStatus.NO_RESULT, runstatus=RunStatus.TO_BE_RUN))
+# register all the tests before running them, file_results files them concurrently
+results = slick.file_results({'name': name, 'status': ResultStatus.NO_RESULT, 'runstatus': RunStatus.TO_BE_RUN}
+                             for name in ["First Test", "Second Test", "Third Test", "Fourth Test", "Fifth Test"])
 
 # Now to run the tests
 
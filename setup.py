@@ -19,6 +19,7 @@ setup(
     package_data={'': ['*.txt', '*.rst', '*.html']},
     include_package_data=True,
     install_requires=get_requirements('requirements.txt'),
+    extras_require={'async': ['aiohttp']},
     author="Slick Developers",
     url="http://github.com/slickqa/python-client"
 )
@@ -15,7 +15,12 @@ Copyright 2013 AccessData Group, LLC.
    See the License for the specific language governing permissions and
    limitations under the License.
 """
+import sys
+
 from .data import *
 from .connection import SlickConnection, SlickCommunicationError
 from .queries import *
 from .slickqa import *
+
+if sys.version_info >= (3, 5):
+    from .asyncconnection import AsyncSlickConnection
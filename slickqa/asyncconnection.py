@@ -0,0 +1,489 @@
+"""
+An asyncio version of the slick client.  AsyncSlickConnection has the same api tree as SlickConnection, but every
+method that talks to slick returns an awaitable.  All of the api parts of one connection share a single aiohttp
+session (and connection pool).
+
+Requires aiohttp (pip install slickqa[async]).
+
+Example:
+    async with AsyncSlickConnection('http://localhost:8080') as slick:
+        proj = await slick.projects.findByName('A Project')
+        results = await slick.results.find(ResultQuery(testrunid=testrun.id))
+"""
+import asyncio
+import collections
+import logging
+import os
+import sys
+import time
+import hashlib
+import mimetypes
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from .data import StoredFile, Testrun
+from .connection import SlickConnection, SlickApiPart, SlickProjectApiPart, SystemConfigurationApiPart, \
+    StoredFileApiPart, ResultApiPart, TestrunGroupApiPart, SlickCommunicationError, FindOneMode, json_content, STREAM_CONTENT
+from .retry import CircuitOpenError, NO_RETRY, Deadline, TASK_LOCAL_DEADLINES, deadline_scope
+from .jsonstream import JsonArrayStreamDecoder
+from .metrics import body_size
+from .micromodels import jsonbackend
+
+
+class AsyncSlickApiPart(SlickApiPart):
+    """An api part whose methods return awaitables instead of blocking.
+
+    The url (and the object being sent) are resolved when the method is called, not when it is awaited, so it is
+    safe to create several requests before awaiting them:
+        await asyncio.gather(slick.results(r1).update(), slick.results(r2).update())
+    """
+
+    async def _request(self, method, url, data=None, headers=None, decode=True, endpoint=None, model=None,
+                       retry_policy=None):
+        """Make a request to slick, retrying it according to the connection's retry policy (and circuit breaker).
+        The decoded json response is returned.  Like SlickConnection.get_json, a GET for a model the connection's
+        cache caches may be answered from the cache."""
+        connection = self.get_connection()
+        cache = connection.cache
+        if cache is None:
+            return await self._fetch(method, url, data, headers, decode, endpoint, retry_policy=retry_policy)
+        if method != 'GET':
+            try:
+                return await self._fetch(method, url, data, headers, decode, endpoint, retry_policy=retry_policy)
+            finally:
+                connection.invalidate(url)
+        ttl = cache.ttl(model)
+        if ttl > 0:
+            content = cache.get(url)
+            if content is not None:
+                return jsonbackend.loads(content)
+        generation = cache.generation()
+        content = await self._fetch(method, url, data, headers, False, endpoint, raw=True, retry_policy=retry_policy)
+        if ttl > 0:
+            cache.put(url, content, ttl, generation)
+        return jsonbackend.loads(content)
+
+    async def _fetch(self, method, url, data=None, headers=None, decode=True, endpoint=None, raw=False,
+                     retry_policy=None):
+        r = await self._open(method, url, data, headers, endpoint, retry_policy)
+        try:
+            if raw:
+                return await r.read()
+            if decode:
+                return jsonbackend.loads(await r.read())
+        finally:
+            r.release()
+
+    async def _open(self, method, url, data=None, headers=None, endpoint=None, retry_policy=None):
+        """Make a request to slick (retrying it if needed), and return the response once it has a successful status
+        code.  The caller has to release the response."""
+        connection = self.get_connection()
+        session = connection.get_session()
+        if endpoint is None:
+            endpoint = self.get_name()
+        if retry_policy is None:
+            retry_policy = connection.retry_policy
+        attempts = retry_policy.attempts()
+        breaker = connection.circuit_breaker
+        bytes_sent = body_size(data)
+        deadline = connection.operation_deadline()
+        retry = False
+        while True:
+            status_code = None
+            body = None
+            if deadline is not None and deadline.expired():
+                raise connection.deadline_error(method, url, deadline, attempts.attempt - 1)
+            if breaker is not None:
+                try:
+                    breaker.before_request(endpoint)
+                except CircuitOpenError as error:
+                    raise SlickCommunicationError("Not making request to slick at url {}: {}".format(url, error))
+            started = time.time()
+            try:
+                self.logger.debug("Making %s request to slick at url %s", method, url)
+                connect_timeout, read_timeout = connection.timeouts(deadline)
+                timeout = aiohttp.ClientTimeout(total=deadline.remaining() if deadline is not None else None,
+                                                sock_connect=connect_timeout, sock_read=read_timeout)
+                if connection.hedge_policy is not None and method == 'GET':
+                    r = await self._hedged_request(session, url, endpoint, headers=headers, timeout=timeout)
+                else:
+                    r = await session.request(method, url, data=data, headers=headers, timeout=timeout)
+                self.logger.debug("Request returned status code %d", r.status)
+                # the body hasn't been read yet, so the latency is until the headers arrived
+                connection.request_metrics.record(endpoint, method, r.status, time.time() - started, bytes_sent,
+                                                  r.content_length or 0, retry)
+                if r.status == 200:
+                    if breaker is not None:
+                        breaker.record_success(endpoint)
+                    return r
+                async with r:
+                    status_code = r.status
+                    body = await r.text()
+                    self.logger.warning("Slick returned status code %d for %s request to %s, body: %s", status_code,
+                                        method, url, body)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                connection.request_metrics.record(endpoint, method, None, time.time() - started, bytes_sent, 0, retry)
+                self.logger.warning("Received exception while connecting to slick at %s", url, exc_info=sys.exc_info())
+            if breaker is not None:
+                if status_code is None or retry_policy.is_retryable_status(status_code):
+                    breaker.record_failure(endpoint)
+                else:
+                    breaker.record_success(endpoint)
+            delay = attempts.next_delay(status_code)
+            if delay is not None and deadline is not None and delay >= deadline.remaining():
+                raise connection.deadline_error(method, url, deadline, attempts.attempt - 1, status_code, body)
+            if delay is None and deadline is not None and deadline.expired():
+                raise connection.deadline_error(method, url, deadline, attempts.attempt, status_code, body)
+            if delay is None:
+                raise SlickCommunicationError(
+                    "Tried {} times to request data from slick at url {} without a successful status code.  Last "
+                    "status code: {}, body: {}".format(attempts.attempt, url, status_code, body))
+            await asyncio.sleep(delay)
+            retry = True
+
+    async def _hedged_request(self, session, url, endpoint, **kwargs):
+        """Send a GET, and send it again if it isn't answered within the hedge policy's delay, see
+        SlickConnection.hedged_request.  The request that loses is cancelled."""
+        connection = self.get_connection()
+        policy = connection.hedge_policy
+        delay = policy.delay(endpoint)
+        started = time.time()
+
+        def record_latency(task):
+            if not task.cancelled() and task.exception() is None:
+                policy.record(endpoint, time.time() - started)
+
+        primary = asyncio.ensure_future(session.request('GET', url, **kwargs))
+        primary.add_done_callback(record_latency)
+        if delay is None:
+            return await primary
+        done, pending = await asyncio.wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        policy.hedged()
+        hedge = asyncio.ensure_future(session.request('GET', url, **kwargs))
+        pending = [primary, hedge]
+        winner = None
+        try:
+            while winner is None and pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+        finally:
+            for task in (primary, hedge):
+                if task is winner:
+                    continue
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled() and task.exception() is None:
+                    task.result().release()
+        won = winner is hedge
+        if won:
+            policy.hedge_won()
+        connection.request_metrics.record_hedge(endpoint, 'GET', won)
+        if winner is None:
+            raise primary.exception()
+        return winner.result()
+
+    def find(self, query=None, lazy=False, **kwargs):
+        """
+        You can pass in the appropriate model object from the queries module,
+        or a dictionary with the keys and values for the query,
+        or a set of key=value parameters.  See SlickApiPart.find for lazy.
+        """
+        url = self.get_query_url(query, **kwargs)
+        return self._find(url, self.model, lazy)
+
+    async def _find(self, url, model, lazy=False):
+        return [model.from_dict(dct, lazy=lazy) for dct in await self._request('GET', url, model=model)]
+
+    query = find
+
+    def find_iter(self, query=None, lazy=False, **kwargs):
+        """The same as find, but returns an async iterator that decodes the response as it arrives and yields one
+        model at a time, see SlickApiPart.find_iter.
+            async for result in slick.results.find_iter(ResultQuery(testrunid=testrun.id)):
+                ...
+        """
+        return AsyncModelIterator(self, self.get_query_url(query, **kwargs), self.model, lazy)
+
+    async def findOne(self, query=None, mode=FindOneMode.FIRST, **kwargs):
+        """Perform a find, with the same options present, but only return a maximum of one result."""
+        results = await self.find(query, **kwargs)
+        if len(results) == 0:
+            return None
+        elif len(results) == 1 or mode == FindOneMode.FIRST:
+            return results[0]
+        elif mode == FindOneMode.LAST:
+            return results[-1]
+
+    def get(self, lazy=False):
+        """Get the specified object from slick.  Example:
+        await slick.projects("4fd8cd95e4b0ee7ba54b9885").get()
+        """
+        return self._send('GET', self.getUrl(), self.model, lazy=lazy)
+
+    def update(self, partial=False):
+        """Update the specified object in slick, see SlickApiPart.update for partial.  Example:
+        await slick.projects(proj).update()
+        """
+        obj = self.data
+        if partial:
+            changes = obj.to_changes_dict()
+            changes['id'] = obj.id
+            json_data = jsonbackend.dumps_bytes(changes)
+        else:
+            json_data = obj.to_json_bytes()
+        return self._update(obj, self.getUrl(), json_data)
+
+    async def _update(self, obj, url, json_data):
+        updated = await self._send('PUT', url, self.model, json_data)
+        obj.mark_clean()
+        return updated
+
+    put = update
+
+    def create(self):
+        """Create the specified object (perform a POST to the api).  Example:
+        proj = await slick.projects(proj).create()
+        """
+        obj = self.data
+        return self._send('POST', self.get_collection_url(), self.model, obj.to_json_bytes())
+
+    post = create
+
+    def remove(self):
+        """Remove or delete the specified object from slick.  Example:
+        await slick.projects("4fd8cd95e4b0ee7ba54b9885").remove()
+        """
+        return self._request('DELETE', self.getUrl(), decode=False)
+
+    delete = remove
+
+    async def _send(self, method, url, model, json_data=None, endpoint=None, lazy=False):
+        headers = json_content if json_data is not None else None
+        return model.from_dict(await self._request(method, url, data=json_data, headers=headers, endpoint=endpoint,
+                                                   model=model), lazy=lazy)
+
+
+class AsyncModelIterator(object):
+    """The async iterator returned by AsyncSlickApiPart.find_iter.  It's a class instead of an async generator so
+    that it works on python 3.5.  The response is released once it has been read to the end, when reading it fails,
+    or by close() if you stop iterating early."""
+
+    def __init__(self, api_part, url, model, lazy=False):
+        self.api_part = api_part
+        self.url = url
+        self.model = model
+        self.lazy = lazy
+        self.response = None
+        self.decoder = JsonArrayStreamDecoder()
+        self.decoded = collections.deque()
+        self.finished = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            while not self.decoded:
+                if self.finished:
+                    raise StopAsyncIteration
+                if self.response is None:
+                    self.response = await self.api_part._open('GET', self.url)
+                chunk = await self.response.content.read(self.api_part.stream_chunk_size)
+                if chunk:
+                    self.decoded.extend(self.decoder.feed(chunk))
+                else:
+                    self.decoded.extend(self.decoder.feed(b'', final=True))
+                    self.finished = True
+                    self.close()
+        except (aiohttp.ClientError, ValueError) as error:
+            self.close()
+            raise SlickCommunicationError("Error reading response from slick at url {}: {}".format(self.url, error))
+        except BaseException:
+            self.close()
+            raise
+        return self.model.from_dict(self.decoded.popleft(), lazy=self.lazy)
+
+    def close(self):
+        self.finished = True
+        if self.response is not None:
+            self.response.release()
+            self.response = None
+
+    def __del__(self):
+        self.close()
+
+
+class AsyncSlickProjectApiPart(AsyncSlickApiPart, SlickProjectApiPart):
+    pass
+
+
+class AsyncSystemConfigurationApiPart(AsyncSlickApiPart, SystemConfigurationApiPart):
+
+    def find(self, query=None, **kwargs):
+        instance = self.model()
+        if hasattr(instance, 'configurationType') and instance.configurationType is not None:
+            kwargs['config-type'] = instance.configurationType
+        return AsyncSlickApiPart.find(self, query, **kwargs)
+
+
+class AsyncStoredFileApiPart(AsyncSlickApiPart, StoredFileApiPart):
+
+    async def upload_local_file(self, local_file_path, file_obj=None, chunk_size=None, deadline=None):
+        """Create a Stored File and upload it's data, see StoredFileApiPart.upload_local_file.  The whole upload has
+        to be done within deadline seconds, by default the connection's deadline."""
+        if not TASK_LOCAL_DEADLINES:
+            # a deadline for the whole upload would be shared with the other tasks of the event loop
+            if deadline is not None:
+                raise NotImplementedError("A deadline for a whole async upload needs python 3.7 or later")
+            return await self._upload_local_file(local_file_path, file_obj, chunk_size)
+        deadline = Deadline(deadline) if deadline is not None else self.get_connection().operation_deadline()
+        with deadline_scope(deadline):
+            return await self._upload_local_file(local_file_path, file_obj, chunk_size)
+
+    async def _upload_local_file(self, local_file_path, file_obj, chunk_size):
+        if file_obj is None and not os.path.exists(local_file_path):
+            return
+        storedfile = StoredFile()
+        storedfile.mimetype = mimetypes.guess_type(local_file_path)[0]
+        storedfile.filename = os.path.basename(local_file_path)
+        if file_obj is None:
+            storedfile.length = os.stat(local_file_path).st_size
+        else:
+            file_obj.seek(0, os.SEEK_END)
+            storedfile.length = file_obj.tell()
+            file_obj.seek(0)
+        if chunk_size is not None:
+            storedfile.chunkSize = chunk_size
+        storedfile = await self(storedfile).create()
+        url = self(storedfile).getUrl() + "/addchunk"
+        if file_obj is None:
+            with open(local_file_path, 'rb') as filecontents:
+                await self._upload_chunks(url, storedfile, filecontents)
+        else:
+            await self._upload_chunks(url, storedfile, file_obj)
+        return await self(storedfile).update()
+
+    async def _upload_chunks(self, url, stored_file, file_like_obj):
+        # chunks have to be sent in order, but the next chunk is read while the current one is being sent
+        loop = asyncio.get_event_loop()
+        md5 = hashlib.md5()
+        bindata = await loop.run_in_executor(None, file_like_obj.read, stored_file.chunkSize)
+        while bindata:
+            next_chunk = loop.run_in_executor(None, file_like_obj.read, stored_file.chunkSize)
+            if isinstance(bindata, str):
+                bindata = bindata.encode('ascii', 'ignore')
+            md5.update(bindata)
+            # never retried, slick would append a chunk it got (but didn't answer for) twice
+            await self._request('POST', url, data=bindata, headers=STREAM_CONTENT, decode=False,
+                                endpoint='slick.files.addchunk', retry_policy=NO_RETRY)
+            bindata = await next_chunk
+        stored_file.md5 = md5.hexdigest()
+
+
+class AsyncResultApiPart(AsyncSlickApiPart, ResultApiPart):
+
+    def add_log_entries(self, entries):
+        """Add log entries to the end of a result's log, see ResultApiPart.add_log_entries."""
+        json_data = jsonbackend.dumps_bytes([entry.to_dict(serial=True) for entry in entries])
+        return self._request('POST', self.getUrl() + "/log", data=json_data, headers=json_content, decode=False,
+                             endpoint=self.get_name() + '.log')
+
+    async def update_changes(self):
+        """Send slick only what has changed in a result, see ResultApiPart.update_changes."""
+        result = self.data
+        log = result.appended('log')
+        if log:
+            await self.add_log_entries(log)
+            result.mark_clean('log')
+        if result.changed_fields():
+            await self.update(partial=True)
+
+
+class AsyncTestrunGroupApiPart(AsyncSlickApiPart, TestrunGroupApiPart):
+
+    def add_testrun(self, testrun):
+        id = testrun
+        if isinstance(testrun, Testrun):
+            id = testrun.id
+        return self._send('POST', self.getUrl() + "/addtestrun/" + id, self.model,
+                          endpoint=self.get_name() + '.addtestrun')
+
+    def remove_testrun(self, testrun):
+        id = testrun
+        if isinstance(testrun, Testrun):
+            id = testrun.id
+        return self._send('DELETE', self.getUrl() + "/removetestrun/" + id, self.model,
+                          endpoint=self.get_name() + '.removetestrun')
+
+
+class AsyncSlickConnection(SlickConnection):
+    """An asyncio connection to slick.  It has the same api tree as SlickConnection, but find, findOne, get, update,
+    create and remove return awaitables.  The options (pool, retry policy, circuit breaker) have the same meaning as
+    for SlickConnection; the aiohttp session is created the first time a request is made (it has to be created inside
+    the running event loop).
+
+    Close the connection when you are done with it, either with "await slick.close()" or by using it as an
+    async context manager.
+
+    A deadline set with "with slick.deadline(seconds):" applies to the requests made by the asyncio task that set it
+    (not the other tasks on the event loop), which needs python 3.7 or later.
+    """
+    logger = logging.getLogger("slick.AsyncSlickConnection")
+
+    ApiPart = AsyncSlickApiPart
+    ProjectApiPart = AsyncSlickProjectApiPart
+    SystemConfigurationApiPart = AsyncSystemConfigurationApiPart
+    StoredFileApiPart = AsyncStoredFileApiPart
+    TestrunGroupApiPart = AsyncTestrunGroupApiPart
+    ResultApiPart = AsyncResultApiPart
+
+    def __init__(self, baseUrl, **kwargs):
+        if aiohttp is None:
+            raise ImportError("AsyncSlickConnection requires aiohttp, install it with: pip install slickqa[async]")
+        super(AsyncSlickConnection, self).__init__(baseUrl, **kwargs)
+
+    def deadline(self, seconds):
+        """All the requests made by the calling task inside the with block have to be done within seconds, see
+        SlickConnection.deadline."""
+        if not TASK_LOCAL_DEADLINES:
+            raise NotImplementedError("Deadlines for a group of async calls need python 3.7 or later (contextvars), "
+                                      "pass deadline= to the connection instead")
+        return super(AsyncSlickConnection, self).deadline(seconds)
+
+    def create_session(self, pool_connections, pool_maxsize, pool_block, keep_alive):
+        # aiohttp always waits for a free connection once the limits are reached, so pool_block has no effect
+        self.connector_options = {
+            'limit': pool_connections * pool_maxsize,
+            'limit_per_host': pool_maxsize,
+            'force_close': not keep_alive,
+        }
+        return None
+
+    def get_session(self):
+        """Get the aiohttp session shared by all the api parts, creating it on first use."""
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(**self.connector_options))
+        return self.session
+
+    async def close(self):
+        """Close all the pooled connections to slick."""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def __enter__(self):
+        raise TypeError("Use 'async with' with an AsyncSlickConnection")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
@@ -0,0 +1,224 @@
+"""
+A response cache for the slick entities that hardly ever change during a run (projects, configurations, testplans,
+the version, ...), so that looking them up over and over doesn't go back to slick every time.  Also SingleFlight,
+which collapses identical requests made at the same time into one, and ReferenceCache, which keeps what SlickQA
+looked up in a file, for the other processes of a run.
+"""
+import copy
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .data import Project, Configuration, SystemConfiguration, Testplan, ProductVersion
+
+
+class ResponseCache(object):
+    """An LRU cache of slick's responses to GET requests, keyed by url.
+
+    How long a response is kept depends on the model the request returns, see ttls.  Responses for models without a
+    ttl (results, testruns, testcases, ...) are never cached.  Any create, update or remove made through the
+    connection drops the cached responses for the whole collection it touched (everything under /api/projects
+    for a change to a project, a release or a build for example), so a connection always sees it's own changes.
+    A response to a GET that was already on it's way when the collection was changed isn't cached (pass put the
+    generation() from before the request was sent), it may be from before the change.  Changes made by other
+    clients can take up to the ttl to show up.
+
+    Options:
+     * max_entries: the most responses kept, the least recently used one is dropped to make room for a new one.
+     * ttls: a dictionary of model class to the number of seconds it's responses are kept for, subclasses use the
+       ttl of their closest base class with one.  Defaults to DEFAULT_TTLS.
+
+    The hits, misses, evictions (because of max_entries) and invalidations (because of changes) attributes count
+    what the cache has done, stats() returns all of them at once.
+
+    Example:
+        slick = SlickConnection(url, cache=ResponseCache(ttls={Project: 60}))
+    """
+
+    DEFAULT_TTLS = {
+        Project: 300,
+        Configuration: 300,
+        SystemConfiguration: 300,
+        Testplan: 300,
+        ProductVersion: 3600,
+    }
+
+    def __init__(self, max_entries=256, ttls=None):
+        self.max_entries = max_entries
+        if ttls is None:
+            ttls = self.DEFAULT_TTLS
+        self.ttls = dict(ttls)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # counts the invalidations, and the count when each url was last invalidated
+        self.current_generation = 0
+        self.invalidated = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def ttl(self, model):
+        """The number of seconds responses for the model are kept, 0 if they aren't cached."""
+        for cls in getattr(model, '__mro__', ()):
+            if cls in self.ttls:
+                return self.ttls[cls]
+        return 0
+
+    def get(self, url):
+        """Get the cached response for a url, or None if there isn't one (or it has expired)."""
+        with self.lock:
+            entry = self.entries.pop(url, None)
+            if entry is None or entry[0] <= time.time():
+                self.misses += 1
+                return None
+            # put it back at the end, it's now the most recently used
+            self.entries[url] = entry
+            self.hits += 1
+            return entry[1]
+
+    def generation(self):
+        """A token for the invalidations made so far, see put."""
+        with self.lock:
+            return self.current_generation
+
+    def put(self, url, content, ttl, generation=None):
+        """Cache the response for a url for ttl seconds.  If generation (from generation(), taken before the response
+        was requested) is given, and url has been invalidated since, the response isn't cached."""
+        with self.lock:
+            if generation is not None and generation < self.current_generation and any(
+                    invalidated > generation and covers(prefix, url) for prefix, invalidated in
+                    self.invalidated.items()):
+                return
+            self.entries.pop(url, None)
+            self.entries[url] = (time.time() + ttl, content)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, url):
+        """Drop the cached responses for a url, and for every url under it (including queries)."""
+        with self.lock:
+            self.current_generation += 1
+            self.invalidated[url] = self.current_generation
+            for key in [key for key in self.entries if covers(url, key)]:
+                del self.entries[key]
+                self.invalidations += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'invalidations': self.invalidations, 'entries': len(self.entries)}
+
+
+def covers(url, key):
+    """True if invalidating url drops the response for key: it's url itself, or a url under it."""
+    return key == url or key.startswith((url + '/', url + '?'))
+
+
+class _Flight(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Collapses concurrent calls for the same key into one.
+
+    The first thread to call do() for a key runs the function; any thread that calls do() with that key while it
+    is running waits for it and gets (a deep copy of) the same result, or the same exception.  Once the function
+    returns the next call for the key runs it again, nothing is remembered.
+
+    The coalesced attribute counts the calls that waited on another thread instead of running the function.
+    """
+
+    def __init__(self):
+        self.flights = {}
+        self.lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, function, *args, **kwargs):
+        with self.lock:
+            flight = self.flights.get(key)
+            if flight is None:
+                flight = self.flights[key] = _Flight()
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            # every caller gets it's own copy, so they can't change each other's results
+            return copy.deepcopy(flight.result)
+        try:
+            flight.result = function(*args, **kwargs)
+            return flight.result
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+
+    def stats(self):
+        with self.lock:
+            return {'coalesced': self.coalesced, 'in_flight': len(self.flights)}
+
+
+class ReferenceCache(object):
+    """A small JSON file of values (dictionaries) by key, each kept for max_age seconds, that many processes can share.
+
+    SlickQA uses it to remember the project, release and build it resolved, so that the other processes of the same
+    run (like parallel CI shards) that are started with the same path don't look them up again.  Writes replace the
+    whole file at once, so a reader never sees half of one; when two processes write at the same time one of their
+    entries can be lost, which only costs the lookups next time.  A missing or unreadable file is an empty cache.
+
+    Example:
+        slick = SlickQA(url, 'Web Store', '4.2', '4.2.1187', reference_cache='/tmp/slick-references.json')
+    """
+
+    def __init__(self, path, max_age=600):
+        self.path = path
+        self.max_age = max_age
+
+    def read(self):
+        try:
+            with open(self.path) as cache_file:
+                entries = json.load(cache_file)
+        except (IOError, OSError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def get(self, key):
+        """The value saved for key, or None if there isn't one (or it's older than max_age)."""
+        entry = self.read().get(key)
+        if not isinstance(entry, dict) or entry.get('saved', 0) + self.max_age <= time.time():
+            return None
+        return entry.get('value')
+
+    def put(self, key, value):
+        """Save value for key, dropping the expired entries."""
+        now = time.time()
+        entries = dict((other, entry) for other, entry in self.read().items()
+                       if isinstance(entry, dict) and entry.get('saved', 0) + self.max_age > now)
+        entries[key] = {'saved': now, 'value': value}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        temp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        with open(temp_path, 'w') as cache_file:
+            json.dump(entries, cache_file)
+        if hasattr(os, 'replace'):
+            os.replace(temp_path, self.path)
+        else:
+            os.rename(temp_path, self.path)
@@ -0,0 +1,73 @@
+"""
+A client side catalog of a project's testcases, so that finding the testcase of each result a run files doesn't go
+back to slick every time.
+"""
+import threading
+
+
+class TestcaseCatalog(object):
+    """The testcases of a project, indexed by the fields SlickQA looks testcases up by (see INDEXED_FIELDS).
+
+    load() fetches all of the project's testcases from slick in one request, after that get() answers lookups from
+    the indexes.  Testcases created or updated through the same client should be passed to add(), so the catalog
+    keeps up with them; testcases changed by other clients during the run aren't seen until the next load().
+
+    When more than one testcase has the same value for a field, get() returns the first one slick returned, like
+    findOne does, unless one of them was added later with add().
+
+    Example:
+        catalog = TestcaseCatalog(slick, project)
+        catalog.load()
+        test = catalog.get('automationId', 'tests.login.valid')
+    """
+
+    INDEXED_FIELDS = ('automationId', 'automationKey', 'name')
+
+    def __init__(self, connection, project):
+        self.connection = connection
+        self.project = project
+        self.lock = threading.Lock()
+        self.indexes = dict((field, {}) for field in self.INDEXED_FIELDS)
+        # testcase id: the (field, value) pairs it's indexed under, so an update can drop the old ones
+        self.keys = {}
+
+    def load(self):
+        """(Re)load all the testcases of the project from slick, returns how many there are."""
+        testcases = list(self.connection.testcases.find_iter(projectid=self.project.id))
+        with self.lock:
+            for index in self.indexes.values():
+                index.clear()
+            self.keys.clear()
+            for testcase in testcases:
+                self._index(testcase, replace=False)
+        return len(testcases)
+
+    def get(self, field, value):
+        """The testcase whose field (one of INDEXED_FIELDS) is value, or None if there isn't one."""
+        return self.indexes[field].get(value)
+
+    def add(self, testcase):
+        """Index a testcase that was just created or updated, replacing what the catalog had for it."""
+        with self.lock:
+            self._index(testcase, replace=True)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _index(self, testcase, replace):
+        id = getattr(testcase, 'id', None)
+        for field, value in self.keys.pop(id, ()):
+            if getattr(self.indexes[field].get(value), 'id', None) == id:
+                del self.indexes[field][value]
+        keys = []
+        for field in self.INDEXED_FIELDS:
+            value = getattr(testcase, field, None)
+            if value is None:
+                continue
+            if replace:
+                self.indexes[field][value] = testcase
+            else:
+                self.indexes[field].setdefault(value, testcase)
+            keys.append((field, value))
+        if id is not None:
+            self.keys[id] = keys
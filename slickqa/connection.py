@@ -18,10 +18,18 @@ Copyright 2013 AccessData Group, LLC.
 __author__ = 'Jason Corbett'
 
 import requests
+from requests.adapters import HTTPAdapter
 import logging
 import sys
-import traceback
-import pprint
+import time
+import copy
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 try:
     from urllib.parse import urlencode, quote
@@ -31,10 +39,17 @@ except ImportError:
 from .micromodels import Model
 from .data import *
 from . import queries
+from .retry import RetryPolicy, NO_RETRY, CircuitOpenError, HedgePolicy, Deadline, current_deadline, deadline_scope
+from .cache import ResponseCache, SingleFlight
+from .metrics import RequestMetrics, body_size
+from .jsonstream import iter_json_array
+from .micromodels import jsonbackend
 
 import os
 import mimetypes
 import hashlib
+import json
+import tempfile
 
 if not mimetypes.inited:
     mimetypes.init()
@@ -70,7 +85,17 @@ def obj_hook_attr_dict(dct):
 
 
 class SlickApiPart(object):
-    """A class representing part of the slick api"""
+    """A class representing part of the slick api.
+
+    Calling an api part with an object (or id) doesn't change it, it returns a new api part bound to that object
+    (along with copies of it's child parts, bound underneath it).  Since nothing is shared between requests, one
+    connection can be used from many threads at the same time:
+        slick.results(result).update()
+        slick.projects(project).releases(release).create()
+    """
+
+    # how much of a response find_iter reads at a time
+    stream_chunk_size = 64 * 1024
 
     def __init__(self, model, parentPart, name=None):
         self.model = model
@@ -86,12 +111,51 @@ class SlickApiPart(object):
     def get_name(self):
         return self.parent.get_name() + "." + self.name
 
-    def find(self, query=None, **kwargs):
+    def get_connection(self):
+        return self.parent.get_connection()
+
+    def find(self, query=None, lazy=False, **kwargs):
         """
         You can pass in the appropriate model object from the queries module,
         or a dictionary with the keys and values for the query,
         or a set of key=value parameters.
+
+        If lazy is True, the fields of the models returned are only converted when they are first read (see
+        Model.from_dict), which is a lot faster when you only need a few fields of a lot of objects, like:
+            statuses = Counter(result.status for result in slick.results.find(query, lazy=True))
+        """
+        url = self.get_query_url(query, **kwargs)
+        return [self.model.from_dict(dct, lazy=lazy) for dct in
+                self.get_connection().get_json(url, self.get_name(), self.model, self.logger)]
+
+    query = find
+
+    def find_iter(self, query=None, lazy=False, **kwargs):
         """
+        The same as find, but instead of returning a list, this returns a generator that yields one model at a time.
+        The response is decoded as it is read from slick, and each model is only created when it is reached, so
+        memory use doesn't depend on how many objects slick returns.  Use this for queries that can return a lot
+        of objects, like all the results of a large testrun:
+            for result in slick.results.find_iter(ResultQuery(testrunid=testrun.id)):
+                ...
+
+        The request is made (and retried if needed) when the first item is requested; a failure while reading the
+        response after that raises a SlickCommunicationError.  See find for lazy.
+        """
+        return self._iter_models(self.get_query_url(query, **kwargs), self.model, lazy)
+
+    def _iter_models(self, url, model, lazy=False):
+        r = self.get_connection().request('GET', url, self.get_name(), self.logger, stream=True)
+        try:
+            for dct in iter_json_array(r.iter_content(self.stream_chunk_size)):
+                yield model.from_dict(dct, lazy=lazy)
+        except (requests.RequestException, ValueError) as error:
+            raise SlickCommunicationError("Error reading response from slick at url {}: {}".format(url, error))
+        finally:
+            r.close()
+
+    def get_query_url(self, query=None, **kwargs):
+        """Get the url for a find request, see find for the ways you can specify the query."""
         url = self.getUrl()
         if query is not None:
             if isinstance(query, queries.SlickQuery):
@@ -100,29 +164,7 @@ class SlickApiPart(object):
                 url = url + "?" + urlencode(query)
         elif len(kwargs) > 0:
             url = url + "?" + urlencode(kwargs)
-
-        # hopefully when we discover what problems exist in slick to require this, we can take the loop out
-        for retry in range(3):
-            try:
-                self.logger.debug("Making request to slick at url %s", url)
-                r = requests.get(url)
-                self.logger.debug("Request returned status code %d", r.status_code)
-                if r.status_code is 200:
-                    retval = []
-                    objects = r.json()
-                    for dct in objects:
-                        retval.append(self.model.from_dict(dct))
-                    return retval
-                else:
-                    self.logger.error("Slick returned an error when trying to access %s: status code %s" % (url, str(r.status_code)))
-                    self.logger.error("Slick response: ", pprint.pformat(r))
-                    
-            except BaseException as error:
-                self.logger.warn("Received exception while connecting to slick at %s", url, exc_info=sys.exc_info())
-        raise SlickCommunicationError(
-            "Tried 3 times to request data from slick at url %s without a successful status code.", url)
-
-    query = find
+        return url
 
     def findOne(self, query=None, mode=FindOneMode.FIRST, **kwargs):
         """
@@ -141,59 +183,40 @@ class SlickApiPart(object):
         elif mode == FindOneMode.LAST:
             return results[-1]
 
-    def get(self):
+    def get(self, lazy=False):
         """Get the specified object from slick.  You specify which one you want by providing the id as a parameter to
         the parent object.  Example:
         slick.projects("4fd8cd95e4b0ee7ba54b9885").get()
+
+        See find for lazy.
         """
         url = self.getUrl()
+        return self.model.from_dict(self.get_connection().get_json(url, self.get_name(), self.model, self.logger),
+                                    lazy=lazy)
 
-        # hopefully when we discover what problems exist in slick to require this, we can take the loop out
-        for retry in range(3):
-            try:
-                self.logger.debug("Making request to slick at url %s", url)
-                r = requests.get(url)
-                self.logger.debug("Request returned status code %d", r.status_code)
-                if r.status_code is 200:
-                    return self.model.from_dict(r.json())
-                else:
-                    self.logger.debug("Body of what slick returned: %s", r.text)
-            except BaseException as error:
-                self.logger.warn("Received exception while connecting to slick at %s", url, exc_info=sys.exc_info())
-        raise SlickCommunicationError(
-            "Tried 3 times to request data from slick at url %s without a successful status code.", url)
-
-    def update(self):
+    def update(self, partial=False):
         """Update the specified object from slick.  You specify the object as a parameter, using the parent object as
         a function.  Example:
         proj = slick.projects.findByName("foo")
         ... update proj here
         slick.projects(proj).update()
+
+        If partial is True, only the fields that changed since the object was read from slick (or last updated) are
+        sent, along with it's id, see Model.changed_fields.  Slick leaves the fields that aren't sent alone.
         """
         obj = self.data
         url = self.getUrl()
-
-        # hopefully when we discover what problems exist in slick to require this, we can take the loop out
-        last_stats_code = None
-        last_body = None
-        for retry in range(3):
-            try:
-                json_data = obj.to_json()
-                self.logger.debug("Making request to slick at url %s, with data: %s", url, json_data)
-                r = requests.put(url, data=json_data, headers=json_content)
-                self.logger.debug("Request returned status code %d", r.status_code)
-                if r.status_code is 200:
-                    return self.model.from_dict(r.json())
-                else:
-                    last_stats_code = r.status_code
-                    last_body = r.text
-                    self.logger.warn("Slick status code: %d", r.status_code)
-                    self.logger.warn("Body of what slick returned: %s", r.text)
-            except BaseException as error:
-                self.logger.warn("Received exception while connecting to slick at %s", url, exc_info=sys.exc_info())
-                traceback.print_exc()
-        raise SlickCommunicationError(
-            "Tried 3 times to request data from slick at url %s without a successful status code.  Last status code: %d, body: %s", url, last_stats_code, last_body)
+        if partial:
+            changes = obj.to_changes_dict()
+            changes['id'] = obj.id
+            json_data = jsonbackend.dumps_bytes(changes)
+        else:
+            json_data = obj.to_json_bytes()
+        self.logger.debug("Updating object at %s with data: %s", url, json_data)
+        r = self.get_connection().request('PUT', url, self.get_name(), self.logger, data=json_data,
+                                          headers=json_content)
+        obj.mark_clean()
+        return self.model.from_dict(r.content, is_json=True)
 
     put = update
 
@@ -205,24 +228,12 @@ class SlickApiPart(object):
         proj = slick.projects(proj).create()
         """
         obj = self.data
-        self.data = None
-        url = self.getUrl()
-
-        # hopefully when we discover what problems exist in slick to require this, we can take the loop out
-        for retry in range(3):
-            try:
-                json_data = obj.to_json()
-                self.logger.debug("Making request to slick at url %s, with data: %s", url, json_data)
-                r = requests.post(url, data=json_data, headers=json_content)
-                self.logger.debug("Request returned status code %d", r.status_code)
-                if r.status_code is 200:
-                    return self.model.from_dict(r.json())
-                else:
-                    self.logger.debug("Body of what slick returned: %s", r.text)
-            except BaseException as error:
-                self.logger.warn("Received exception while connecting to slick at %s", url, exc_info=sys.exc_info())
-        raise SlickCommunicationError(
-            "Tried 3 times to request data from slick at url %s without a successful status code.", url)
+        url = self.get_collection_url()
+        json_data = obj.to_json_bytes()
+        self.logger.debug("Creating object at %s with data: %s", url, json_data)
+        r = self.get_connection().request('POST', url, self.get_name(), self.logger, data=json_data,
+                                          headers=json_content)
+        return self.model.from_dict(r.content, is_json=True)
 
     post = create
 
@@ -232,39 +243,44 @@ class SlickApiPart(object):
         slick.projects("4fd8cd95e4b0ee7ba54b9885").remove()
         """
         url = self.getUrl()
-
-        # hopefully when we discover what problems exist in slick to require this, we can take the loop out
-        for retry in range(3):
-            try:
-                self.logger.debug("Making DELETE request to slick at url %s", url)
-                r = requests.delete(url)
-                self.logger.debug("Request returned status code %d", r.status_code)
-                if r.status_code is 200:
-                    return None
-                else:
-                    self.logger.debug("Body of what slick returned: %s", r.text)
-            except BaseException as error:
-                self.logger.warn("Received exception while connecting to slick at %s", url, exc_info=sys.exc_info())
-        raise SlickCommunicationError(
-            "Tried 3 times to request data from slick at url %s without a successful status code.", url)
+        self.get_connection().request('DELETE', url, self.get_name(), self.logger)
 
     delete = remove
 
     def getUrl(self):
-        url = self.parent.getUrl() + "/" + self.name
+        url = self.get_collection_url()
         if self.data is not None:
             if isinstance(self.data, Model) and hasattr(self.data, 'id'):
                 url = url + "/" + self.data.id
             else:
                 url = url + "/" + str(self.data)
-            self.data = None
         return url
 
+    def get_collection_url(self):
+        """The url of this part of the api, without the object it is bound to."""
+        return self.parent.getUrl() + "/" + self.name
+
     def __call__(self, *args, **kwargs):
         if len(args) > 0:
-            self.data = args[0]
+            return self.bind(args[0])
         return self
 
+    def bind(self, data):
+        """Return a copy of this api part bound to data (an object or an id)."""
+        bound = copy.copy(self)
+        bound.data = data
+        bound.adopt_children(self)
+        return bound
+
+    def adopt_children(self, original):
+        """Replace the child api parts copied from original with copies whose parent is this api part."""
+        for name, value in list(vars(self).items()):
+            if name != 'parent' and isinstance(value, SlickApiPart) and value.parent is original:
+                child = copy.copy(value)
+                child.parent = self
+                child.adopt_children(value)
+                setattr(self, name, child)
+
 
 class SlickProjectApiPart(SlickApiPart):
     def __init__(self, parentPart):
@@ -272,8 +288,7 @@ class SlickProjectApiPart(SlickApiPart):
 
     def findByName(self, name):
         """Find a project by it's name"""
-        self.data = "byname/" + quote(name) + '?quick=true'
-        return self.get()
+        return self.bind("byname/" + quote(name) + '?quick=true').get()
 
 
 class SystemConfigurationApiPart(SlickApiPart):
@@ -289,11 +304,12 @@ class SystemConfigurationApiPart(SlickApiPart):
         """Make a request for system-configuration, but you not only need to provide the data, but the model that is
         needed for return type.
         """
-        self.model = model
+        typed = copy.copy(self)
+        typed.model = model
         if data is not None:
-            return super(SystemConfigurationApiPart, self).__call__(data)
+            return typed.bind(data)
         else:
-            return self
+            return typed
 
     def find(self, query=None, **kwargs):
         instance = self.model()
@@ -301,51 +317,278 @@ class SystemConfigurationApiPart(SlickApiPart):
             kwargs['config-type'] = instance.configurationType
         return super(SystemConfigurationApiPart, self).find(query, **kwargs)
 
-def upload_chunks(url, stored_file, file_like_obj):
-    md5 = hashlib.md5()
-    bindata = file_like_obj.read(stored_file.chunkSize)
-    while bindata:
+def upload_chunks(url, stored_file, file_like_obj, connection=None, max_in_flight=4, md5=None, on_chunk=None):
+    """Upload the contents of file_like_obj to slick, stored_file.chunkSize bytes at a time, and set stored_file.md5.
+
+    Slick appends each chunk it receives to the file, so chunks have to be sent one after the other, in order.  What
+    can overlap is everything else: while one chunk is being sent by a background thread, the next ones (up to
+    max_in_flight of them) are read and hashed on the calling thread.  Set max_in_flight to 0 to read, hash and send
+    each chunk in turn.
+
+    When resuming an upload, pass the md5 of the data already uploaded as md5.  If on_chunk is given, it is called
+    after slick has acknowledged each chunk, with the md5 hex digest of everything uploaded up to and including that
+    chunk.
+    """
+    def send(chunk):
+        bindata, digest = chunk
+        if connection is None:
+            requests.post(url, data=bindata, headers=STREAM_CONTENT)
+        else:
+            # never retried: slick appends every chunk it gets, so one it got but didn't answer for would be appended
+            # twice.  A failed upload can be resumed instead (see upload_local_file).
+            connection.request('POST', url, 'slick.files.addchunk', data=bindata, headers=STREAM_CONTENT,
+                               retry_policy=NO_RETRY)
+        if on_chunk is not None:
+            on_chunk(digest)
+
+    if md5 is None:
+        md5 = hashlib.md5()
+
+    def read():
+        bindata = file_like_obj.read(stored_file.chunkSize)
         if isinstance(bindata, bytes):
             md5.update(bindata)
         elif isinstance(bindata, str):
             md5.update(bindata.encode('ascii', 'ignore'))
-        requests.post(url, data=bindata, headers={'Content-Type': 'application/octet-stream'})
-        bindata = file_like_obj.read(stored_file.chunkSize)
+        if not bindata:
+            return None
+        return bindata, md5.hexdigest() if on_chunk is not None else None
+
+    if max_in_flight < 1:
+        chunk = read()
+        while chunk:
+            send(chunk)
+            chunk = read()
+    else:
+        chunks = queue.Queue(maxsize=max_in_flight)
+        errors = []
+        deadline = current_deadline()
+
+        def sender():
+            # the requests count against the caller's deadline
+            with deadline_scope(deadline):
+                while True:
+                    chunk = chunks.get()
+                    if chunk is None:
+                        return
+                    # after a failure keep draining the queue, so the reader is never left blocked
+                    if not errors:
+                        try:
+                            send(chunk)
+                        except BaseException as error:
+                            errors.append(error)
+
+        thread = threading.Thread(target=sender, name="slick-upload-" + str(stored_file.id))
+        thread.daemon = True
+        thread.start()
+        try:
+            chunk = read()
+            while chunk and not errors:
+                chunks.put(chunk)
+                chunk = read()
+        finally:
+            chunks.put(None)
+            thread.join()
+        if errors:
+            raise errors[0]
     stored_file.md5 = md5.hexdigest()
 
+
+class UploadCheckpoint(object):
+    """A record (kept in a small json file) of how much of a local file has been uploaded to slick, so that an
+    interrupted upload can continue where it left off.
+
+    The checkpoint file is named after the slick url, and the path, size, modification time and requested chunk size
+    of the local file, so a file that has changed since is uploaded from the start.  It stores the id of the
+    StoredFile, the number of chunks slick has acknowledged and the md5 of the data in those chunks.  Python can't
+    save the internal state of an md5 object, so on resume the acknowledged part of the local file is hashed again,
+    and checked against the stored md5.
+    """
+
+    def __init__(self, checkpoint_dir, url, local_file_path, chunk_size=None):
+        if checkpoint_dir is None:
+            checkpoint_dir = os.path.join(tempfile.gettempdir(), 'slickqa-uploads')
+        local_file_path = os.path.abspath(local_file_path)
+        stat = os.stat(local_file_path)
+        key = "|".join([url, local_file_path, str(stat.st_size), repr(stat.st_mtime), str(chunk_size)])
+        self.path = os.path.join(checkpoint_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+        self.local_file_path = local_file_path
+        self.storedfile_id = None
+        self.chunks = 0
+        self.md5 = None
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as checkpoint_file:
+                    state = json.load(checkpoint_file)
+                self.storedfile_id = state['storedfile_id']
+                self.chunks = state['chunks']
+                self.md5 = state['md5']
+            except (ValueError, KeyError, IOError, OSError):
+                self.storedfile_id = None
+
+    def start(self, storedfile_id):
+        self.storedfile_id = storedfile_id
+        self.chunks = 0
+        self.md5 = hashlib.md5().hexdigest()
+        self.save()
+
+    def chunk_uploaded(self, md5):
+        self.chunks += 1
+        self.md5 = md5
+        self.save()
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as checkpoint_file:
+            json.dump({'storedfile_id': self.storedfile_id, 'chunks': self.chunks, 'md5': self.md5,
+                       'local_file_path': self.local_file_path}, checkpoint_file)
+        if hasattr(os, 'replace'):
+            os.replace(temp_path, self.path)
+        else:
+            os.rename(temp_path, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
 class StoredFileApiPart(SlickApiPart):
 
     def __init__(self, parentPart):
         super(StoredFileApiPart, self).__init__(StoredFile, parentPart, "files")
 
-    def upload_local_file(self, local_file_path, file_obj=None):
+    def upload_local_file(self, local_file_path, file_obj=None, chunk_size=None, max_in_flight=4, resumable=False,
+                          checkpoint_dir=None, deadline=None):
         """Create a Stored File and upload it's data.  This is a one part do it all type method.  Here is what
         it does:
             1. "Discover" information about the file (mime-type, size)
             2. Create the stored file object in slick
             3. Upload (chunked) all the data in the local file
             4. re-fetch the stored file object from slick, and return it
+
+        chunk_size is the size (in bytes) of the chunks to upload, by default slick picks it.  Larger chunks mean
+        fewer round trips for large files.  See upload_chunks for max_in_flight.
+
+        If resumable is True, a checkpoint of the upload (see UploadCheckpoint) is kept in checkpoint_dir (by default
+        a slickqa-uploads directory in the temp directory) as each chunk is acknowledged.  If the upload fails (or the
+        process is killed), calling upload_local_file again with the same file continues from the last acknowledged
+        chunk instead of starting over.  Resumable uploads need a local_file_path, not a file_obj.
+
+        The whole upload has to be done within deadline seconds, by default the connection's deadline (see
+        SlickConnection), which is likely too short for a large file.
         """
+        deadline = Deadline(deadline) if deadline is not None else self.get_connection().operation_deadline()
+        with deadline_scope(deadline):
+            return self._upload_local_file(local_file_path, file_obj, chunk_size, max_in_flight, resumable,
+                                           checkpoint_dir)
+
+    def _upload_local_file(self, local_file_path, file_obj, chunk_size, max_in_flight, resumable, checkpoint_dir):
+        if resumable and file_obj is not None:
+            raise ValueError("A resumable upload needs a local file path, not a file object.")
         if file_obj is None and not os.path.exists(local_file_path):
             return
-        storedfile = StoredFile()
-        storedfile.mimetype = mimetypes.guess_type(local_file_path)[0]
-        storedfile.filename = os.path.basename(local_file_path)
-        if file_obj is None:
-            storedfile.length = os.stat(local_file_path).st_size
-        else:
-            file_obj.seek(0,os.SEEK_END)
-            storedfile.length = file_obj.tell()
-            file_obj.seek(0)
-        storedfile = self(storedfile).create()
-        md5 = hashlib.md5()
+        checkpoint = None
+        storedfile = None
+        md5 = None
+        offset = 0
+        if resumable:
+            checkpoint = UploadCheckpoint(checkpoint_dir, self.get_connection().getUrl(), local_file_path, chunk_size)
+            if checkpoint.storedfile_id is not None:
+                storedfile, md5, offset = self._resume_upload(checkpoint)
+        if storedfile is None:
+            storedfile = StoredFile()
+            storedfile.mimetype = mimetypes.guess_type(local_file_path)[0]
+            storedfile.filename = os.path.basename(local_file_path)
+            if file_obj is None:
+                storedfile.length = os.stat(local_file_path).st_size
+            else:
+                file_obj.seek(0,os.SEEK_END)
+                storedfile.length = file_obj.tell()
+                file_obj.seek(0)
+            if chunk_size is not None:
+                storedfile.chunkSize = chunk_size
+            storedfile = self(storedfile).create()
+            if checkpoint is not None:
+                checkpoint.start(storedfile.id)
         url = self(storedfile).getUrl() + "/addchunk"
+        on_chunk = checkpoint.chunk_uploaded if checkpoint is not None else None
         if file_obj is None:
             with open(local_file_path, 'rb') as filecontents:
-                upload_chunks(url, storedfile, filecontents)
+                filecontents.seek(offset)
+                upload_chunks(url, storedfile, filecontents, self.get_connection(), max_in_flight, md5, on_chunk)
         else:
-            upload_chunks(url, storedfile, file_obj)
-        return self(storedfile).update()
+            upload_chunks(url, storedfile, file_obj, self.get_connection(), max_in_flight)
+        storedfile = self(storedfile).update()
+        if checkpoint is not None:
+            checkpoint.remove()
+        return storedfile
+
+    def _resume_upload(self, checkpoint):
+        """Get what is needed to continue an upload from a checkpoint: the stored file, the md5 object for the part
+        already uploaded and the offset to continue from.  If the upload can't be continued, the stored file is None.
+        """
+        try:
+            storedfile = self(checkpoint.storedfile_id).get()
+        except SlickCommunicationError:
+            self.logger.warn("Stored file %s from upload checkpoint %s no longer exists, starting the upload over.",
+                             checkpoint.storedfile_id, checkpoint.path)
+            return None, None, 0
+        offset = checkpoint.chunks * storedfile.chunkSize
+        md5 = hashlib.md5()
+        with open(checkpoint.local_file_path, 'rb') as filecontents:
+            remaining = offset
+            while remaining > 0:
+                bindata = filecontents.read(min(remaining, 1024 * 1024))
+                if not bindata:
+                    break
+                md5.update(bindata)
+                remaining -= len(bindata)
+        if md5.hexdigest() != checkpoint.md5:
+            self.logger.warn("Local file %s doesn't match upload checkpoint %s, starting the upload over.",
+                             checkpoint.local_file_path, checkpoint.path)
+            return None, None, 0
+        self.logger.info("Resuming upload of %s to stored file %s at chunk %d.", checkpoint.local_file_path,
+                         storedfile.id, checkpoint.chunks)
+        return storedfile, md5, offset
+
+
+class ResultApiPart(SlickApiPart):
+
+    def __init__(self, parentPart):
+        super(ResultApiPart, self).__init__(Result, parentPart)
+
+    def add_log_entries(self, entries):
+        """Add log entries to the end of a result's log, without sending the rest of the log (or result) again.
+        Example:
+        slick.results(result).add_log_entries([entry])
+        """
+        url = self.getUrl() + "/log"
+        json_data = jsonbackend.dumps_bytes([entry.to_dict(serial=True) for entry in entries])
+        self.get_connection().request('POST', url, self.get_name() + ".log", self.logger, data=json_data,
+                                      headers=json_content)
+
+    def update_changes(self):
+        """Send slick only what has changed in a result since it was last in sync: log entries added to the end of it's
+        log are appended with add_log_entries, and the other changed fields are sent as a partial update.  This way
+        the size of an update doesn't grow with the size of the result's log.  Example:
+        result.log.append(entry)
+        result.status = ResultStatus.PASS
+        slick.results(result).update_changes()
+        """
+        result = self.data
+        log = result.appended('log')
+        if log:
+            self.add_log_entries(log)
+            result.mark_clean('log')
+        if result.changed_fields():
+            self.update(partial=True)
 
 
 class TestrunGroupApiPart(SlickApiPart):
@@ -357,58 +600,89 @@ class TestrunGroupApiPart(SlickApiPart):
         id = testrun
         if isinstance(testrun, Testrun):
             id = testrun.id
-        url = self.getUrl()
-
-        # hopefully when we discover what problems exist in slick to require this, we can take the loop out
-        for retry in range(3):
-            try:
-                self.logger.debug("Making request to slick at url %s", url)
-                r = requests.post(url + "/addtestrun/" + id)
-                self.logger.debug("Request returned status code %d", r.status_code)
-                if r.status_code is 200:
-                    return self.model.from_dict(r.json())
-                else:
-                    self.logger.debug("Body of what slick returned: %s", r.text)
-            except BaseException as error:
-                self.logger.warn("Received exception while connecting to slick at %s", url, exc_info=sys.exc_info())
-        raise SlickCommunicationError(
-            "Tried 3 times to request data from slick at url %s without a successful status code.", url)
+        url = self.getUrl() + "/addtestrun/" + id
+        r = self.get_connection().request('POST', url, self.get_name() + ".addtestrun", self.logger)
+        return self.model.from_dict(r.content, is_json=True)
 
     def remove_testrun(self, testrun):
         id = testrun
         if isinstance(testrun, Testrun):
             id = testrun.id
-        url = self.getUrl()
-
-        # hopefully when we discover what problems exist in slick to require this, we can take the loop out
-        for retry in range(3):
-            try:
-                url = url + "/removetestrun/" + id
-                self.logger.debug("Making request to slick at url %s", url)
-                r = requests.delete(url)
-                self.logger.debug("Request returned status code %d", r.status_code)
-                if r.status_code is 200:
-                    return self.model.from_dict(r.json())
-                else:
-                    self.logger.debug("Body of what slick returned: %s", r.text)
-            except BaseException as error:
-                self.logger.warn("Received exception while connecting to slick at %s", url, exc_info=sys.exc_info())
-        raise SlickCommunicationError(
-            "Tried 3 times to request data from slick at url %s without a successful status code.", url)
+        url = self.getUrl() + "/removetestrun/" + id
+        r = self.get_connection().request('DELETE', url, self.get_name() + ".removetestrun", self.logger)
+        return self.model.from_dict(r.content, is_json=True)
 
 
+def close_response(future):
+    """Close the response of a request that lost a hedge, without reading it's body."""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
 
 
 class SlickCommunicationError(Exception):
+    # the status code of slick's last answer, if the error is because of one
+    status_code = None
+    # True if the error is because the deadline of the operation ran out
+    deadline_exceeded = False
+
     def __init__(self, *args, **kwargs):
         super(SlickCommunicationError, self).__init__(*args, **kwargs)
 
 
 class SlickConnection(object):
-    """Slick Connection contains the information on how to connect to slick."""
+    """Slick Connection contains the information on how to connect to slick.
+
+    Every request made through a connection (and all of it's api parts) goes through one http session, so tcp (and
+    tls) connections to slick are kept alive and reused instead of being opened for every request.  The pool can be
+    tuned with:
+     * pool_connections: the number of distinct hosts to keep a connection pool for.
+     * pool_maxsize: the maximum number of connections kept open to a single host.  If you use one connection from
+       many threads, make this at least the number of threads.
+     * pool_block: if True, a request waits for a free connection when pool_maxsize connections to the host are
+       already in use, instead of opening an extra (non-pooled) one.
+     * keep_alive: set to False to close the connection after every request (the old behavior).
+
+    Failed requests are retried according to retry_policy (see slickqa.retry.RetryPolicy), by default up to 3 tries
+    with a short exponential backoff, and only on connection errors and 5xx (or 408/429) responses.  Pass a
+    slickqa.retry.CircuitBreaker as circuit_breaker to fail fast while slick is unhealthy.  retry_stats() reports
+    how many retries and circuit breaker trips have happened.
+
+    Pass cache=True (or your own slickqa.cache.ResponseCache) to cache the entities that rarely change, like
+    projects, configurations and testplans.  cache_stats() reports the cache's hits and misses.
+
+    Identical GET requests made from several threads at the same time are sent to slick once, and all of the threads
+    get the answer (coalesce=False turns this off).  coalesce_stats() reports how many requests were coalesced.
+
+    The count, status codes, retries, bytes sent and received and latency percentiles of the requests to each
+    endpoint are recorded, metrics() returns them.  Pass a slickqa.metrics.RequestMetrics as request_metrics to
+    collect the metrics of several connections together.
+
+    Every attempt at a request gives up on connecting to slick after connect_timeout seconds, and on waiting for
+    (the next part of) slick's answer after read_timeout seconds, so a dead or half open connection can't hang the
+    caller.  Either can be None for no timeout.  If deadline is a number of seconds, each operation (a single api
+    call like create or find, including all of it's retries, or a whole upload_local_file) has to be done in that
+    much time: the timeouts are cut short to fit in it, no retry is made that can't finish in time, and once it has
+    passed a SlickCommunicationError (with deadline_exceeded set) is raised right away.  Use deadline() to give a
+    group of calls one deadline.
+
+    Pass hedge=True (or your own slickqa.retry.HedgePolicy) to send a GET again when slick takes longer than usual
+    (by default the 95th percentile of the endpoint's recent latency) to answer it, and use whichever answer comes
+    first.  hedge_stats() reports how many requests were hedged, and how often the hedge won.  Hedging needs spare
+    threads: up to pool_maxsize GETs are sent (and hedged) at a time.
+    """
     logger = logging.getLogger("slick.SlickConnection")
 
-    def __init__(self, baseUrl):
+    # the classes the api tree is built from, AsyncSlickConnection replaces them with awaitable versions
+    ApiPart = SlickApiPart
+    ProjectApiPart = SlickProjectApiPart
+    SystemConfigurationApiPart = SystemConfigurationApiPart
+    StoredFileApiPart = StoredFileApiPart
+    TestrunGroupApiPart = TestrunGroupApiPart
+    ResultApiPart = ResultApiPart
+
+    def __init__(self, baseUrl, pool_connections=10, pool_maxsize=10, pool_block=False, keep_alive=True,
+                 retry_policy=None, circuit_breaker=None, cache=None, coalesce=True, request_metrics=None,
+                 connect_timeout=10.0, read_timeout=60.0, deadline=None, hedge=None):
         """Create a new connection to slick, providing the base url under which to contact slick."""
         if baseUrl is None or not isinstance(baseUrl, str):
             SlickConnection.logger.error("Base URL provided to slick connection is not a string.")
@@ -418,23 +692,293 @@ class SlickConnection(object):
             self.baseUrl = baseUrl + "api"
         else:
             self.baseUrl = baseUrl + "/api"
-        self.configurations = SlickApiPart(Configuration, self)
-        self.projects = SlickProjectApiPart(self)
-        self.projects.releases = SlickApiPart(Release, self.projects)
-        self.projects.releases.builds = SlickApiPart(Build, self.projects.releases)
-        self.projects.components = SlickApiPart(Component, self.projects)
-        self.systemconfigurations = SystemConfigurationApiPart(self)
-        self.testplans = SlickApiPart(Testplan, self)
-        self.testruns = SlickApiPart(Testrun, self)
-        self.version = SlickApiPart(ProductVersion, self, name='version')
-        self.testcases = SlickApiPart(Testcase, self)
-        self.results = SlickApiPart(Result, self)
-        self.testrungroups = TestrunGroupApiPart(self)
-        self.hoststatus = SlickApiPart(HostStatus, self, name='hoststatus')
-        self.updates = SlickApiPart(SlickUpdate, self, name='updates')
-        self.updates.records = SlickApiPart(UpdateRecord, self.updates, name='records')
-        self.quotes = SlickApiPart(Quote, self)
-        self.files = StoredFileApiPart(self)
+        self.session = self.create_session(pool_connections, pool_maxsize, pool_block, keep_alive)
+        if retry_policy is None:
+            retry_policy = RetryPolicy()
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        if cache is True:
+            cache = ResponseCache()
+        self.cache = cache
+        self.single_flight = SingleFlight() if coalesce else None
+        if request_metrics is None:
+            request_metrics = RequestMetrics()
+        self.request_metrics = request_metrics
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.deadline_seconds = deadline
+        if hedge is True:
+            hedge = HedgePolicy()
+        self.hedge_policy = hedge
+        self.hedge_executor = None
+        self.hedge_workers = pool_maxsize * 2
+        self.hedge_lock = threading.Lock()
+        self.init_api()
+
+    def init_api(self):
+        """Build the tree of api parts."""
+        self.configurations = self.ApiPart(Configuration, self)
+        self.projects = self.ProjectApiPart(self)
+        self.projects.releases = self.ApiPart(Release, self.projects)
+        self.projects.releases.builds = self.ApiPart(Build, self.projects.releases)
+        self.projects.components = self.ApiPart(Component, self.projects)
+        self.systemconfigurations = self.SystemConfigurationApiPart(self)
+        self.testplans = self.ApiPart(Testplan, self)
+        self.testruns = self.ApiPart(Testrun, self)
+        self.version = self.ApiPart(ProductVersion, self, name='version')
+        self.testcases = self.ApiPart(Testcase, self)
+        self.results = self.ResultApiPart(self)
+        self.testrungroups = self.TestrunGroupApiPart(self)
+        self.hoststatus = self.ApiPart(HostStatus, self, name='hoststatus')
+        self.updates = self.ApiPart(SlickUpdate, self, name='updates')
+        self.updates.records = self.ApiPart(UpdateRecord, self.updates, name='records')
+        self.quotes = self.ApiPart(Quote, self)
+        self.files = self.StoredFileApiPart(self)
+
+    def create_session(self, pool_connections, pool_maxsize, pool_block, keep_alive):
+        """Create the http session (and it's connection pool) shared by all the api parts."""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        if not keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    def deadline(self, seconds):
+        """All the requests made by the calling thread inside the with block have to be done within seconds (a
+        deadline already in effect that is sooner still applies).  Example:
+            with slick.deadline(30):
+                result = slick.results(result).create()
+                slick.results(result).add_log_entries(entries)
+        """
+        return deadline_scope(Deadline(seconds))
+
+    def operation_deadline(self):
+        """The deadline a new operation has to be done by: the one in effect for the calling thread, or a new one
+        of deadline seconds (None if there isn't a deadline)."""
+        deadline = current_deadline()
+        if deadline is None and self.deadline_seconds is not None:
+            deadline = Deadline(self.deadline_seconds)
+        return deadline
+
+    def timeouts(self, deadline=None):
+        """The (connect, read) timeouts for an attempt at a request, cut short to what's left of deadline."""
+        if deadline is None:
+            return self.connect_timeout, self.read_timeout
+        remaining = deadline.remaining()
+        return tuple(remaining if timeout is None else min(timeout, remaining)
+                     for timeout in (self.connect_timeout, self.read_timeout))
+
+    def get_json(self, url, endpoint, model=None, logger=None):
+        """Make a GET request to slick and return the decoded json response.  If there is a cache, and it caches
+        responses for model, the response may come from the cache.  If the same url is already being requested by
+        another thread (since the last change this connection made), this waits for (and returns a copy of) it's
+        response."""
+        cache = self.cache
+        ttl = cache.ttl(model) if cache is not None else 0
+        generation = None
+        if cache is not None:
+            if ttl > 0:
+                content = cache.get(url)
+                if content is not None:
+                    return jsonbackend.loads(content)
+            generation = cache.generation()
+        if self.single_flight is None:
+            return self._get_json(url, endpoint, ttl, generation, logger)
+        # a request sent before a change may answer with what was there before it, so it isn't shared with the
+        # requests made after it
+        return self.single_flight.do((url, generation), self._get_json, url, endpoint, ttl, generation, logger)
+
+    def _get_json(self, url, endpoint, ttl, generation, logger):
+        cache = self.cache
+        r = self.request('GET', url, endpoint, logger)
+        if ttl > 0:
+            cache.put(url, r.content, ttl, generation)
+        return jsonbackend.loads(r.content)
+
+    def request(self, method, url, endpoint, logger=None, retry_policy=None, **kwargs):
+        """Make a request to slick, retrying it according to retry_policy (by default the connection's).  The
+        response (which will have a status code of 200) is returned, if no successful response could be gotten a
+        SlickCommunicationError is raised.  The endpoint is the name the circuit breaker tracks the health of the
+        request under.  Extra keyword arguments are passed to the session's request method.
+        """
+        if method == 'GET' or self.cache is None:
+            return self._request(method, url, endpoint, logger, retry_policy, **kwargs)
+        try:
+            return self._request(method, url, endpoint, logger, retry_policy, **kwargs)
+        finally:
+            # even a failed request may have changed something
+            self.invalidate(url)
+
+    def invalidate(self, url):
+        """Drop the cached responses for the collection (the first part of the path, like /api/projects) the url
+        is in."""
+        if self.cache is not None and url.startswith(self.baseUrl):
+            collection = url[len(self.baseUrl):].lstrip('/').split('?')[0].split('/')[0]
+            self.cache.invalidate(self.baseUrl + '/' + collection)
+
+    def _request(self, method, url, endpoint, logger=None, retry_policy=None, **kwargs):
+        if logger is None:
+            logger = self.logger
+        if retry_policy is None:
+            retry_policy = self.retry_policy
+        attempts = retry_policy.attempts()
+        breaker = self.circuit_breaker
+        bytes_sent = body_size(kwargs.get('data'))
+        deadline = self.operation_deadline()
+        timeout = kwargs.pop('timeout', None)
+        retry = False
+        while True:
+            status_code = None
+            body = None
+            if deadline is not None and deadline.expired():
+                raise self.deadline_error(method, url, deadline, attempts.attempt - 1)
+            if breaker is not None:
+                try:
+                    breaker.before_request(endpoint)
+                except CircuitOpenError as error:
+                    raise SlickCommunicationError("Not making request to slick at url {}: {}".format(url, error))
+            started = time.time()
+            try:
+                logger.debug("Making %s request to slick at url %s", method, url)
+                if self.hedge_policy is not None and method == 'GET' and not kwargs.get('stream'):
+                    r = self.hedged_request(url, endpoint, timeout=timeout or self.timeouts(deadline), **kwargs)
+                else:
+                    r = self.session.request(method, url, timeout=timeout or self.timeouts(deadline), **kwargs)
+                logger.debug("Request returned status code %d", r.status_code)
+                if kwargs.get('stream'):
+                    bytes_received = int(r.headers.get('Content-Length', 0))
+                else:
+                    bytes_received = len(r.content)
+                self.request_metrics.record(endpoint, method, r.status_code, time.time() - started, bytes_sent,
+                                            bytes_received, retry)
+                if r.status_code == 200:
+                    if breaker is not None:
+                        breaker.record_success(endpoint)
+                    return r
+                status_code = r.status_code
+                body = r.text
+                logger.warn("Slick returned status code %d for %s request to %s, body: %s", status_code, method,
+                            url, body)
+            except Exception:
+                self.request_metrics.record(endpoint, method, None, time.time() - started, bytes_sent, 0, retry)
+                logger.warn("Received exception while connecting to slick at %s", url, exc_info=sys.exc_info())
+            if breaker is not None:
+                if status_code is None or retry_policy.is_retryable_status(status_code):
+                    breaker.record_failure(endpoint)
+                else:
+                    # slick answered, it's just not an answer we like
+                    breaker.record_success(endpoint)
+            delay = attempts.next_delay(status_code)
+            if delay is not None and deadline is not None and delay >= deadline.remaining():
+                # the retry couldn't be made in time
+                raise self.deadline_error(method, url, deadline, attempts.attempt - 1, status_code, body)
+            if delay is None and deadline is not None and deadline.expired():
+                # the last attempt was cut short by the deadline
+                raise self.deadline_error(method, url, deadline, attempts.attempt, status_code, body)
+            if delay is None:
+                error = SlickCommunicationError(
+                    "Tried {} times to request data from slick at url {} without a successful status code.  Last "
+                    "status code: {}, body: {}".format(attempts.attempt, url, status_code, body))
+                error.status_code = status_code
+                raise error
+            time.sleep(delay)
+            retry = True
+
+    def hedged_request(self, url, endpoint, **kwargs):
+        """Send a GET (one attempt at it), and if it isn't answered within the hedge policy's delay, send it again;
+        the response that arrives first is returned.  Both are streamed, so the one that loses is closed as soon as
+        it's headers arrive, without reading it's body."""
+        policy = self.hedge_policy
+        delay = policy.delay(endpoint)
+        started = time.time()
+        if delay is None:
+            # no need for another thread
+            r = self.session.request('GET', url, stream=True, **kwargs)
+            policy.record(endpoint, time.time() - started)
+            return self.read_response(r)
+
+        def record_latency(future):
+            if not future.cancelled() and future.exception() is None:
+                policy.record(endpoint, time.time() - started)
+
+        executor = self.get_hedge_executor()
+        primary = executor.submit(self.session.request, 'GET', url, stream=True, **kwargs)
+        primary.add_done_callback(record_latency)
+        if wait([primary], timeout=delay).done:
+            return self.read_response(primary.result())
+
+        policy.hedged()
+        hedge = executor.submit(self.session.request, 'GET', url, stream=True, **kwargs)
+        pending = [primary, hedge]
+        winner = None
+        while winner is None and pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = next((future for future in done if future.exception() is None), None)
+        for future in (primary, hedge):
+            if future is not winner:
+                # closed now if it's done, or as soon as it is
+                future.add_done_callback(close_response)
+        won = winner is hedge
+        if won:
+            policy.hedge_won()
+        self.request_metrics.record_hedge(endpoint, 'GET', won)
+        if winner is None:
+            # both failed, the first one's error is as good as any
+            raise primary.exception()
+        return self.read_response(winner.result())
+
+    def read_response(self, r):
+        # read the body of a streamed response, so it's like a response that wasn't
+        r.content
+        return r
+
+    def get_hedge_executor(self):
+        with self.hedge_lock:
+            if self.hedge_executor is None:
+                self.hedge_executor = ThreadPoolExecutor(max_workers=self.hedge_workers)
+            return self.hedge_executor
+
+    def hedge_stats(self):
+        """The hedge policy's counters (see HedgePolicy.stats), or None if hedging is turned off."""
+        if self.hedge_policy is not None:
+            return self.hedge_policy.stats()
+
+    def deadline_error(self, method, url, deadline, attempts, status_code=None, body=None):
+        error = SlickCommunicationError(
+            "The {}s deadline for the {} request to slick at url {} ran out after {} attempt(s).  Last status "
+            "code: {}, body: {}".format(deadline.seconds, method, url, attempts, status_code, body))
+        error.status_code = status_code
+        error.deadline_exceeded = True
+        return error
+
+    def metrics(self):
+        """A snapshot of the metrics recorded for the requests made to slick (see slickqa.metrics.RequestMetrics),
+        for example:
+            slick.metrics()['slick.results']['PUT']['latency']['p99']
+        """
+        return self.request_metrics.snapshot()
+
+    def retry_stats(self):
+        """Counters for how many requests were retried, and (if there is a circuit breaker) how many times a
+        circuit opened and how many requests were failed fast because of an open circuit."""
+        stats = {'retries': self.retry_policy.retries}
+        if self.circuit_breaker is not None:
+            stats['breaker_trips'] = self.circuit_breaker.trips
+            stats['breaker_rejected'] = self.circuit_breaker.rejected
+        return stats
+
+    def cache_stats(self):
+        """The cache's counters (see ResponseCache.stats), or None if there isn't a cache."""
+        if self.cache is not None:
+            return self.cache.stats()
+
+    def coalesce_stats(self):
+        """How many GET requests were answered by an identical request another thread had in flight, or None if
+        coalescing is turned off."""
+        if self.single_flight is not None:
+            return self.single_flight.stats()
 
     def getUrl(self):
         """This method is used by the slick api parts to get the base url."""
@@ -442,3 +986,20 @@ class SlickConnection(object):
 
     def get_name(self):
         return "slick"
+
+    def get_connection(self):
+        return self
+
+    def close(self):
+        """Close all the pooled connections to slick."""
+        self.session.close()
+        with self.hedge_lock:
+            if self.hedge_executor is not None:
+                self.hedge_executor.shutdown(wait=False)
+                self.hedge_executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -153,7 +153,7 @@ class Component(micromodels.Model):
 class DataDrivenPropertyType(micromodels.Model):
     name = micromodels.StringField()
     requirement = micromodels.BooleanField()
-    standardValues = micromodels.FieldCollectionField(micromodels.StringField)
+    standardValues = micromodels.FieldCollectionField(micromodels.StringField())
 
 
 class Project(micromodels.Model):
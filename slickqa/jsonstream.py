@@ -0,0 +1,100 @@
+"""
+Incremental decoding of a json array, so that large responses from slick can be processed one item at a time
+instead of loading the whole response (and all of the decoded items) into memory.
+"""
+import codecs
+import json
+
+_WHITESPACE = ' \t\n\r'
+_DELIMITERS = _WHITESPACE + ',]'
+
+
+class JsonArrayStreamDecoder(object):
+    """Decode the items of a top level json array as the bytes of it arrive.
+
+    Feed the decoder chunks of bytes, each call to feed returns the list of items that were completed by that chunk.
+    Only the text of the item currently being decoded is kept, so memory use is bounded by the size of a single
+    item (plus a chunk), not the size of the array.
+
+    Example:
+        decoder = JsonArrayStreamDecoder()
+        for chunk in response.iter_content(65536):
+            for item in decoder.feed(chunk):
+                print(item)
+        decoder.close()
+    """
+
+    def __init__(self, encoding='utf-8'):
+        self.buffer = ''
+        self.position = 0
+        self.started = False
+        self.finished = False
+        self.expect_separator = False
+        self.text_decoder = codecs.getincrementaldecoder(encoding)()
+        self.json_decoder = json.JSONDecoder()
+
+    def feed(self, data, final=False):
+        """Add the next chunk of the document, and return the items it completed."""
+        if isinstance(data, bytes):
+            data = self.text_decoder.decode(data, final)
+        self.buffer = self.buffer[self.position:] + data
+        self.position = 0
+        items = []
+        while not self.finished:
+            position = self._skip_whitespace(self.position)
+            if position == len(self.buffer):
+                break
+            char = self.buffer[position]
+            if not self.started:
+                if char != '[':
+                    raise ValueError("Expected a json array, but it starts with {!r}".format(char))
+                self.started = True
+                self.position = position + 1
+                continue
+            if char == ']':
+                self.finished = True
+                self.position = position + 1
+                break
+            if self.expect_separator:
+                if char != ',':
+                    raise ValueError("Expected ',' or ']' between array items, got {!r}".format(char))
+                self.expect_separator = False
+                self.position = position + 1
+                continue
+            try:
+                item, end = self.json_decoder.raw_decode(self.buffer, position)
+            except ValueError:
+                # the item isn't complete yet
+                break
+            if not final and isinstance(item, (int, float)) and \
+                    (end == len(self.buffer) or self.buffer[end] not in _DELIMITERS):
+                # a number at the end of the buffer (like "1" or "1.") might continue in the next chunk
+                break
+            items.append(item)
+            self.expect_separator = True
+            self.position = end
+        if final:
+            self.close()
+        return items
+
+    def close(self):
+        """Signal the end of the document, raises ValueError if the array was not complete."""
+        if not self.finished:
+            raise ValueError("The json array was not complete, {} characters left undecoded: {!r}".format(
+                len(self.buffer) - self.position, self.buffer[self.position:self.position + 100]))
+
+    def _skip_whitespace(self, position):
+        buffer = self.buffer
+        while position < len(buffer) and buffer[position] in _WHITESPACE:
+            position += 1
+        return position
+
+
+def iter_json_array(chunks, encoding='utf-8'):
+    """A generator of the items of a json array, given an iterable of the chunks (bytes) of the document."""
+    decoder = JsonArrayStreamDecoder(encoding)
+    for chunk in chunks:
+        for item in decoder.feed(chunk):
+            yield item
+    for item in decoder.feed(b'', final=True):
+        yield item
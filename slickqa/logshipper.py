@@ -0,0 +1,146 @@
+"""
+Ships the log entries of results to slick in the background, in batches, so logging from a test never waits on
+slick.
+"""
+import collections
+import logging
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from .connection import SlickCommunicationError
+from .spool import wait_for
+
+
+class LogShipper(object):
+    """Log entries given to ship() go into a bounded queue, and a background thread sends them to slick, appending
+    them to their result's log (see ResultApiPart.add_log_entries).
+
+    Entries are sent in batches: a batch is sent once it has max_batch entries, or max_delay seconds after it's first
+    entry was queued, whichever comes first.  Entries for the same result are sent in one request, and in the order
+    they were shipped.
+
+    The queue holds at most max_queue entries.  When it is full, ship() waits up to put_timeout seconds for room
+    (backpressure on a test that logs faster than slick can take it), and if there still isn't room the entry is
+    dropped and counted, ship() never waits on the network itself.  A batch that can't be sent (after the
+    connection's retries) is dropped and counted as failed.
+
+    Example:
+        shipper = LogShipper(slick)
+        shipper.ship(result.id, entry)
+        ...
+        shipper.close(timeout=30)
+    """
+
+    def __init__(self, connection, max_batch=100, max_delay=1.0, max_queue=10000, put_timeout=0):
+        self.logger = logging.getLogger('slick.LogShipper')
+        self.connection = connection
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.put_timeout = put_timeout
+        self.queue = queue.Queue(max_queue)
+        self.condition = threading.Condition()
+        self.stopping = threading.Event()
+        self.outstanding = 0
+        self.shipped = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.thread = threading.Thread(target=self.run, name='slick-log-shipper')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def ship(self, result_id, entry):
+        """Queue a log entry to be added to the log of the result with result_id.  Returns False if the queue was full
+        and the entry was dropped."""
+        with self.condition:
+            self.outstanding += 1
+        try:
+            if self.put_timeout:
+                self.queue.put((result_id, entry), timeout=self.put_timeout)
+            else:
+                self.queue.put_nowait((result_id, entry))
+            return True
+        except queue.Full:
+            with self.condition:
+                self.outstanding -= 1
+                self.dropped += 1
+                self.condition.notify_all()
+            return False
+
+    def flush(self, timeout=None):
+        """Wait until every entry shipped so far has been sent (or given up on).  Returns False if timeout seconds
+        passed first."""
+        with self.condition:
+            return wait_for(self.condition, lambda: self.outstanding == 0, timeout)
+
+    def close(self, timeout=None):
+        """Send what is queued (waiting up to timeout seconds), then stop the background thread.  Entries still
+        queued when the timeout runs out are not sent."""
+        end = None if timeout is None else time.time() + timeout
+        flushed = self.flush(timeout)
+        self.stopping.set()
+        try:
+            # wake the thread up if it's waiting for an entry, if the queue is full it isn't
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self.thread.join(None if end is None else max(0, end - time.time()))
+        return flushed
+
+    def run(self):
+        while not self.stopping.is_set():
+            item = self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.time() + self.max_delay
+            stopping = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                if self.stopping.is_set():
+                    stopping = True
+                    break
+            self.send(batch)
+            if stopping:
+                return
+
+    def send(self, batch):
+        by_result = collections.OrderedDict()
+        for result_id, entry in batch:
+            by_result.setdefault(result_id, []).append(entry)
+        for result_id, entries in by_result.items():
+            try:
+                self.connection.results(result_id).add_log_entries(entries)
+                sent = True
+            except SlickCommunicationError as error:
+                self.logger.error("Unable to add %d log entries to result %s: %s", len(entries), result_id, error)
+                sent = False
+            with self.condition:
+                if sent:
+                    self.shipped += len(entries)
+                else:
+                    self.failed += len(entries)
+                self.outstanding -= len(entries)
+                self.condition.notify_all()
+        with self.condition:
+            self.batches += 1
+
+    def stats(self):
+        with self.condition:
+            return {'queued': self.outstanding, 'shipped': self.shipped, 'dropped': self.dropped,
+                    'failed': self.failed, 'batches': self.batches}
@@ -0,0 +1,149 @@
+"""
+Instrumentation of the requests a SlickConnection makes, so you can tell how much of a slow run was spent waiting on
+slick.
+"""
+import math
+import threading
+
+
+class LatencyHistogram(object):
+    """A histogram of latencies (in seconds) with logarithmic buckets.
+
+    Each bucket is about 19% (a fourth root of 2) wider than the one before it, starting at 0.1 milliseconds, so
+    percentiles are accurate to within that much no matter how slow or fast requests are, and the memory used doesn't
+    grow with the number of requests recorded.
+    """
+
+    smallest = 0.0001
+    buckets_per_doubling = 4
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, latency):
+        if latency <= self.smallest:
+            bucket = 0
+        else:
+            bucket = int(math.ceil(math.log(latency / self.smallest, 2) * self.buckets_per_doubling))
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += latency
+        if self.min is None or latency < self.min:
+            self.min = latency
+        if self.max is None or latency > self.max:
+            self.max = latency
+
+    def percentile(self, percent):
+        """The latency percent percent of the recorded latencies were at or below (the top of it's bucket, capped
+        by the largest latency recorded), None if nothing has been recorded."""
+        if self.count == 0:
+            return None
+        rank = max(1, int(math.ceil(self.count * percent / 100.0)))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(self.max, self.smallest * (2 ** (float(bucket) / self.buckets_per_doubling)))
+        return self.max
+
+    def snapshot(self):
+        if self.count == 0:
+            return {'count': 0}
+        return {'count': self.count, 'mean': self.total / self.count, 'min': self.min, 'max': self.max,
+                'p50': self.percentile(50), 'p90': self.percentile(90), 'p99': self.percentile(99)}
+
+
+class EndpointMetrics(object):
+    """The counters for one endpoint and http method."""
+
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.status_codes = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.latency = LatencyHistogram()
+
+    def snapshot(self):
+        return {'requests': self.requests, 'retries': self.retries, 'status_codes': dict(self.status_codes),
+                'bytes_sent': self.bytes_sent, 'bytes_received': self.bytes_received,
+                'hedges': self.hedges, 'hedge_wins': self.hedge_wins, 'latency': self.latency.snapshot()}
+
+
+class RequestMetrics(object):
+    """Records every attempt a connection makes to talk to slick, by endpoint (slick.results, slick.files.addchunk,
+    slick.testrungroups.addtestrun, ...) and http method.
+
+    For each endpoint and method it keeps:
+     * requests: the number of requests made (not counting retries).
+     * retries: the number of retries of those requests.
+     * status_codes: how many attempts got each status code, attempts that failed with an exception (connection
+       refused, reset, ...) are counted under 'error'.
+     * bytes_sent and bytes_received: the size of the request and response bodies.  Streamed responses are counted
+       by their Content-Length header.
+     * latency: the count, mean, min, max and 50th, 90th and 99th percentile of how long each attempt took (until
+       the whole response was read, or for streamed responses until the headers were).
+     * hedges and hedge_wins: how many attempts were hedged (see slickqa.retry.HedgePolicy), and how many times the
+       hedge answered first.  A hedge isn't counted as a request (or retry) of it's own.
+    """
+
+    def __init__(self):
+        self.endpoints = {}
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, method, status_code, latency, bytes_sent=0, bytes_received=0, retry=False):
+        """Record one attempt at a request, status_code is None if the attempt raised an exception."""
+        key = (endpoint, method)
+        with self.lock:
+            metrics = self.endpoints.get(key)
+            if metrics is None:
+                metrics = self.endpoints[key] = EndpointMetrics()
+            if retry:
+                metrics.retries += 1
+            else:
+                metrics.requests += 1
+            status = 'error' if status_code is None else status_code
+            metrics.status_codes[status] = metrics.status_codes.get(status, 0) + 1
+            metrics.bytes_sent += bytes_sent
+            metrics.bytes_received += bytes_received
+            metrics.latency.record(latency)
+
+    def record_hedge(self, endpoint, method, won):
+        """Record that an attempt was hedged, and if the hedge answered first."""
+        with self.lock:
+            metrics = self.endpoints.get((endpoint, method))
+            if metrics is None:
+                metrics = self.endpoints[(endpoint, method)] = EndpointMetrics()
+            metrics.hedges += 1
+            if won:
+                metrics.hedge_wins += 1
+
+    def snapshot(self):
+        """A dictionary of endpoint to a dictionary of http method to it's metrics."""
+        with self.lock:
+            snapshot = {}
+            for (endpoint, method), metrics in self.endpoints.items():
+                snapshot.setdefault(endpoint, {})[method] = metrics.snapshot()
+            return snapshot
+
+    def reset(self):
+        with self.lock:
+            self.endpoints.clear()
+
+
+def body_size(data):
+    """The number of bytes a request body will take, 0 for anything that isn't bytes or text (like a file)."""
+    if data is None:
+        return 0
+    if isinstance(data, bytes):
+        return len(data)
+    try:
+        return len(data.encode('utf-8'))
+    except AttributeError:
+        return 0
@@ -1,4 +1,5 @@
 from .models import Model
+from . import jsonbackend
 from .fields import BaseField, CharField, StringField, IntegerField, FloatField,\
                     BooleanField, DateTimeField, DateField, TimeField,\
                     ModelField, ModelCollectionField, FieldCollectionField
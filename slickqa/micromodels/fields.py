@@ -1,4 +1,6 @@
 import datetime
+import threading
+
 from .packages import PySO8601
 
 
@@ -20,11 +22,23 @@ class BaseField(object):
 
     def to_python(self):
         '''After being populated, this method casts the source data into a
-        Python object. The default behavior is to simply return the source
-        value. Subclasses should override this method.
+        Python object, see :meth:`convert`.
+
+        '''
+        return self.convert(self.data, getattr(self, '_related_obj', None))
+
+    def convert(self, data, related_obj=None):
+        '''Cast the source data into a Python object. The default behavior
+        is to simply return the source value. Subclasses should override this
+        method.
+
+        A field is shared by every instance of the model class it's on, so
+        this must not store anything on the field: the same field can be
+        converting data for several instances, on several threads, at once.
+        related_obj is the instance the value is for.
 
         '''
-        return self.data
+        return data
 
     def to_serial(self, data):
         '''Used to serialize forms back into JSON or other formats.
@@ -41,68 +55,56 @@ class BaseField(object):
 class CharField(BaseField):
     """Field to represent a simple Unicode string value."""
 
-    def to_python(self):
-        """Convert the data supplied using the :meth:`populate` method to a
-        Unicode string.
-
-        """
-        if self.data is None:
+    def convert(self, data, related_obj=None):
+        """Convert data to a Unicode string."""
+        if data is None:
             return ''
-        return str(self.data)
+        return str(data)
 
 
 class StringField(BaseField):
     """Field to represent a simple Unicode string value."""
 
-    def to_python(self):
-        """Convert the data supplied using the :meth:`populate` method to a
-        Unicode string.
-
-        """
-        if self.data is None:
+    def convert(self, data, related_obj=None):
+        """Convert data to a Unicode string."""
+        if data is None:
             return ''
-        return self.data
+        return data
 
 
 class IntegerField(BaseField):
     """Field to represent an integer value"""
 
-    def to_python(self):
-        """Convert the data supplied to the :meth:`populate` method to an
-        integer.
-
-        """
-        if self.data is None:
+    def convert(self, data, related_obj=None):
+        """Convert data to an integer."""
+        if data is None:
             return 0
-        return int(self.data)
+        return int(data)
 
 
 class FloatField(BaseField):
     """Field to represent a floating point value"""
 
-    def to_python(self):
-        """Convert the data supplied to the :meth:`populate` method to a
-        float.
-
-        """
-        if self.data is None:
+    def convert(self, data, related_obj=None):
+        """Convert data to a float."""
+        if data is None:
             return 0.0
-        return float(self.data)
+        return float(data)
 
 
 class BooleanField(BaseField):
     """Field to represent a boolean"""
 
-    def to_python(self):
+    def convert(self, data, related_obj=None):
         """The string ``'True'`` (case insensitive) will be converted
         to ``True``, as will any positive integers.
 
         """
-        if isinstance(self.data, str):
-            return self.data.strip().lower() == 'true'
-        if isinstance(self.data, int):
-            return self.data > 0
-        return bool(self.data)
+        if isinstance(data, str):
+            return data.strip().lower() == 'true'
+        if isinstance(data, int):
+            return data > 0
+        return bool(data)
 
 
 class DateTimeField(BaseField):
@@ -122,22 +124,22 @@ class DateTimeField(BaseField):
         self.serial_format = serial_format
         self.use_int = use_int
 
-    def to_python(self):
+    def convert(self, data, related_obj=None):
         '''A :class:`datetime.datetime` object is returned.'''
 
-        if self.data is None:
+        if data is None:
             return None
 
         # don't parse data that is already native
-        if isinstance(self.data, datetime.datetime):
-            return self.data
+        if isinstance(data, datetime.datetime):
+            return data
         elif self.use_int:
-            return datetime.datetime.utcfromtimestamp(self.data / 1000)
+            return datetime.datetime.utcfromtimestamp(data / 1000)
         elif self.format is None:
             # parse as iso8601
-            return PySO8601.parse(self.data)
+            return PySO8601.parse(data)
         else:
-            return datetime.datetime.strptime(self.data, self.format)
+            return datetime.datetime.strptime(data, self.format)
 
     def to_serial(self, time_obj):
         if self.use_int:
@@ -153,27 +155,27 @@ class DateTimeField(BaseField):
 class DateField(DateTimeField):
     """Field to represent a :mod:`datetime.date`"""
 
-    def to_python(self):
+    def convert(self, data, related_obj=None):
         # don't parse data that is already native
-        if isinstance(self.data, datetime.date):
-            return self.data
+        if isinstance(data, datetime.date):
+            return data
         
-        dt = super(DateField, self).to_python()
+        dt = super(DateField, self).convert(data, related_obj)
         return dt.date()
 
 
 class TimeField(DateTimeField):
     """Field to represent a :mod:`datetime.time`"""
 
-    def to_python(self):
+    def convert(self, data, related_obj=None):
         # don't parse data that is already native
-        if isinstance(self.data, datetime.datetime):
-            return self.data
+        if isinstance(data, datetime.datetime):
+            return data
         elif self.format is None:
             # parse as iso8601
-            return PySO8601.parse_time(self.data).time()
+            return PySO8601.parse_time(data).time()
         else:
-            return datetime.datetime.strptime(self.data, self.format).time()
+            return datetime.datetime.strptime(data, self.format).time()
 
 
 class WrappedObjectField(BaseField):
@@ -222,15 +224,15 @@ class ModelField(WrappedObjectField):
         u'Some nested value'
 
     """
-    def to_python(self):
-        if isinstance(self.data, self._wrapped_class):
-            obj = self.data
+    def convert(self, data, related_obj=None):
+        if isinstance(data, self._wrapped_class):
+            obj = data
         else:
-            obj = self._wrapped_class.from_dict(self.data or {})
+            obj = self._wrapped_class.from_dict(data or {})
 
         # Set the related object to the related field
         if self._related_name is not None:
-            setattr(obj, self._related_name, self._related_obj)
+            setattr(obj, self._related_name, related_obj)
 
         return obj
 
@@ -271,13 +273,14 @@ class ModelCollectionField(WrappedObjectField):
         [u'First value', u'Second value', u'Third value']
 
     """
-    def to_python(self):
+    def convert(self, data, related_obj=None):
         object_list = []
-        if self.data is not None:
-            for item in self.data:
-                obj = self._wrapped_class.from_dict(item)
+        if data is not None:
+            from_dict = self._wrapped_class.from_dict
+            for item in data:
+                obj = from_dict(item)
                 if self._related_name is not None:
-                    setattr(obj, self._related_name, self._related_obj)
+                    setattr(obj, self._related_name, related_obj)
                 object_list.append(obj)
 
         return object_list
@@ -353,12 +356,31 @@ class FieldCollectionField(BaseField):
     def __init__(self, field_instance, **kwargs):
         super(FieldCollectionField, self).__init__(**kwargs)
         self._instance = field_instance
+        self._convert_item = converter(field_instance)
 
-    def to_python(self):
-        def convert(item):
-            self._instance.populate(item)
-            return self._instance.to_python()
-        return [convert(item) for item in self.data or []]
+    def convert(self, data, related_obj=None):
+        convert_item = self._convert_item
+        return [convert_item(item, related_obj) for item in data or []]
 
     def to_serial(self, list_of_fields):
         return [self._instance.to_serial(data) for data in list_of_fields]
+
+
+def converter(field):
+    """A function converting a source value to a python value for field, called with the value and the instance it's
+    for, that can be called from any number of threads at once.  That's field.convert, unless field is of a class
+    written before convert existed that only overrides populate and to_python, then it's those, one call at a time.
+    """
+    mro = type(field).__mro__
+    convert_owner = next(cls for cls in mro if 'convert' in cls.__dict__)
+    to_python_owner = next(cls for cls in mro if 'to_python' in cls.__dict__)
+    if mro.index(to_python_owner) >= mro.index(convert_owner):
+        return field.convert
+    lock = threading.Lock()
+
+    def convert(data, related_obj=None):
+        with lock:
+            field.populate(data)
+            field._related_obj = related_obj
+            return field.to_python()
+    return convert
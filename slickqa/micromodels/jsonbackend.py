@@ -0,0 +1,145 @@
+'''The json library models are encoded and decoded with.
+
+By default that's simplejson if it's installed, and the json module if it
+isn't.  :func:`set_backend` picks another one, for all models (and the
+slick client, which decodes it's responses and encodes it's requests with
+the same backend):
+
+    from slickqa.micromodels import jsonbackend
+    jsonbackend.set_backend('orjson')      # or 'fastest'
+
+Every backend can decode bytes as well as text, and encode straight to
+(utf-8) bytes with ``dumps_bytes``, so a response body can be turned into
+models, and models into a request body, without going through text first.
+
+'''
+import json
+import sys
+
+
+class JsonBackend(object):
+    '''A json library.  Subclasses implement ``loads`` and either ``dumps``
+    or ``dumps_bytes``.'''
+
+    name = None
+
+    def loads(self, data):
+        '''Decode a json document given as text or (utf-8) bytes.'''
+        raise NotImplementedError()
+
+    def dumps(self, obj):
+        '''Encode obj as json text.'''
+        return self.dumps_bytes(obj).decode('utf-8')
+
+    def dumps_bytes(self, obj):
+        '''Encode obj as utf-8 json bytes.'''
+        return self.dumps(obj).encode('utf-8')
+
+    def __repr__(self):
+        return '<%s json backend>' % self.name
+
+
+class StdlibBackend(JsonBackend):
+    name = 'json'
+
+    def __init__(self, module=json):
+        self.module = module
+        self.loads = module.loads
+        self.dumps = module.dumps
+        if module is json and (3, 0) <= sys.version_info < (3, 6):
+            # json.loads only takes bytes from python 3.6
+            self.loads = self.loads_text
+
+    def loads_text(self, data):
+        '''Decode data, decoding it from utf-8 to text first if it's bytes.'''
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        return self.module.loads(data)
+
+
+class SimplejsonBackend(StdlibBackend):
+    name = 'simplejson'
+
+    def __init__(self):
+        import simplejson
+        super(SimplejsonBackend, self).__init__(simplejson)
+
+
+class OrjsonBackend(JsonBackend):
+    '''orjson, which only encodes to bytes, and (unlike the others) writes
+    non ascii characters as they are, instead of escaping them.'''
+
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self.module = orjson
+        self.loads = orjson.loads
+        self.options = orjson.OPT_NON_STR_KEYS
+
+    def dumps_bytes(self, obj):
+        return self.module.dumps(obj, option=self.options)
+
+
+# name: backend class, fastest first
+BACKENDS = (
+    ('orjson', OrjsonBackend),
+    ('simplejson', SimplejsonBackend),
+    ('json', StdlibBackend),
+)
+
+
+def available_backends():
+    '''The names of the backends that can be used here, fastest first.'''
+    names = []
+    for name, backend_class in BACKENDS:
+        try:
+            backend_class()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def create_backend(name):
+    '''The backend called name, 'fastest' for the fastest one available.
+    Raises ImportError if it's library isn't installed.'''
+    if name == 'fastest':
+        name = available_backends()[0]
+    for backend_name, backend_class in BACKENDS:
+        if backend_name == name:
+            return backend_class()
+    raise ValueError("Unknown json backend '%s', the choices are: %s" %
+                     (name, ', '.join(['fastest'] + [n for n, c in BACKENDS])))
+
+
+def set_backend(backend):
+    '''Use backend (the name of one, see :func:`create_backend`, or a
+    :class:`JsonBackend`) from now on, and return it.'''
+    global current
+    if not isinstance(backend, JsonBackend):
+        backend = create_backend(backend)
+    current = backend
+    return backend
+
+
+def get_backend():
+    return current
+
+
+def loads(data):
+    return current.loads(data)
+
+
+def dumps(obj):
+    return current.dumps(obj)
+
+
+def dumps_bytes(obj):
+    return current.dumps_bytes(obj)
+
+
+try:
+    current = SimplejsonBackend()
+except ImportError:
+    current = StdlibBackend()
@@ -1,27 +1,143 @@
-try:
-    import simplejson as json
-except ImportError:
-    import json
-
-from .fields import BaseField, WrappedObjectField
+from . import jsonbackend
+from .fields import BaseField, WrappedObjectField, converter
 
 
 class MicromodelsMetaclass(type):
     '''Creates the metaclass for Model. The main function of this metaclass
-    is to move all of fields into the _fields variable on the class.
+    is to move all of fields into the _fields variable on the class, and to
+    compile the class's :class:`ModelCodec` from them.
+
+    A class with ``_compact = True`` (and it's subclasses) is given
+    ``__slots__`` for it's fields, see :class:`Model`.
     '''
-    def __init__(cls, name, bases, attrs):
+    def __new__(mcs, name, bases, attrs):
+        fields = dict((key, value) for key, value in attrs.items() if isinstance(value, BaseField))
+        attrs = dict((key, value) for key, value in attrs.items() if key not in fields)
+        compact = attrs.get('_compact', any(getattr(base, '_compact', False) for base in bases))
+        if compact and '__slots__' not in attrs:
+            inherited = {}
+            for base in bases:
+                inherited.update(getattr(base, '_clsfields', {}))
+            attrs['__slots__'] = compact_slots(bases, dict(inherited, **fields))
+        cls = super(MicromodelsMetaclass, mcs).__new__(mcs, name, bases, attrs)
         cls._clsfields = {}
         for base in bases:
             if hasattr(base, '_clsfields'):
                 cls._clsfields.update(base._clsfields)
-        for key, value in attrs.items():
-            if isinstance(value, BaseField):
-                cls._clsfields[key] = value
-                delattr(cls, key)
+        cls._clsfields.update(fields)
+        cls._codec = ModelCodec(cls._clsfields, compact)
+        cls._slot_names = tuple(slot for klass in cls.__mro__ for slot in klass.__dict__.get('__slots__', ())
+                                if slot not in ('__dict__', '__weakref__'))
+        return cls
+
+
+def compact_slots(bases, fields):
+    '''The __slots__ of a compact class with bases: one for each of fields
+    (including the ones it inherits, so a compact subclass of a regular model
+    keeps all of it's fields in slots) that doesn't already have one, and a
+    __dict__ for anything else (like fields added with add_field) if the
+    bases don't already have one.
+
+    '''
+    taken = set()
+    for base in bases:
+        for cls in base.__mro__:
+            taken.update(cls.__dict__.get('__slots__', ()))
+    slots = [key for key in fields if key not in taken]
+    if all(base.__dictoffset__ == 0 for base in bases):
+        slots.append('__dict__')
+    return tuple(slots)
+
+
+_MISSING = object()
+
+
+class ModelCodec(object):
+    '''Converts dictionaries to the field values of instances of one
+    :class:`Model` class, and back.  It's built once per class, when the class
+    is created, so that decoding and encoding an instance is a single loop
+    over a precomputed list of fields, instead of looking each field up (and
+    merging the class's fields with the instance's extra fields) for every
+    attribute.
+
+    '''
+    def __init__(self, fields, compact=False):
+        self.compact = compact
+        self.converters = dict((name, converter(field)) for name, field in fields.items())
+        self.decoders = tuple((name, field.source or name, self.converters[name], isinstance(field, WrappedObjectField))
+                              for name, field in fields.items())
+        self.encoders = tuple((name, field.to_serial) for name, field in fields.items())
+        self.decoders_by_name = dict((decoder[0], decoder) for decoder in self.decoders)
+
+    def decode(self, instance, data, values):
+        '''Set the python values of the fields of instance found in data, by
+        field name, in values (which can be the instance's ``__dict__``).
+        Returns values.
+
+        '''
+        if not isinstance(data, dict):
+            return values
+        for name, key, convert, wrapped in self.decoders:
+            if key in data:
+                value = data[key]
+                # modified by Jason Corbett Oct 16, 2013 if statement added
+                # reason: if it's a sub object (embedded object) and the value is None we shouldn't set it
+                # needed by slick specifically.  The best thing to do would be:
+                # TODO: make the input JSON match the output JSON by setting value to None and still serializing correctly
+                if wrapped and value is None:
+                    continue
+                values[name] = convert(value, instance)
+        return values
+
+    def decode_field(self, instance, name, data):
+        '''The python value of the field name of instance in data, or
+        _MISSING if data doesn't have one.
+
+        '''
+        name, key, convert, wrapped = self.decoders_by_name[name]
+        value = data.get(key, _MISSING)
+        if value is _MISSING or (wrapped and value is None):
+            return _MISSING
+        return convert(value, instance)
+
+    def load(self, instance, data):
+        '''Set the fields of instance found in data on it, returns a
+        dictionary with (at least) their values by field name.
+
+        '''
+        if self.compact:
+            return self.store(instance, self.decode(instance, data, {}))
+        return self.decode(instance, data, instance.__dict__)
+
+    def store(self, instance, values):
+        '''Set values (by field name) on instance, returns values.'''
+        if self.compact:
+            for name, value in values.items():
+                object.__setattr__(instance, name, value)
+        else:
+            instance.__dict__.update(values)
+        return values
+
+    def encode(self, instance, serial=False):
+        '''A dictionary of the values of the fields of instance, serialized
+        if serial is True.
+
+        '''
+        encoded = {}
+        if self.compact:
+            for name, to_serial in self.encoders:
+                value = getattr(instance, name, _MISSING)
+                if value is not _MISSING:
+                    encoded[name] = to_serial(value) if serial else value
+        else:
+            values = instance.__dict__
+            for name, to_serial in self.encoders:
+                if name in values:
+                    encoded[name] = to_serial(values[name]) if serial else values[name]
+        return encoded
 
 
-Micromodelsmc = MicromodelsMetaclass('Micromodelsmc', (object, ), {})
+Micromodelsmc = MicromodelsMetaclass('Micromodelsmc', (object, ), {'__slots__': ()})
 
 
 class Model(Micromodelsmc):
@@ -64,20 +180,78 @@ class Model(Micromodelsmc):
     If the instance doesn't have a field matching the key, then the key and
     value are just set on the instance like any other assignment in Python.
 
+    A :class:`Model` keeps track of which fields have changed since it was
+    last in sync with it's source (see :meth:`mark_clean`), so that only the
+    changes need to be sent back. An instance created by :meth:`from_dict` is
+    in sync with the dictionary it was created from.
+
+    Instances keep their field values in a ``__dict__``, which is flexible but
+    costs memory.  A class that will have a lot of instances in memory at once
+    can set ``_compact = True`` (or a subclass of it can, to make a compact
+    version of an existing model); it's instances (and those of it's
+    subclasses) keep the values of the class's fields in ``__slots__``
+    instead.  Reading a field that isn't set costs more for a compact
+    instance, so encoding one that has a lot of unset fields is slower.  Fields
+    added with :meth:`add_field`, other attributes, and the change tracking of
+    an instance that has been changed still work, they fall back to a
+    ``__dict__`` that is only created when it's needed.
+
+    An instance created by ``from_dict(D, lazy=True)`` keeps ``D`` and only
+    converts a field (including a nested model or list of them) the first
+    time it's read, which is a lot cheaper when only a few fields of a big
+    object are needed.
+
     """
-    def __init__(self):
-        super(Model, self).__setattr__('_extra', {})
+    __slots__ = ()
+    _compact = False
+    # set on an instance when first needed, most instances never need them
+    _extra = None
+    _dirty = None
+    _synced_lengths = None
+    # the dictionary a lazy instance is converted from, see lazy_class
+    _raw = None
+
+    def __getstate__(self):
+        state = dict(getattr(self, '__dict__', None) or {})
+        for name in self._slot_names:
+            value = getattr(self, name, _MISSING)
+            if value is not _MISSING:
+                state[name] = value
+        return state
+
+    def __setstate__(self, state):
+        for key, value in state.items():
+            object.__setattr__(self, key, value)
 
     @classmethod
-    def from_dict(cls, D, is_json=False):
+    def from_dict(cls, D, is_json=False, lazy=False):
         '''This factory for :class:`Model`
         takes either a native Python dictionary or a JSON dictionary/object
-        if ``is_json`` is ``True``. The dictionary passed does not need to
-        contain all of the values that the Model declares.
+        (text or bytes, decoded with the current json backend, see
+        :mod:`~micromodels.jsonbackend`) if ``is_json`` is ``True``. The
+        dictionary passed does not need to contain all of the values that
+        the Model declares.
+
+        If ``lazy`` is ``True``, each field is converted from the dictionary
+        when it's first read instead of right away, so the dictionary must not
+        be changed afterwards.
 
         '''
+        if is_json:
+            D = jsonbackend.current.loads(D)
+        if lazy and isinstance(D, dict):
+            instance = lazy_class(cls)()
+            object.__setattr__(instance, '_raw', D)
+            return instance
         instance = cls()
-        instance.set_data(D, is_json=is_json)
+        synced_lengths = None
+        for key, value in cls._codec.load(instance, D).items():
+            if isinstance(value, list):
+                if synced_lengths is None:
+                    synced_lengths = {}
+                synced_lengths[key] = len(value)
+        if synced_lengths is not None:
+            object.__setattr__(instance, '_synced_lengths', synced_lengths)
         return instance
 
     @classmethod
@@ -93,28 +267,25 @@ class Model(Micromodelsmc):
 
     def set_data(self, data, is_json=False):
         if is_json:
-            data = json.loads(data)
-        for name, field in self._clsfields.items():
-            key = field.source or name
-            if isinstance(data, dict) and key in data:
-                # modified by Jason Corbett Oct 16, 2013 if statement added
-                # reason: if it's a sub object (embedded object) and the value is None we shouldn't set it
-                # needed by slick specifically.  The best thing to do would be:
-                # TODO: make the input JSON match the output JSON by setting value to None and still serializing correctly
-                if (not isinstance(field, WrappedObjectField)) or data.get(key) is not None:
-                    setattr(self, name, data.get(key))
+            data = jsonbackend.current.loads(data)
+        values = self._codec.store(self, self._codec.decode(self, data, {}))
+        for key in values:
+            self.mark_dirty(key)
 
     def __setattr__(self, key, value):
-        if key in self._fields:
-            field = self._fields[key]
-            field.populate(value)
-            field._related_obj = self
-            super(Model, self).__setattr__(key, field.to_python())
+        convert = self._codec.converters.get(key)
+        if convert is None and self._extra and key in self._extra:
+            convert = converter(self._extra[key])
+        if convert is not None:
+            object.__setattr__(self, key, convert(value, self))
+            self.mark_dirty(key)
         else:
-            super(Model, self).__setattr__(key, value)
+            object.__setattr__(self, key, value)
 
     @property
     def _fields(self):
+        if not self._extra:
+            return dict(self._clsfields)
         return dict(self._clsfields, **self._extra)
 
     def add_field(self, key, value, field):
@@ -124,6 +295,8 @@ class Model(Micromodelsmc):
         reassigned without using this method.
 
         '''
+        if self._extra is None:
+            object.__setattr__(self, '_extra', {})
         self._extra[key] = field
         setattr(self, key, value)
 
@@ -135,16 +308,146 @@ class Model(Micromodelsmc):
         unless ``serial`` is set to True.
 
         '''
+        if self._raw is not None:
+            self._convert_raw()
+        if not self._extra:
+            return self._codec.encode(self, serial)
+        fields = self._fields
         if serial:
-            return dict((key, self._fields[key].to_serial(getattr(self, key)))
-                        for key in list(self._fields.keys()) if hasattr(self, key))
+            return dict((key, fields[key].to_serial(getattr(self, key)))
+                        for key in fields if hasattr(self, key))
         else:
-            return dict((key, getattr(self, key)) for key in list(self._fields.keys())
+            return dict((key, getattr(self, key)) for key in fields
                        if hasattr(self, key))
 
+    def _sync_length(self, key, value):
+        if self._synced_lengths is None:
+            object.__setattr__(self, '_synced_lengths', {})
+        self._synced_lengths[key] = len(value)
+
+    def mark_clean(self, *keys):
+        '''Record that the instance is now in sync with it's source (for
+        example, it was just saved), so no fields count as changed. If keys
+        are given, only those fields are now in sync.
+
+        '''
+        if not keys:
+            object.__setattr__(self, '_dirty', None)
+            object.__setattr__(self, '_synced_lengths', None)
+            keys = self._fields
+        for key in keys:
+            if self._dirty:
+                self._dirty.discard(key)
+            value = getattr(self, key, None)
+            if isinstance(value, list):
+                self._sync_length(key, value)
+            elif self._synced_lengths:
+                self._synced_lengths.pop(key, None)
+
+    def mark_dirty(self, key):
+        '''Count a field as changed, use this after changing an object
+        inside of a field in place (like an item of a list), which can't be
+        detected.
+
+        '''
+        if self._dirty is None:
+            object.__setattr__(self, '_dirty', set())
+        self._dirty.add(key)
+
+    def changed_fields(self):
+        '''The set of the names of the fields that have changed since the
+        instance was last in sync: the fields that were set, and the list
+        fields that had items added or removed.
+
+        '''
+        changed = set(key for key in self._dirty or () if hasattr(self, key))
+        for key in self._fields:
+            value = getattr(self, key, None)
+            if isinstance(value, list) and len(value) != (self._synced_lengths or {}).get(key):
+                changed.add(key)
+        return changed
+
+    def appended(self, key):
+        '''If the only change to the list field key is that items were
+        added to the end of it, return the added items, otherwise None.
+
+        '''
+        value = getattr(self, key, None)
+        synced_lengths = self._synced_lengths or {}
+        if key in (self._dirty or ()) or not isinstance(value, list) or key not in synced_lengths:
+            return None
+        synced_length = synced_lengths[key]
+        if len(value) <= synced_length:
+            return None
+        return value[synced_length:]
+
+    def to_changes_dict(self, exclude=()):
+        '''Like ``to_dict(serial=True)``, but only with the fields that have
+        changed (see :meth:`changed_fields`), other than those in exclude.
+
+        '''
+        fields = self._fields
+        return dict((key, fields[key].to_serial(getattr(self, key)))
+                    for key in self.changed_fields() if key not in exclude)
+
     def to_json(self):
         '''Returns a representation of the model as a JSON string. This method
         relies on the :meth:`~micromodels.Model.to_dict` method.
 
         '''
-        return json.dumps(self.to_dict(serial=True))
+        return jsonbackend.current.dumps(self.to_dict(serial=True))
+
+    def to_json_bytes(self):
+        '''The same as :meth:`~micromodels.Model.to_json`, but encoded as
+        utf-8 bytes, which some json backends write directly.
+
+        '''
+        return jsonbackend.current.dumps_bytes(self.to_dict(serial=True))
+
+
+def lazy_class(cls):
+    '''The class of the lazy instances of cls (see :meth:`Model.from_dict`).
+    It's a subclass of cls, with the same name and layout, that converts a
+    field from _raw when it's first read (attributes that haven't been set
+    are looked up with __getattr__).  Once all of the fields have been
+    converted, the instance is changed to be a cls.  That way regular
+    instances don't pay for a __getattr__.
+
+    '''
+    lazy = cls.__dict__.get('_lazy_class')
+    if lazy is None:
+        lazy = type(cls)(cls.__name__, (cls, ), {
+            '__slots__': (),
+            '__module__': cls.__module__,
+            '__getattr__': _lazy_getattr,
+            '__reduce_ex__': _lazy_reduce_ex,
+            '_convert_raw': _lazy_convert_raw,
+        })
+        cls._lazy_class = lazy
+        lazy._lazy_class = lazy
+    return lazy
+
+
+def _lazy_getattr(self, key):
+    raw = self._raw
+    if raw is not None and key in self._clsfields:
+        value = self._codec.decode_field(self, key, raw)
+        if value is not _MISSING:
+            object.__setattr__(self, key, value)
+            if isinstance(value, list):
+                self._sync_length(key, value)
+            return value
+    raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, key))
+
+
+def _lazy_convert_raw(self):
+    for key in self._clsfields:
+        getattr(self, key, None)
+    object.__delattr__(self, '_raw')
+    object.__setattr__(self, '__class__', type(self).__bases__[0])
+
+
+def _lazy_reduce_ex(self, protocol):
+    # copies and pickles are of the regular class
+    self._convert_raw()
+    return self.__reduce_ex__(protocol)
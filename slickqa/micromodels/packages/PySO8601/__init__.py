@@ -1,5 +1,5 @@
 from .utility import *
-from .datetimestamps import parse_date, parse_time
+from .datetimestamps import parse_date, parse_time, set_memo_size
 from .durations import parse_duration
 from .intervals import parse_interval
 from .timezones import Timezone
@@ -8,6 +8,7 @@ from .__version__ import __version__
 __all__ = ['parse',
            'parse_date',
            'parse_time',
+           'set_memo_size',
            'parse_duration',
            'parse_interval',
            'Timezone',
@@ -26,7 +27,7 @@ def parse(representation):
     if '/' in representation:
         return parse_interval(representation)
 
-    if representation[0] is 'P':
+    if representation[0] == 'P':
         return parse_duration(representation)
 
     return parse_date(representation)
@@ -87,13 +87,76 @@ TIME_FORMATS = (
 
     )
 
+# The extended combined (and separate) format, YYYY-MM-DDThh:mm:ss[.f][Z|+-hh[:mm]], is by far the most common, so
+# it's parsed directly, without strptime.
+EXTENDED_FORMAT = re.compile(r'^(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})(?:\.(\d+))?'
+                             r'(Z|[+-]\d{2}(?::?\d{2})?)?$')
+
+
+_timezones = {}
+
+
+def timezone(tzstring):
+    """The (shared) Timezone for tzstring, which can't be None."""
+    tz = _timezones.get(tzstring)
+    if tz is None:
+        tz = Timezone(tzstring)
+        if len(_timezones) < 1000:
+            _timezones[tzstring] = tz
+    return tz
+
+
+def microseconds(fraction):
+    """The microseconds in the digits after the decimal point of a second."""
+    return int((fraction + '000000')[:6])
+
+
+_memo = None
+_memo_size = 0
+
+
+def set_memo_size(size):
+    """Remember the result of parsing (up to) size different date strings with parse_date, which is worth it when the
+    same timestamps show up over and over.  0 (the default) turns it off.  When it's full it's emptied and starts
+    over, which is cheap and keeps it bounded."""
+    global _memo, _memo_size
+    _memo = {} if size > 0 else None
+    _memo_size = size
+
 
 def parse_date(datestring):
     """Attepmts to parse an ISO8601 formatted ``datestring``.
 
     Returns a ``datetime.datetime`` object.
     """
+    memo = _memo
+    if memo is not None:
+        dt = memo.get(datestring)
+        if dt is not None:
+            return dt
+
+    key = datestring
     datestring = str(datestring).strip()
+    dt = _parse_date(datestring)
+    if dt is None:
+        # a time is today, so it can't be remembered
+        return parse_time(datestring)
+
+    if memo is not None:
+        if len(memo) >= _memo_size:
+            memo.clear()
+        memo[key] = dt
+    return dt
+
+
+def _parse_date(datestring):
+    """The datetime in datestring, or None if it isn't a date (but may be a time)."""
+    match = EXTENDED_FORMAT.match(datestring)
+    if match is not None:
+        year, month, day, hour, minute, second, fraction, tz = match.groups()
+        return datetime(int(year), int(month), int(day), int(hour), int(minute), int(second),
+                        microseconds(fraction) if fraction is not None else 0,
+                        timezone(tz) if tz is not None else None)
 
     if not datestring[0].isdigit():
         raise ParseError()
@@ -104,20 +167,27 @@ def parse_date(datestring):
         except:
             pass
 
-    for regex, pattern in DATE_FORMATS:
-        if regex.match(datestring):
-            found = regex.search(datestring).groupdict()
-            dt = datetime.utcnow().strptime(found['matched'], pattern)
+    return _match(DATE_FORMATS, datestring)
 
-            if 'fraction' in found and found['fraction'] is not None:
-                dt = dt.replace(microsecond=int(found['fraction'][1:]))
 
-            if 'timezone' in found and found['timezone'] is not None:
-                dt = dt.replace(tzinfo=Timezone(found.get('timezone', '')))
+def _match(formats, string):
+    """The datetime built from the first of formats that matches string, or None if none of them do."""
+    for regex, pattern in formats:
+        match = regex.match(string)
+        if match is not None:
+            break
+    else:
+        return None
+    found = match.groupdict()
+    dt = datetime.strptime(found['matched'], pattern)
 
-            return dt
+    if found.get('fraction') is not None:
+        dt = dt.replace(microsecond=microseconds(found['fraction'][1:]))
+
+    if found.get('timezone') is not None:
+        dt = dt.replace(tzinfo=timezone(found['timezone']))
 
-    return parse_time(datestring)
+    return dt
 
 
 def parse_time(timestring):
@@ -127,21 +197,7 @@ def parse_time(timestring):
     """
     timestring = str(timestring).strip()
 
-    for regex, pattern in TIME_FORMATS:
-        if regex.match(timestring):
-            found = regex.search(timestring).groupdict()
-
-            dt = datetime.utcnow().strptime(found['matched'], pattern)
-            dt = datetime.combine(date.today(), dt.time())
-
-            if 'fraction' in found and found['fraction'] is not None:
-                dt = dt.replace(microsecond=int(found['fraction'][1:]))
-
-            if 'timezone' in found and found['timezone'] is not None:
-                dt = dt.replace(tzinfo=Timezone(found.get('timezone', '')))
-
-            return dt
-
-    raise ParseError()
-
-
+    dt = _match(TIME_FORMATS, timestring)
+    if dt is None:
+        raise ParseError()
+    return datetime.combine(date.today(), dt.time()).replace(tzinfo=dt.tzinfo)
@@ -66,6 +66,7 @@ class SystemConfigurationQuery(SlickQuery):
         """Query for a system configuration.  You should specify a configuration type, otherwise you will get lots of
         different system configuration types back.
         """
+        super(SystemConfigurationQuery, self).__init__()
         if configtype is not None:
             self.configtype = configtype
         if name is not None:
@@ -79,6 +80,7 @@ class ResultQuery(SlickQuery):
     allfields = micromodels.BooleanField()
 
     def __init__(self, testrunid=None, status=None, excludestatus=None, runstatus=None, allfields=None):
+        super(ResultQuery, self).__init__()
         if testrunid is not None:
             self.testrunid = testrunid
         if status is not None:
@@ -103,6 +105,7 @@ class TestcaseQuery(SlickQuery):
     name = micromodels.StringField()
 
     def __init__(self, projectid=None, componentid=None, automationKey=None, automationId=None, automationTool=None, tag=None, automated=None, author=None, namecontains=None, name=None):
+        super(TestcaseQuery, self).__init__()
         if projectid is not None:
             self.projectid = projectid
         if componentid is not None:
@@ -129,6 +132,7 @@ class TestrunGroupQuery(SlickQuery):
     name = micromodels.StringField()
 
     def __init__(self, createdafter=None, name=None):
+        super(TestrunGroupQuery, self).__init__()
         if createdafter is not None:
             self.createdafter = createdafter
         if name is not None:
@@ -139,6 +143,7 @@ class TestplanQuery(SlickQuery):
     createdby = micromodels.StringField()
 
     def __init__(self, projectid, createdby=None):
+        super(TestplanQuery, self).__init__()
         self.projectid = projectid
         if createdby is not None:
             self.createdby = createdby
@@ -159,6 +164,7 @@ class TestrunQuery(SlickQuery):
 
     def __init__(self, projectid=None, releaseid=None, buildid=None, createdafter=None, configid=None, testplanid=None,
                  configName=None, projectName=None, releaseName=None, buildName=None, name=None, limit=None):
+        super(TestrunQuery, self).__init__()
         if projectid is not None:
             self.projectid = projectid
         if releaseid is not None:
@@ -191,5 +197,6 @@ class HostStatusQuery(SlickQuery):
     def __init__(self, checkincutoff=None):
         """You can query for all the host status within a time window between "now" and a number of minutes ago.  The
         default cut off is 5 minutes."""
+        super(HostStatusQuery, self).__init__()
         if checkincutoff is not None:
             self.checkincutoff = checkincutoff
@@ -0,0 +1,297 @@
+"""
+Retry policies and circuit breakers used by SlickConnection when a request to slick fails, the deadlines that bound
+how long it keeps trying, and the hedging of slow GET requests.
+"""
+import collections
+import contextlib
+import math
+import random
+import threading
+import time
+
+try:
+    import contextvars
+except ImportError:
+    contextvars = None
+
+
+class RetryPolicy(object):
+    """Decides if (and when) a failed request to slick should be tried again.
+
+    A request is retried when it raises an exception (connection refused, reset, timeout, ...) or when slick answers
+    with a retryable status code, as long as there are attempts left and max_elapsed seconds haven't passed since the
+    first attempt.  Other status codes (a 404 or 400 for example) are never retried, trying again won't change the
+    answer.
+
+    Options:
+     * max_attempts: the total number of tries (including the first one).
+     * retry_status_classes: the status code classes that are retried, 5 means any 5xx status code.
+     * retry_statuses: individual status codes that are retried, on top of retry_status_classes.
+     * backoff_base: the delay (in seconds) before the first retry.
+     * backoff_multiplier: each retry waits this many times longer than the one before it.
+     * backoff_max: the longest delay between two attempts.
+     * jitter: if True, the delay is a random value between 0 and the computed backoff ("full jitter") so that many
+       clients that failed at the same time don't all retry at the same time.
+     * max_elapsed: give up once this many seconds have passed since the first attempt, None for no limit.
+
+    The retries attribute counts how many retries this policy has allowed.
+    """
+
+    def __init__(self, max_attempts=3, retry_status_classes=(5,), retry_statuses=(408, 429), backoff_base=0.1,
+                 backoff_multiplier=2.0, backoff_max=10.0, jitter=True, max_elapsed=None):
+        self.max_attempts = max_attempts
+        self.retry_status_classes = tuple(retry_status_classes)
+        self.retry_statuses = tuple(retry_statuses)
+        self.backoff_base = backoff_base
+        self.backoff_multiplier = backoff_multiplier
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.max_elapsed = max_elapsed
+        self.retries = 0
+        self.lock = threading.Lock()
+
+    def is_retryable_status(self, status_code):
+        return status_code in self.retry_statuses or (status_code // 100) in self.retry_status_classes
+
+    def backoff(self, retry_number):
+        """The delay before retry number retry_number (the first retry is 1)."""
+        delay = min(self.backoff_max, self.backoff_base * (self.backoff_multiplier ** (retry_number - 1)))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def attempts(self):
+        """Start tracking the attempts for a single request."""
+        return RetryAttempts(self)
+
+
+class RetryAttempts(object):
+    """The attempts made for a single request, created by RetryPolicy.attempts()."""
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.attempt = 1
+        self.started = time.time()
+
+    def next_delay(self, status_code=None):
+        """Call after a failed attempt, with the status code slick answered with (or None if the attempt raised an
+        exception).  Returns how long to wait before trying again, or None if the request should not be retried.
+        """
+        policy = self.policy
+        if status_code is not None and not policy.is_retryable_status(status_code):
+            return None
+        if self.attempt >= policy.max_attempts:
+            return None
+        delay = policy.backoff(self.attempt)
+        if policy.max_elapsed is not None and (time.time() - self.started) + delay > policy.max_elapsed:
+            return None
+        self.attempt += 1
+        with policy.lock:
+            policy.retries += 1
+        return delay
+
+
+NO_RETRY = RetryPolicy(max_attempts=1)
+
+
+class Deadline(object):
+    """The time by which an operation (every request it makes, and all of their retries) has to be done."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires = time.time() + seconds
+
+    def remaining(self):
+        """The seconds left, 0 once it has passed."""
+        return max(0.0, self.expires - time.time())
+
+    def expired(self):
+        return time.time() >= self.expires
+
+    def __repr__(self):
+        return "<Deadline of {}s, {:.3f}s left>".format(self.seconds, self.remaining())
+
+
+# True if the deadline set by deadline_scope is local to the asyncio task that set it (each task has it's own
+# contextvars context), not only to the thread.  Without contextvars (before python 3.7) all the tasks of an event
+# loop would share it.
+TASK_LOCAL_DEADLINES = contextvars is not None
+
+if contextvars is not None:
+    _deadline = contextvars.ContextVar('slickqa_deadline', default=None)
+
+    def current_deadline():
+        """The deadline of what the calling thread (or asyncio task) is doing (see deadline_scope), or None."""
+        return _deadline.get()
+
+    def _set_deadline(deadline):
+        return _deadline.set(deadline)
+
+    def _restore_deadline(token):
+        _deadline.reset(token)
+else:
+    _deadlines = threading.local()
+
+    def current_deadline():
+        """The deadline of what the calling thread is doing (see deadline_scope), or None."""
+        return getattr(_deadlines, 'deadline', None)
+
+    def _set_deadline(deadline):
+        previous = current_deadline()
+        _deadlines.deadline = deadline
+        return previous
+
+    def _restore_deadline(previous):
+        _deadlines.deadline = previous
+
+
+@contextlib.contextmanager
+def deadline_scope(deadline):
+    """Make deadline (a Deadline, or None) the calling thread's (or asyncio task's, see TASK_LOCAL_DEADLINES)
+    deadline until the with block exits, unless it already has a sooner one (an operation can't extend the deadline
+    of the one it's part of).  Yields the deadline in effect."""
+    previous = current_deadline()
+    if deadline is None or (previous is not None and previous.expires <= deadline.expires):
+        yield previous
+        return
+    token = _set_deadline(deadline)
+    try:
+        yield deadline
+    finally:
+        _restore_deadline(token)
+
+
+class HedgePolicy(object):
+    """Decides when a GET request slick is slow to answer is sent a second time (hedged), to cut the tail latency.
+
+    A GET is hedged once it has been waiting longer than percentile of the latest latencies (up to window of them)
+    of it's endpoint.  Whichever of the two requests answers first is used, the other one is dropped.  GETs don't
+    change anything in slick, so sending one twice is safe, it only costs slick the extra request.
+
+    Options:
+     * percentile: the percentile of recent latency a request has to be slower than to be hedged.
+     * window: how many of the latest latencies of each endpoint the percentile is taken from.
+     * min_samples: an endpoint's requests aren't hedged until it has this many latencies recorded.
+     * min_delay: a request is never hedged sooner than this many seconds after it was sent.
+     * max_rate: at most this fraction of the requests are hedged, so a slick that's slow for everyone doesn't get
+       twice the requests.
+
+    Counters: requests (the GETs that could have been hedged), hedges (how many were), and hedge_wins (how many
+    times the hedge answered first), stats() returns them along with the rates.
+    """
+
+    def __init__(self, percentile=95, window=200, min_samples=20, min_delay=0.005, max_rate=0.1):
+        self.percentile = percentile
+        self.window = window
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_rate = max_rate
+        self.latencies = {}
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.lock = threading.Lock()
+
+    def delay(self, endpoint):
+        """Call when a GET to endpoint is about to be sent, returns how long to wait for it's answer before hedging
+        it, or None if it shouldn't be hedged."""
+        with self.lock:
+            self.requests += 1
+            latencies = self.latencies.get(endpoint)
+            if latencies is None or len(latencies) < self.min_samples or \
+                    self.hedges + 1 > self.max_rate * self.requests:
+                return None
+            latencies = sorted(latencies)
+        rank = max(1, int(math.ceil(len(latencies) * self.percentile / 100.0)))
+        return max(self.min_delay, latencies[rank - 1])
+
+    def record(self, endpoint, latency):
+        """Record how long a (first, not hedged) GET to endpoint took to be answered."""
+        with self.lock:
+            latencies = self.latencies.get(endpoint)
+            if latencies is None:
+                latencies = self.latencies[endpoint] = collections.deque(maxlen=self.window)
+            latencies.append(latency)
+
+    def hedged(self):
+        with self.lock:
+            self.hedges += 1
+
+    def hedge_won(self):
+        with self.lock:
+            self.hedge_wins += 1
+
+    def stats(self):
+        with self.lock:
+            return {'requests': self.requests, 'hedges': self.hedges, 'hedge_wins': self.hedge_wins,
+                    'hedge_rate': float(self.hedges) / self.requests if self.requests else 0.0,
+                    'hedge_win_rate': float(self.hedge_wins) / self.hedges if self.hedges else 0.0}
+
+
+class CircuitOpenError(Exception):
+    """Raised by CircuitBreaker.before_request when the circuit for an endpoint is open."""
+
+
+class CircuitBreaker(object):
+    """A circuit breaker per endpoint, so that while slick is unhealthy requests fail fast instead of piling onto it.
+
+    After failure_threshold consecutive failures (exceptions or retryable status codes) for an endpoint, the circuit
+    for that endpoint opens and requests to it are rejected immediately.  After reset_timeout seconds a single trial
+    request is let through (the circuit is half open); if it succeeds the circuit closes, otherwise it opens again.
+
+    Counters:
+     * trips: how many times a circuit has opened.
+     * rejected: how many requests were failed fast because their circuit was open.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.endpoints = {}
+        self.trips = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def _state(self, endpoint):
+        state = self.endpoints.get(endpoint)
+        if state is None:
+            state = self.endpoints[endpoint] = {'state': CircuitBreaker.CLOSED, 'failures': 0, 'opened': 0.0}
+        return state
+
+    def state(self, endpoint):
+        with self.lock:
+            return self._state(endpoint)['state']
+
+    def before_request(self, endpoint):
+        """Raises CircuitOpenError if the request to endpoint should not be made."""
+        with self.lock:
+            state = self._state(endpoint)
+            if state['state'] == CircuitBreaker.OPEN:
+                if time.time() - state['opened'] >= self.reset_timeout:
+                    state['state'] = CircuitBreaker.HALF_OPEN
+                    return
+            elif state['state'] != CircuitBreaker.HALF_OPEN:
+                return
+            # open, or half open with the trial request already in flight
+            self.rejected += 1
+        raise CircuitOpenError("Circuit for {} is open, slick has failed {} times in a row.".format(
+            endpoint, state['failures']))
+
+    def record_success(self, endpoint):
+        with self.lock:
+            state = self._state(endpoint)
+            state['state'] = CircuitBreaker.CLOSED
+            state['failures'] = 0
+
+    def record_failure(self, endpoint):
+        with self.lock:
+            state = self._state(endpoint)
+            state['failures'] += 1
+            if state['state'] == CircuitBreaker.HALF_OPEN or \
+                    (state['state'] == CircuitBreaker.CLOSED and state['failures'] >= self.failure_threshold):
+                state['state'] = CircuitBreaker.OPEN
+                state['opened'] = time.time()
+                self.trips += 1
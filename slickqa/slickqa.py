@@ -1,16 +1,22 @@
 import logging
 import re
 import sys
+import threading
 import time
 from datetime import datetime
 import types
 
 import docutils.core
+from concurrent.futures import ThreadPoolExecutor
 
 from .micromodels.fields import ModelCollectionField
 from . import SlickConnection, SlickCommunicationError, Release, Build, BuildReference, Component, ComponentReference, \
     Project, Testplan, Testrun, Testcase, RunStatus, Result, ResultStatus, LogEntry, Configuration, TestrunGroup, \
     TestrunReference, Link
+from .spool import Spool
+from .logshipper import LogShipper
+from .catalog import TestcaseCatalog
+from .cache import ReferenceCache
 
 
 def add_log_entry(self, message, level='DEBUG', loggername='', exceptionclassname='', exceptionmessage='',
@@ -23,19 +29,30 @@ def add_log_entry(self, message, level='DEBUG', loggername='', exceptionclassnam
     entry.exceptionClassName = exceptionclassname
     entry.exceptionMessage = exceptionmessage
     entry.exceptionStackTrace = stacktrace
+    if getattr(self, 'log_shipper', None) is not None:
+        # sent to slick in the background, instead of with the next update
+        self.log_shipper.ship(self.id, entry)
+        return
     if not hasattr(self, 'log'):
         self.log = []
     self.log.append(entry)
 
 
 def update_result(self):
-    self.connection.results(self).update()
+    # only what changed is sent, so updating a result with a long log doesn't send the whole log every time
+    if getattr(self, 'spool', None) is not None:
+        self.spool.update('results', self, append=('log',))
+    else:
+        self.connection.results(self).update_changes()
 
 
 def update_testrun(self):
     if hasattr(self, 'summary'):
         del self.summary
-    self.connection.testruns(self).update()
+    if getattr(self, 'spool', None) is not None:
+        self.spool.update('testruns', self)
+    else:
+        self.connection.testruns(self).update(partial=True)
 
 
 def add_file_to_result(self, filename, fileobj=None):
@@ -56,24 +73,53 @@ def add_link_to_result(self, name, url):
     self.update()
 
 
-def make_result_updatable(result, connection):
+def make_result_updatable(result, connection, spool=None, log_shipper=None):
     result.connection = connection
+    result.spool = spool
+    result.log_shipper = log_shipper
     result.update = types.MethodType(update_result, result)
     result.add_file = types.MethodType(add_file_to_result, result)
     result.add_link = types.MethodType(add_link_to_result, result)
     result.add_log_entry = types.MethodType(add_log_entry, result)
 
 
-def make_testrun_updatable(testrun, connection):
+def make_testrun_updatable(testrun, connection, spool=None):
     testrun.connection = connection
+    testrun.spool = spool
     testrun.update = types.MethodType(update_testrun, testrun)
     testrun.add_file = types.MethodType(add_file_to_result, testrun)
     testrun.add_link = types.MethodType(add_link_to_result, testrun)
 
 
 class SlickQA(object):
+    """Report the results of a test run to slick.
+
+    If spool_dir is given, results (and updates to them, and finishing the testrun) are written to a durable spool in
+    that directory and sent to slick in the background (see slickqa.spool.Spool), so reporting doesn't wait on slick,
+    and keeps working while slick is down.  A result filed this way has a temporary id until slick has created it.
+    Call close() at the end of the run to wait for the spool to drain; anything left in it is sent by the next
+    SlickQA using the same spool_dir.
+
+    If log_shipper is True (or a slickqa.logshipper.LogShipper), log entries added to a filed result with it's
+    add_log_entry are sent to slick in batches in the background (instead of with the result's next update), and
+    the entries queued with add_log_entry are sent after the result they belong to is filed.  This doesn't apply
+    to spooled results, their log entries are spooled.  close() also waits for the shipper to finish.
+
+    If testcase_catalog is True, all of the project's testcases are fetched once (see
+    slickqa.catalog.TestcaseCatalog), and the testcase of each result filed is looked up in that instead of asking
+    slick for it, which saves up to two requests per result.  Testcases other clients create during the run aren't
+    seen, so a second one with the same name (or automationId) can get created if two runs of a new test report at
+    the same time.
+
+    The testplan, environment and testrun group are looked up (or created) at the same time as the release and the
+    build.  If reference_cache is the path of a file (or a slickqa.cache.ReferenceCache), the project, release and
+    build found are saved in it, and a SlickQA started with the same url, names and reference_cache (like another
+    shard of the same CI run) uses them instead of looking them up again.
+    """
+
     def __init__(self, url, project_name, release_name, build_name, test_plan=None, test_run=None,
-                 environment_name=None, test_run_group_name=None):
+                 environment_name=None, test_run_group_name=None, spool_dir=None, log_shipper=None,
+                 testcase_catalog=False, reference_cache=None):
         self.logger = logging.getLogger('slick-reporter.Slick')
         self.slickcon = None
         self.is_connected = False
@@ -90,17 +136,43 @@ class SlickQA(object):
         self.testrunref = None
         self.testrun_group = test_run_group_name
         self.logqueue = []
+        self.spool = None
+        self.log_shipper = None
+        self.catalog = None
 
         self.init_connection(url)
         if self.is_connected:
             self.logger.debug("Initializing Slick...")
-            self.init_project(project_name)
-            self.init_release()
-            self.init_build()
-            self.init_testplan()
-            self.init_environment()
+            if reference_cache is not None and not isinstance(reference_cache, ReferenceCache):
+                reference_cache = ReferenceCache(reference_cache)
+            cache_key = '|'.join(str(part) for part in (url, project_name, release_name, build_name))
+            cached = reference_cache is not None and self.load_references(reference_cache.get(cache_key))
+            if not cached:
+                self.init_project(project_name)
+            # these don't depend on each other (or the release and build)
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                lookups = [executor.submit(self.init_testplan), executor.submit(self.init_environment),
+                           executor.submit(self.find_testrungroup)]
+                if testcase_catalog:
+                    lookups.append(executor.submit(self.init_catalog))
+                if not cached:
+                    self.init_release()
+                    self.init_build()
+                    if reference_cache is not None:
+                        try:
+                            reference_cache.put(cache_key, self.save_references())
+                        except (IOError, OSError) as error:
+                            self.logger.warn("Unable to save to the reference cache {}: {}".format(
+                                reference_cache.path, error))
+                for lookup in lookups:
+                    lookup.result()
             self.init_testrun()
             self.init_testrungroup()
+            if spool_dir is not None:
+                self.init_spool(spool_dir)
+            if log_shipper is True:
+                log_shipper = LogShipper(self.slickcon)
+            self.log_shipper = log_shipper
             # TODO: if you have a list of test cases, add results for each with notrun status
 
     def init_connection(self, url):
@@ -116,6 +188,24 @@ class SlickQA(object):
         except SlickCommunicationError as se:
             self.logger.error(se.message)
 
+    def init_spool(self, spool_dir):
+        # the handler has to be there before the replayer sends what a previous run left in the spool
+        self.spool = Spool(spool_dir, self.slickcon, start=False)
+        self.spool.register('file_result', self.replay_file_result)
+        self.spool.start()
+        if isinstance(self.testrun, Testrun):
+            self.testrun.spool = self.spool
+
+    def close(self, timeout=None):
+        """Wait (up to timeout seconds) for any spooled changes and shipped log entries to be sent to slick, returns
+        False if they weren't all sent in time."""
+        closed = True
+        if self.log_shipper is not None:
+            closed = self.log_shipper.close(timeout)
+        if self.spool is not None:
+            closed = self.spool.close(timeout) and closed
+        return closed
+
     def verify_connection(self):
         version = self.slickcon.version.findOne()
         if version:
@@ -139,6 +229,33 @@ class SlickQA(object):
         assert isinstance(self.project, Project)
         self.logger.info("Using project with name '{}' and id: {}.".format(self.project.name, self.project.id))
 
+    def save_references(self):
+        """The project, release and build found by init_project, init_release and init_build, for a ReferenceCache
+        (see load_references).  The releases of the project and the builds of the release are left out."""
+        project = self.project.to_dict(serial=True)
+        project.pop('releases', None)
+        release = self.release.to_dict(serial=True)
+        release.pop('builds', None)
+        return {'project': project, 'release': release, 'build': self.buildref.to_dict(serial=True)}
+
+    def load_references(self, references):
+        """Use the project, release and build saved by save_references instead of looking them up, returns False if
+        there aren't any."""
+        if not references:
+            return False
+        self.project = Project.from_dict(references['project'])
+        self.release = Release.from_dict(references['release'])
+        self.releaseref = self.release.create_reference()
+        self.buildref = BuildReference.from_dict(references['build'])
+        self.logger.info("Using cached project '{}', release '{}' and build '{}'.".format(
+            self.project.name, self.release.name, self.buildref.name))
+        return True
+
+    def init_catalog(self):
+        self.catalog = TestcaseCatalog(self.slickcon, self.project)
+        count = self.catalog.load()
+        self.logger.info("Loaded {} testcases of project '{}' into the catalog.".format(count, self.project.name))
+
     def init_release(self):
         release_name = self.release
         self.logger.debug("Looking for release '{}' in project '{}'".format(release_name, self.project.name))
@@ -158,7 +275,7 @@ class SlickQA(object):
             release.name = release_name
             self.release = self.slickcon.projects(self.project).releases(release).create()
             assert isinstance(self.release, Release)
-            self.project = self.slickcon.projects(self.project).get()
+            self.project.releases.append(self.release)
             self.releaseref = self.release.create_reference()
             self.logger.info("Using newly created release '{}' with id '{}' in Project '{}'.".format(self.release.name,
                                                                                                      self.release.id,
@@ -265,8 +382,8 @@ class SlickQA(object):
         self.testrun = self.slickcon.testruns(testrun).create()
         make_testrun_updatable(self.testrun, self.slickcon)
 
-    def init_testrungroup(self):
-        if self.testrun_group is not None:
+    def find_testrungroup(self):
+        if self.testrun_group is not None and not isinstance(self.testrun_group, TestrunGroup):
             trg = self.slickcon.testrungroups.findOne(name=self.testrun_group)
             if trg is None:
                 trg = TestrunGroup()
@@ -274,7 +391,12 @@ class SlickQA(object):
                 trg.testruns = []
                 trg.created = datetime.now()
                 trg = self.slickcon.testrungroups(trg).create()
-            self.testrun_group = self.slickcon.testrungroups(trg).add_testrun(self.testrun)
+            self.testrun_group = trg
+
+    def init_testrungroup(self):
+        self.find_testrungroup()
+        if self.testrun_group is not None:
+            self.testrun_group = self.slickcon.testrungroups(self.testrun_group).add_testrun(self.testrun)
 
     def add_log_entry(self, message, level='DEBUG', loggername='', exceptionclassname='', exceptionmessage='',
                       stacktrace=''):
@@ -299,21 +421,85 @@ class SlickQA(object):
         testrun.runFinished = int(round(time.time() * 1000))
         testrun.state = RunStatus.FINISHED
         self.logger.debug("Finishing testrun named {}, with id {}.".format(testrun.name, testrun.id))
-        self.slickcon.testruns(testrun).update()
+        if self.spool is not None:
+            self.spool.update('testruns', testrun)
+        else:
+            self.slickcon.testruns(testrun).update()
 
     # TODO: need to add logs, files, etc. to a result
 
     def file_result(self, name, status=ResultStatus.FAIL, reason=None, runlength=0, testdata=None,
                     runstatus=RunStatus.FINISHED, attributes=None, requires=None):
+        log = None
+        if len(self.logqueue) > 0:
+            log = list(self.logqueue)
+            self.logqueue[:] = []
+        if self.spool is not None:
+            return self.spool_result(name, testdata, status, reason, runlength, runstatus, attributes, requires, log)
+        test = self.find_or_create_testcase(name, testdata)
+        if self.log_shipper is not None and log:
+            result = self.create_result(test, status, reason, runlength, runstatus, attributes, requires)
+            for entry in log:
+                self.log_shipper.ship(result.id, entry)
+            return result
+        return self.create_result(test, status, reason, runlength, runstatus, attributes, requires, log)
+
+    def file_results(self, results, max_workers=8):
+        """File many results at once.  Each item of results is either the name of a test, or a dictionary with the
+        keyword arguments file_result takes (name is required).  For example, to register a test suite before
+        running it:
+            slick.file_results({'name': test.name, 'status': ResultStatus.NO_RESULT,
+                                'runstatus': RunStatus.TO_BE_RUN} for test in suite)
+
+        The testcase lookups and result creates are done by up to max_workers threads at a time.  A list is returned
+        in the same order as results: the filed result, or if filing it failed, the exception that was raised (one
+        failure doesn't stop the others from being filed).  Log entries queued by add_log_entry are not attached to
+        any of the results.
+        """
+        items = [{'name': item} if not isinstance(item, dict) else dict(item) for item in results]
+        testcase_locks = {}
+        locks_lock = threading.Lock()
+
+        def file_one(item):
+            name = item.get('name')
+            try:
+                if self.spool is not None:
+                    return self.spool_result(**item)
+                name = item.pop('name')
+                testdata = item.pop('testdata', None)
+                # two results for the same (new) testcase should not both create it
+                key = getattr(testdata, 'automationId', None) or name
+                with locks_lock:
+                    testcase_lock = testcase_locks.setdefault(key, threading.Lock())
+                with testcase_lock:
+                    test = self.find_or_create_testcase(name, testdata)
+                return self.create_result(test, **item)
+            except Exception as error:
+                self.logger.error("Unable to file result for test '{}': {}".format(name, error))
+                return error
+
+        if self.spool is not None:
+            # spooling doesn't wait on slick, there is nothing to do in parallel
+            return [file_one(item) for item in items]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(file_one, items))
+
+    def find_testcase(self, field, value):
+        """The testcase in the project whose field is value (in the catalog if there is one), or None."""
+        if self.catalog is not None:
+            return self.catalog.get(field, value)
+        return self.slickcon.testcases.findOne(projectid=self.project.id, **{field: value})
+
+    def find_or_create_testcase(self, name, testdata=None):
         test = None
         if testdata is not None:
             assert isinstance(testdata, Testcase)
-            if testdata.automationId:
-                test = self.slickcon.testcases.findOne(projectid=self.project.id, automationId=testdata.automationId)
-            if test is None and hasattr(testdata, 'automationKey') and testdata.automationKey is not None:
-                test = self.slickcon.testcases.findOne(projectid=self.project.id, automationKey=testdata.automationId)
+            if getattr(testdata, 'automationId', None):
+                test = self.find_testcase('automationId', testdata.automationId)
+            if test is None and getattr(testdata, 'automationKey', None) is not None:
+                test = self.find_testcase('automationKey', testdata.automationKey)
         elif name:
-            test = self.slickcon.testcases.findOne(projectid=self.project.id, name=name)
+            test = self.find_testcase('name', name)
         if test is None:
             self.logger.debug("Creating testcase with name '{}' on project '{}'.".format(name, self.project.name))
             test = Testcase()
@@ -323,6 +509,8 @@ class SlickQA(object):
             test.created = int(round(time.time() * 1000))
             test.project = self.project.create_reference()
             test = self.slickcon.testcases(test).create()
+            if self.catalog is not None:
+                self.catalog.add(test)
             self.logger.info(
                 "Using newly created testcase with name '{}' and id '{}' for result.".format(name, test.id))
         else:
@@ -333,7 +521,55 @@ class SlickQA(object):
                 testdata.name = name
                 testdata.project = self.project.create_reference()
                 test = self.slickcon.testcases(testdata).update()
+                if self.catalog is not None:
+                    self.catalog.add(test)
             self.logger.info("Found testcase with name '{}' and id '{}' for result.".format(test.name, test.id))
+        return test
+
+    def create_result(self, test, status=ResultStatus.FAIL, reason=None, runlength=0,
+                      runstatus=RunStatus.FINISHED, attributes=None, requires=None, log=None):
+        result = self.build_result(test, status, reason, runlength, runstatus, attributes, requires, log)
+        self.logger.debug("Filing result of '{}' for test with name '{}'".format(result.status, result.testcase.name))
+        result = self.slickcon.results(result).create()
+        self.logger.info("Filed result of '{}' for test '{}', result id: {}".format(result.status, result.testcase.name,
+                                                                                    result.id))
+        make_result_updatable(result, self.slickcon, log_shipper=self.log_shipper)
+        return result
+
+    def spool_result(self, name, testdata=None, status=ResultStatus.FAIL, reason=None, runlength=0,
+                     runstatus=RunStatus.FINISHED, attributes=None, requires=None, log=None):
+        """Write a result to the spool, the testcase is found (or created) when the spool sends it to slick."""
+        placeholder = Testcase()
+        placeholder.id = self.spool.new_temp_id()
+        placeholder.name = name
+        if getattr(testdata, 'automationId', None):
+            placeholder.automationId = testdata.automationId
+        result = self.build_result(placeholder, status, reason, runlength, runstatus, attributes, requires, log)
+        temp_id = self.spool.new_temp_id()
+        result.id = temp_id
+        self.spool.submit('file_result', {'name': name,
+                                          'testdata': testdata.to_dict(serial=True) if testdata is not None else None,
+                                          'testcase_temp_id': placeholder.id,
+                                          'result': result.to_dict(serial=True)}, temp_id)
+        result.mark_clean()
+        self.logger.debug("Spooled result of '{}' for test '{}', temporary id: {}".format(result.status, name,
+                                                                                         temp_id))
+        make_result_updatable(result, self.slickcon, self.spool)
+        return result
+
+    def replay_file_result(self, data):
+        """Send a result written by spool_result to slick, returns the ids slick gave the result and it's testcase
+        (so later updates of the result refer to the real testcase)."""
+        testdata = Testcase.from_dict(data['testdata']) if data['testdata'] is not None else None
+        test = self.find_or_create_testcase(data['name'], testdata)
+        result = Result.from_dict(data['result'])
+        temp_id = result.id
+        del result.id
+        result.testcase = test.create_reference()
+        return {temp_id: self.slickcon.results(result).create().id, data['testcase_temp_id']: test.id}
+
+    def build_result(self, test, status=ResultStatus.FAIL, reason=None, runlength=0, runstatus=RunStatus.FINISHED,
+                     attributes=None, requires=None, log=None):
         result = Result()
         result.testrun = self.testrun.create_reference()
         result.testcase = test.create_reference()
@@ -342,10 +578,9 @@ class SlickQA(object):
         result.build = self.buildref
         if self.component is not None:
             result.component = self.componentref
-        if len(self.logqueue) > 0:
+        if log:
             result.log = []
-            result.log.extend(self.logqueue)
-            self.logqueue[:] = []
+            result.log.extend(log)
         result.reason = reason
         result.runlength = runlength
         result.end = int(round(time.time() * 1000))
@@ -356,11 +591,6 @@ class SlickQA(object):
             result.attributes = attributes
         if requires is not None:
             result.requirements = requires
-        self.logger.debug("Filing result of '{}' for test with name '{}'".format(result.status, result.testcase.name))
-        result = self.slickcon.results(result).create()
-        self.logger.info("Filed result of '{}' for test '{}', result id: {}".format(result.status, result.testcase.name,
-                                                                                    result.id))
-        make_result_updatable(result, self.slickcon)
         return result
 
 
@@ -0,0 +1,364 @@
+"""
+A durable, local spool of the changes to be made in slick, so that reporting results doesn't have to wait on (or
+fail because of) a slow or unavailable slick.
+"""
+import collections
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from .connection import SlickCommunicationError, json_content
+
+
+TEMP_ID_PREFIX = 'spool-'
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+
+class Spool(object):
+    """Creates and updates are appended to a journal file in directory and acknowledged right away; a background
+    thread (the replayer) then sends them to slick, one at a time and in the order they were made.
+
+    An object created through the spool is given a temporary id (starting with "spool-") that can be used right away,
+    for example to update it.  Once slick has created the object, the replayer remembers the id slick gave it, and
+    replaces the temporary id with it anywhere it shows up in the entries that follow.
+
+    What has been sent (the sequence number of the last entry slick acknowledged), and the temporary to slick id
+    mapping, are saved next to the journal: each acknowledgement is appended to acks.jsonl, and once that has as many
+    lines as state.json has ids (but at least compact_after) they're all folded into state.json, so saving an
+    acknowledgement doesn't cost more as the mapping grows.  If the process exits (or dies) before the spool is drained, the next
+    Spool opened on the same directory picks up where this one left off.  Entries are delivered at
+    least once: one that was sent, but whose acknowledgement wasn't saved before a crash, is sent again.
+
+    If sending an entry fails, it is tried again (waiting retry_interval seconds, doubling up to max_retry_interval)
+    until it succeeds, except when slick rejects it with a 4xx status code: trying again won't change that answer,
+    so the entry is moved to failed.jsonl in directory and the replayer goes on to the next one.
+
+    Besides the built in create and update entries, other kinds of entries can be added with register and submit.
+
+    Example:
+        spool = Spool('/tmp/slick-spool', slick)
+        spool.create('results', result)    # sets result.id to a temporary id
+        result.status = ResultStatus.PASS
+        spool.update('results', result)
+        spool.close(timeout=60)
+    """
+
+    def __init__(self, directory, connection, retry_interval=1.0, max_retry_interval=30.0, fsync=True,
+                 start=True, compact_after=1000):
+        self.logger = logging.getLogger('slick.Spool')
+        self.directory = directory
+        self.connection = connection
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self.fsync = fsync
+        self.compact_after = compact_after
+        self.journal_path = os.path.join(directory, 'journal.jsonl')
+        self.state_path = os.path.join(directory, 'state.json')
+        self.acks_path = os.path.join(directory, 'acks.jsonl')
+        self.failed_path = os.path.join(directory, 'failed.jsonl')
+        self.handlers = {'create': self.replay_create, 'update': self.replay_update}
+        self.condition = threading.Condition()
+        self.stopping = False
+        self.thread = None
+        self.replayed = 0
+        self.failed = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.acked, self.ids = self.load_state()
+        self.state_size = len(self.ids)
+        self.acks_count, complete_acks = self.load_acks()
+        self.acks = open(self.acks_path, 'a')
+        if not complete_acks:
+            # start the acknowledgements over rather than appending to the incomplete one
+            self.save_state()
+        self.complete_line = True
+        self.pending = collections.deque(entry for entry in self.load_journal() if entry['seq'] > self.acked)
+        self.next_seq = self.pending[-1]['seq'] + 1 if self.pending else self.acked + 1
+        self.journal = open(self.journal_path, 'a')
+        if not self.complete_line:
+            # don't append the next entry to the end of the incomplete one
+            self.journal.write('\n')
+        if start:
+            self.start()
+
+    def load_state(self):
+        if not os.path.exists(self.state_path):
+            return 0, {}
+        with open(self.state_path) as state_file:
+            state = json.load(state_file)
+        return state['acked'], state['ids']
+
+    def load_acks(self):
+        """Apply the acknowledgements saved since state.json was written, returns how many there are, and whether
+        the last one was written completely."""
+        count = 0
+        complete = True
+        if os.path.exists(self.acks_path):
+            with open(self.acks_path) as acks:
+                for line in acks:
+                    complete = line.endswith('\n')
+                    try:
+                        ack = json.loads(line)
+                    except ValueError:
+                        self.logger.warn("Ignoring incomplete spool acknowledgement: %r", line)
+                        continue
+                    self.acked = max(self.acked, ack['seq'])
+                    self.ids.update(ack['ids'])
+                    count += 1
+        return count, complete
+
+    def load_journal(self):
+        entries = []
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path) as journal:
+                for line in journal:
+                    self.complete_line = line.endswith('\n')
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        # the process died while writing this line, it was never acknowledged to the caller
+                        self.logger.warn("Ignoring incomplete spool journal entry: %r", line)
+        return entries
+
+    def start(self):
+        """Start the replayer thread."""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='slick-spool-replayer')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def register(self, op, handler):
+        """Handle entries of kind op with handler.  The replayer calls handler with the entry's data (with temporary
+        ids already replaced), and it should return the id slick gave the object the entry created (if any), or a
+        dictionary of temporary id to slick id if it created more than one.  Register handlers before start(), the
+        replayer waits at an entry whose handler isn't registered yet."""
+        with self.condition:
+            self.handlers[op] = handler
+            self.condition.notify_all()
+
+    def new_temp_id(self):
+        return TEMP_ID_PREFIX + uuid.uuid4().hex
+
+    def submit(self, op, data, temp_id=None):
+        """Append an entry to the journal, returns it's sequence number once it has been written to disk.  temp_id is
+        the temporary id of the object the entry creates, if it creates one."""
+        if op not in self.handlers:
+            raise ValueError("No handler is registered for spool entries of kind {!r}".format(op))
+        with self.condition:
+            entry = {'seq': self.next_seq, 'op': op, 'data': data, 'temp_id': temp_id}
+            self.journal.write(json.dumps(entry) + '\n')
+            self.journal.flush()
+            if self.fsync:
+                os.fsync(self.journal.fileno())
+            self.next_seq += 1
+            self.pending.append(entry)
+            self.condition.notify_all()
+            return entry['seq']
+
+    def create(self, path, model):
+        """Spool creating model at path (like 'results', or 'projects/<id>/releases').  The model's id is set to a
+        temporary id, which is returned."""
+        temp_id = self.new_temp_id()
+        data = model.to_dict(serial=True)
+        data.pop('id', None)
+        self.submit('create', {'path': path, 'model': data}, temp_id)
+        model.id = temp_id
+        model.mark_clean()
+        return temp_id
+
+    def update(self, path, model, append=()):
+        """Spool updating model (which can have a temporary id) at path (like 'results').  Only the fields that
+        changed since the model was last in sync are written (see Model.changed_fields), and the items added to the
+        end of the list fields named in append are sent on their own (POSTed to <path>/<id>/<field>, like a result's
+        log) instead of sending the whole list again.  Returns the entry's sequence number, or None if nothing
+        changed."""
+        appended = {}
+        for key in append:
+            items = model.appended(key)
+            if items:
+                appended[key] = [item.to_dict(serial=True) for item in items]
+        changes = model.to_changes_dict(exclude=appended)
+        if not changes and not appended:
+            return None
+        changes['id'] = model.id
+        seq = self.submit('update', {'path': path, 'model': changes, 'append': appended})
+        model.mark_clean()
+        return seq
+
+    def resolve(self, value):
+        """value with every temporary id slick has since given a real id replaced by that id."""
+        if isinstance(value, dict):
+            return dict((key, self.resolve(item)) for key, item in value.items())
+        if isinstance(value, list):
+            return [self.resolve(item) for item in value]
+        if isinstance(value, string_types) and value.startswith(TEMP_ID_PREFIX):
+            return self.ids.get(value, value)
+        return value
+
+    def server_id(self, temp_id):
+        """The id slick gave the object with temp_id, or None if it hasn't been created yet."""
+        return self.ids.get(temp_id)
+
+    def replay_create(self, data):
+        url = self.connection.getUrl() + '/' + data['path']
+        r = self.connection.request('POST', url, self.endpoint(data['path']), data=json.dumps(data['model']),
+                                    headers=json_content)
+        return r.json().get('id')
+
+    def replay_update(self, data):
+        url = self.connection.getUrl() + '/' + data['path'] + '/' + data['model']['id']
+        endpoint = self.endpoint(data['path'])
+        for key, items in data.get('append', {}).items():
+            self.connection.request('POST', url + '/' + key, endpoint + '.' + key, data=json.dumps(items),
+                                    headers=json_content)
+        if len(data['model']) > 1:
+            self.connection.request('PUT', url, endpoint, data=json.dumps(data['model']), headers=json_content)
+
+    def endpoint(self, path):
+        return self.connection.get_name() + '.' + '.'.join(path.split('/')[0::2])
+
+    def pending_count(self):
+        with self.condition:
+            return len(self.pending)
+
+    def flush(self, timeout=None):
+        """Wait until every entry has been sent to slick (or moved to failed.jsonl).  Returns False if timeout
+        seconds passed first."""
+        with self.condition:
+            if self.thread is None and self.pending:
+                return False
+            return wait_for(self.condition, lambda: not self.pending, timeout)
+
+    def close(self, timeout=None):
+        """Wait (up to timeout seconds) for the spool to drain, then stop the replayer.  Anything not sent yet stays
+        in the journal for the next Spool opened on the directory."""
+        drained = self.flush(timeout)
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        with self.condition:
+            self.journal.close()
+            self.acks.close()
+        return drained
+
+    def run(self):
+        retry_interval = self.retry_interval
+        while True:
+            with self.condition:
+                while not self.pending and not self.stopping:
+                    self.condition.wait()
+                if self.stopping:
+                    return
+                entry = self.pending[0]
+                if entry['op'] not in self.handlers:
+                    # left by a previous run, it's handler hasn't been registered (yet)
+                    self.logger.warn("No handler is registered for spooled %s (entry %d), waiting for one",
+                                     entry['op'], entry['seq'])
+                    self.condition.wait(self.retry_interval)
+                    continue
+            try:
+                server_id = self.handlers[entry['op']](self.resolve(entry['data']))
+            except SlickCommunicationError as error:
+                status_code = getattr(error, 'status_code', None)
+                if status_code is not None and 400 <= status_code < 500:
+                    self.logger.error("Slick rejected spooled %s (entry %d), moving it to %s: %s", entry['op'],
+                                      entry['seq'], self.failed_path, error)
+                    self.record_failure(entry)
+                    self.acknowledge(entry, None)
+                    continue
+                self.logger.warn("Unable to send spooled %s (entry %d) to slick, trying again in %s seconds: %s",
+                                 entry['op'], entry['seq'], retry_interval, error)
+                with self.condition:
+                    if not self.stopping:
+                        self.condition.wait(retry_interval)
+                retry_interval = min(self.max_retry_interval, retry_interval * 2)
+                continue
+            except Exception:
+                self.logger.exception("Error replaying spooled %s (entry %d), moving it to %s", entry['op'],
+                                      entry['seq'], self.failed_path)
+                self.record_failure(entry)
+                server_id = None
+            retry_interval = self.retry_interval
+            self.acknowledge(entry, server_id)
+
+    def acknowledge(self, entry, server_id):
+        with self.condition:
+            ids = {}
+            if isinstance(server_id, dict):
+                ids = server_id
+            elif entry['temp_id'] is not None and server_id is not None:
+                ids = {entry['temp_id']: server_id}
+            self.ids.update(ids)
+            self.acked = entry['seq']
+            self.save_ack(ids)
+            self.pending.popleft()
+            self.replayed += 1
+            if not self.pending:
+                # everything in the journal has been sent, start it over so it doesn't grow forever
+                self.journal.seek(0)
+                self.journal.truncate()
+            self.condition.notify_all()
+
+    def record_failure(self, entry):
+        self.failed += 1
+        with open(self.failed_path, 'a') as failed:
+            failed.write(json.dumps(entry) + '\n')
+
+    def save_ack(self, ids):
+        if self.acks_count >= max(self.compact_after, self.state_size):
+            self.save_state()
+            return
+        self.acks.write(json.dumps({'seq': self.acked, 'ids': ids}) + '\n')
+        self.acks.flush()
+        if self.fsync:
+            os.fsync(self.acks.fileno())
+        self.acks_count += 1
+
+    def save_state(self):
+        """Write the acknowledged sequence number and the whole id mapping to state.json, and start acks.jsonl
+        over."""
+        temp_path = self.state_path + '.tmp'
+        with open(temp_path, 'w') as state_file:
+            json.dump({'acked': self.acked, 'ids': self.ids}, state_file)
+            if self.fsync:
+                state_file.flush()
+                os.fsync(state_file.fileno())
+        if hasattr(os, 'replace'):
+            os.replace(temp_path, self.state_path)
+        else:
+            os.rename(temp_path, self.state_path)
+        # an acknowledgement left over from a crash right here is applied again on top of the new state, which is
+        # harmless
+        self.acks.seek(0)
+        self.acks.truncate()
+        self.acks_count = 0
+        self.state_size = len(self.ids)
+
+    def stats(self):
+        with self.condition:
+            return {'pending': len(self.pending), 'replayed': self.replayed, 'failed': self.failed}
+
+
+def wait_for(condition, predicate, timeout):
+    """Wait on condition (which must be held) until predicate() is true, or timeout seconds pass (None to wait
+    forever).  Returns False if the timeout passed first.  threading.Condition.wait_for doesn't exist in python 2."""
+    end = None if timeout is None else time.time() + timeout
+    while not predicate():
+        if end is None:
+            condition.wait()
+        else:
+            remaining = end - time.time()
+            if remaining <= 0:
+                return False
+            condition.wait(remaining)
+    return True
@@ -0,0 +1,9 @@
+import sys
+import unittest
+
+if sys.version_info >= (3, 5):
+    from slickqa.tests.coroutines.asyncconnection import *
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,208 @@
+import threading
+import time
+import unittest
+
+from slickqa import SlickConnection, Project, Release, Result, Testplan
+from slickqa import SlickCommunicationError
+from slickqa.cache import ResponseCache, SingleFlight
+from slickqa.tests.stubserver import StubSlickServer
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+
+    def test_ttl_by_model(self):
+        cache = ResponseCache(ttls={Project: 10})
+        self.assertEqual(cache.ttl(Project), 10)
+        self.assertEqual(cache.ttl(Result), 0)
+        self.assertEqual(cache.ttl(None), 0)
+
+    def test_expiry(self):
+        cache = ResponseCache()
+        cache.put('http://slick/api/projects', '[]', 0.05)
+        self.assertEqual(cache.get('http://slick/api/projects'), '[]')
+        time.sleep(0.06)
+        self.assertEqual(cache.get('http://slick/api/projects'), None)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_lru(self):
+        cache = ResponseCache(max_entries=2)
+        cache.put('a', '1', 10)
+        cache.put('b', '2', 10)
+        cache.get('a')
+        cache.put('c', '3', 10)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), '1')
+        self.assertEqual(cache.evictions, 1)
+
+    def test_invalidate(self):
+        cache = ResponseCache()
+        for url in ('/api/projects', '/api/projects/1', '/api/projects?name=a', '/api/projectsx', '/api/testplans'):
+            cache.put(url, '{}', 10)
+        cache.invalidate('/api/projects')
+        self.assertEqual(sorted(cache.entries), ['/api/projectsx', '/api/testplans'])
+
+    def test_stale_put_skipped(self):
+        cache = ResponseCache()
+        generation = cache.generation()
+        cache.invalidate('/api/projects')
+        cache.put('/api/projects/1', 'old', 10, generation)
+        cache.put('/api/testplans', '[]', 10, generation)
+        self.assertEqual(sorted(cache.entries), ['/api/testplans'])
+        cache.put('/api/projects/1', 'new', 10, cache.generation())
+        self.assertEqual(cache.get('/api/projects/1'), 'new')
+
+
+class ConnectionCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubSlickServer().start()
+        self.server.add_route('GET', '/api/projects/byname/first', {'id': '1', 'name': 'first'})
+        self.server.add_route('PUT', '/api/projects/1/releases/r1', lambda request: (200, request.json()))
+        self.server.add_route('GET', '/api/testplans', [{'id': 't1', 'name': 'plan'}])
+        self.server.add_route('GET', '/api/results/1', {'id': '1'})
+
+    def tearDown(self):
+        self.server.stop()
+
+    def gets(self):
+        return len([request for request in self.server.requests if request.method == 'GET'])
+
+    def test_cached(self):
+        slick = SlickConnection(self.server.url, cache=True)
+        for i in range(3):
+            project = slick.projects.findByName('first')
+            self.assertEqual(project.name, 'first')
+            self.assertEqual(slick.testplans.findOne().name, 'plan')
+            slick.results('1').get()
+        self.assertEqual(self.gets(), 5)
+        self.assertEqual(slick.cache_stats()['hits'], 4)
+
+        # each call gets it's own copy of the model
+        project.name = 'changed'
+        self.assertEqual(slick.projects.findByName('first').name, 'first')
+
+    def test_not_cached_by_default(self):
+        slick = SlickConnection(self.server.url)
+        slick.projects.findByName('first')
+        slick.projects.findByName('first')
+        self.assertEqual(self.gets(), 2)
+        self.assertEqual(slick.cache_stats(), None)
+
+    def test_changes_invalidate(self):
+        slick = SlickConnection(self.server.url, cache=ResponseCache(ttls={Project: 60, Testplan: 60}))
+        slick.projects.findByName('first')
+        slick.testplans.find()
+        release = Release()
+        release.id = 'r1'
+        slick.projects('1').releases(release).update()
+        slick.projects.findByName('first')
+        slick.testplans.find()
+        self.assertEqual(self.gets(), 3)
+        self.assertEqual(slick.cache_stats()['invalidations'], 1)
+
+
+class InFlightChangeTestCase(unittest.TestCase):
+    """A change made while a GET is on it's way doesn't leave the old version in the cache"""
+
+    def setUp(self):
+        self.server = StubSlickServer().start()
+        self.project = {'id': '1', 'name': 'old'}
+        self.first = True
+
+        def get(request):
+            answer = dict(self.project)
+            if self.first:
+                self.first = False
+                time.sleep(0.3)
+            return 200, answer
+
+        def put(request):
+            self.project = request.json()
+            return 200, self.project
+        self.server.add_route('GET', '/api/projects/1', get)
+        self.server.add_route('PUT', '/api/projects/1', put)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_update_while_get_in_flight(self):
+        slick = SlickConnection(self.server.url, cache=True)
+        answers = []
+        thread = threading.Thread(target=lambda: answers.append(slick.projects('1').get()))
+        thread.start()
+        time.sleep(0.1)
+        project = Project.from_dict({'id': '1', 'name': 'new'})
+        slick.projects(project).update()
+        # started after the change, so it doesn't wait for the request from before it
+        self.assertEqual(slick.projects('1').get().name, 'new')
+        thread.join()
+        self.assertEqual(answers[0].name, 'old')
+        self.assertEqual(slick.projects('1').get().name, 'new')
+        self.assertEqual(len([request for request in self.server.requests if request.method == 'GET']), 2)
+
+
+class SingleFlightTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubSlickServer().start()
+
+        def slow(result, status=200):
+            def respond(request):
+                time.sleep(0.3)
+                return status, result
+            return respond
+        self.server.add_route('GET', '/api/projects/byname/first', slow({'id': '1', 'name': 'first'}))
+        self.server.add_route('GET', '/api/testcases', slow([{'id': 't1', 'name': 'test'}]))
+        self.server.add_route('GET', '/api/results/missing', slow({}, 404))
+
+    def tearDown(self):
+        self.server.stop()
+
+    def run_threads(self, count, function):
+        barrier = threading.Barrier(count)
+        answers = [None] * count
+
+        def run(i):
+            barrier.wait()
+            try:
+                answers[i] = function()
+            except Exception as error:
+                answers[i] = error
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return answers
+
+    def test_coalesced(self):
+        slick = SlickConnection(self.server.url, pool_maxsize=32)
+        projects = self.run_threads(32, lambda: slick.projects.findByName('first'))
+        testcases = self.run_threads(32, lambda: slick.testcases.findOne(name='test'))
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(slick.coalesce_stats(), {'coalesced': 62, 'in_flight': 0})
+        self.assertEqual(set(project.name for project in projects), set(['first']))
+        self.assertEqual(set(testcase.id for testcase in testcases), set(['t1']))
+        # everyone gets their own copy
+        self.assertEqual(len(set(id(project) for project in projects)), 32)
+
+    def test_errors_shared(self):
+        slick = SlickConnection(self.server.url, pool_maxsize=8)
+        answers = self.run_threads(8, lambda: slick.results('missing').get())
+        self.assertTrue(all(isinstance(answer, SlickCommunicationError) for answer in answers))
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_not_coalesced(self):
+        slick = SlickConnection(self.server.url, pool_maxsize=4, coalesce=False)
+        self.run_threads(4, lambda: slick.testcases.find())
+        self.assertEqual(len(self.server.requests), 4)
+        self.assertEqual(slick.coalesce_stats(), None)
+
+    def test_sequential_calls_not_shared(self):
+        flight = SingleFlight()
+        self.assertEqual([flight.do('key', lambda: i) for i in range(3)], [0, 1, 2])
+        self.assertEqual(flight.coalesced, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,515 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from slickqa import SlickConnection, SlickCommunicationError, Project, Release, Result, ResultQuery, \
+    ResultStatus, LogEntry, AMQPSystemConfiguration
+from slickqa.retry import RetryPolicy, CircuitBreaker, HedgePolicy
+from slickqa.micromodels import jsonbackend
+from slickqa.tests.stubserver import StubSlickServer
+
+
+class ConnectionPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubSlickServer().start()
+        self.server.add_route('GET', '/api/projects', [{'id': '1', 'name': 'first'}])
+        self.server.add_route('GET', '/api/projects/1', {'id': '1', 'name': 'first'})
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_api_parts_share_session(self):
+        """Every api part should use the session owned by the connection"""
+        slick = SlickConnection(self.server.url)
+        self.assertTrue(slick.projects.get_connection() is slick)
+        self.assertTrue(slick.projects.releases.builds.get_connection().session is slick.session)
+        self.assertTrue(slick.updates.records.get_connection().session is slick.session)
+
+    def test_connection_reused(self):
+        """Multiple requests through one connection should reuse the same tcp connection"""
+        with SlickConnection(self.server.url) as slick:
+            for i in range(5):
+                projects = slick.projects.find()
+                self.assertEqual(projects[0].name, 'first')
+                self.assertTrue(isinstance(slick.projects('1').get(), Project))
+        self.assertEqual(len(self.server.requests), 10)
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_no_keep_alive(self):
+        """With keep_alive turned off every request should use a new tcp connection"""
+        with SlickConnection(self.server.url, keep_alive=False) as slick:
+            for i in range(3):
+                slick.projects.find()
+        self.assertEqual(len(self.server.connections), 3)
+
+
+class BoundRequestTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubSlickServer().start()
+        self.server.add_route('PUT', '/api/results/[^/]+', lambda request: (200, request.json()))
+        self.server.add_route('POST', '/api/projects/[^/]+/releases', lambda request: (200, request.json()))
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_call_returns_bound_copy(self):
+        slick = SlickConnection(self.server.url)
+        project = Project()
+        project.id = 'p1'
+        bound = slick.projects(project)
+        self.assertTrue(bound is not slick.projects)
+        self.assertEqual(bound.getUrl(), self.server.url + '/api/projects/p1')
+        # neither the unbound part, nor the bound one, change when they are used
+        self.assertEqual(slick.projects.getUrl(), self.server.url + '/api/projects')
+        self.assertEqual(bound.getUrl(), self.server.url + '/api/projects/p1')
+        self.assertEqual(bound.releases('r1').builds.getUrl(), self.server.url + '/api/projects/p1/releases/r1/builds')
+        self.assertEqual(slick.projects.releases.builds.getUrl(), self.server.url + '/api/projects/releases/builds')
+        self.assertEqual(bound.releases.get_collection_url(), self.server.url + '/api/projects/p1/releases')
+
+    def test_system_configuration_model(self):
+        slick = SlickConnection(self.server.url)
+        typed = slick.systemconfigurations(AMQPSystemConfiguration, 'c1')
+        self.assertEqual(typed.model, AMQPSystemConfiguration)
+        self.assertEqual(typed.getUrl(), self.server.url + '/api/system-configuration/c1')
+        self.assertNotEqual(slick.systemconfigurations.model, AMQPSystemConfiguration)
+
+    def test_shared_connection_many_threads(self):
+        """Many threads using one connection at the same time should each get their own object's url"""
+        slick = SlickConnection(self.server.url, pool_maxsize=16)
+        errors = []
+
+        def report(thread_number):
+            try:
+                for i in range(25):
+                    result = Result()
+                    result.id = '{}-{}'.format(thread_number, i)
+                    result.reason = result.id
+                    updated = slick.results(result).update()
+                    assert updated.reason == result.id, (updated.reason, result.id)
+                    release = Release()
+                    release.name = result.id
+                    created = slick.projects(str(thread_number)).releases(release).create()
+                    assert created.name == result.id, (created.name, result.id)
+            except Exception as error:
+                errors.append(error)
+        threads = [threading.Thread(target=report, args=(n,)) for n in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        for request in self.server.requests:
+            if request.method == 'PUT':
+                self.assertEqual(request.path, '/api/results/' + request.json()['reason'])
+            else:
+                self.assertEqual(request.path, '/api/projects/{}/releases'.format(request.json()['name'].split('-')[0]))
+        self.assertEqual(len(self.server.requests), 16 * 25 * 2)
+
+
+class PartialUpdateTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubSlickServer().start()
+        self.server.add_route('POST', '/api/results', lambda request: (200, dict(request.json(), id='1')))
+        self.server.add_route('PUT', '/api/results/1', lambda request: (200, request.json()))
+        self.server.add_route('POST', '/api/results/1/log', {})
+        self.default_backend = jsonbackend.get_backend()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_update_changes(self):
+        """The size of an update shouldn't grow with the size of the result's log"""
+        slick = SlickConnection(self.server.url)
+        result = Result()
+        result.status = ResultStatus.NO_RESULT
+        result.log = []
+        result = slick.results(result).create()
+        for i in range(50):
+            entry = LogEntry()
+            entry.message = 'message {}'.format(i)
+            result.log.append(entry)
+            result.reason = 'step {}'.format(i)
+            slick.results(result).update_changes()
+        puts = [request for request in self.server.requests if request.method == 'PUT']
+        logs = [request for request in self.server.requests if request.path == '/api/results/1/log']
+        self.assertEqual(len(puts), 50)
+        self.assertEqual(puts[-1].json(), {'id': '1', 'reason': 'step 49'})
+        self.assertTrue(max(len(request.body) for request in logs) <= len(logs[0].body) + 1)
+        self.assertEqual(logs[-1].json()[0]['message'], 'message 49')
+
+        # nothing changed, nothing to send
+        slick.results(result).update_changes()
+        self.assertEqual(len(self.server.requests), 101)
+
+    def test_partial_update(self):
+        slick = SlickConnection(self.server.url)
+        result = Result.from_dict({'id': '1', 'status': 'FAIL', 'reason': 'broken'})
+        result.status = ResultStatus.PASS
+        slick.results(result).update(partial=True)
+        self.assertEqual(self.server.requests[-1].json(), {'id': '1', 'status': 'PASS'})
+        slick.results(result).update()
+        self.assertEqual(self.server.requests[-1].json(), {'id': '1', 'status': 'PASS', 'reason': 'broken'})
+
+    def test_json_backends(self):
+        """Every json backend should send and receive the same thing"""
+        slick = SlickConnection(self.server.url)
+        try:
+            for name in jsonbackend.available_backends():
+                jsonbackend.set_backend(name)
+                result = Result()
+                result.reason = u'\u00e9chec \u2603'
+                result = slick.results(result).create()
+                self.assertEqual((result.id, result.reason), ('1', u'\u00e9chec \u2603'), name)
+                self.assertTrue(isinstance(self.server.requests[-1].body, bytes))
+        finally:
+            jsonbackend.set_backend(self.default_backend)
+
+
+class RetryPolicyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubSlickServer().start()
+        self.server.add_route('GET', '/api/projects/missing', {}, status=404)
+        self.server.add_route('GET', '/api/projects/broken', {}, status=503)
+        self.failures = 2
+
+        def flaky(request):
+            if self.failures > 0:
+                self.failures -= 1
+                return 500, {}
+            return 200, {'id': 'flaky', 'name': 'flaky'}
+        self.server.add_route('GET', '/api/projects/flaky', flaky)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_client_errors_not_retried(self):
+        """A 4xx response should fail right away, trying again won't change the answer"""
+        slick = SlickConnection(self.server.url, retry_policy=RetryPolicy(backoff_base=0))
+        self.assertRaises(SlickCommunicationError, slick.projects('missing').get)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(slick.retry_stats()['retries'], 0)
+
+    def test_server_errors_retried(self):
+        slick = SlickConnection(self.server.url, retry_policy=RetryPolicy(backoff_base=0))
+        self.assertEqual(slick.projects('flaky').get().name, 'flaky')
+        self.assertEqual(slick.retry_stats()['retries'], 2)
+        self.assertRaises(SlickCommunicationError, slick.projects('broken').get)
+        self.assertEqual(len(self.server.requests), 6)
+
+    def test_backoff(self):
+        policy = RetryPolicy(backoff_base=1, backoff_multiplier=2, backoff_max=5, jitter=False)
+        self.assertEqual([policy.backoff(i) for i in range(1, 6)], [1, 2, 4, 5, 5])
+        policy.jitter = True
+        for i in range(20):
+            self.assertTrue(0 <= policy.backoff(3) <= 4)
+
+    def test_max_elapsed(self):
+        """No retry should be attempted that would go past max_elapsed"""
+        slick = SlickConnection(self.server.url, retry_policy=RetryPolicy(max_attempts=10, backoff_base=1,
+                                                                          jitter=False, max_elapsed=2.5))
+        start = time.time()
+        self.assertRaises(SlickCommunicationError, slick.projects('broken').get)
+        self.assertLess(time.time() - start, 2.5)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_circuit_breaker(self):
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.2)
+        slick = SlickConnection(self.server.url, retry_policy=RetryPolicy(max_attempts=1), circuit_breaker=breaker)
+        for i in range(3):
+            self.assertRaises(SlickCommunicationError, slick.projects('broken').get)
+        self.assertEqual(breaker.state('slick.projects'), CircuitBreaker.OPEN)
+        self.assertRaises(SlickCommunicationError, slick.projects('flaky').get)
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(slick.retry_stats(), {'retries': 0, 'breaker_trips': 1, 'breaker_rejected': 1})
+
+        # other endpoints aren't affected
+        self.assertRaises(SlickCommunicationError, slick.results('broken').get)
+        self.assertEqual(len(self.server.requests), 4)
+
+        # after the reset timeout a trial request is let through, the circuit closes once it succeeds
+        self.failures = 0
+        time.sleep(0.25)
+        self.assertEqual(slick.projects('flaky').get().id, 'flaky')
+        self.assertEqual(breaker.state('slick.projects'), CircuitBreaker.CLOSED)
+
+    def test_client_errors_dont_trip_breaker(self):
+        breaker = CircuitBreaker(failure_threshold=2)
+        slick = SlickConnection(self.server.url, circuit_breaker=breaker)
+        for i in range(4):
+            self.assertRaises(SlickCommunicationError, slick.projects('missing').get)
+        self.assertEqual(breaker.state('slick.projects'), CircuitBreaker.CLOSED)
+
+
+class DeadlineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubSlickServer().start()
+        self.server.add_route('GET', '/api/projects/broken', {}, status=503)
+
+        def slow(request):
+            time.sleep(0.5)
+            return 200, {'id': 'slow', 'name': 'slow'}
+        self.server.add_route('GET', '/api/projects/slow', slow)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_read_timeout(self):
+        slick = SlickConnection(self.server.url, retry_policy=RetryPolicy(max_attempts=2, backoff_base=0),
+                                read_timeout=0.1)
+        start = time.time()
+        self.assertRaises(SlickCommunicationError, slick.projects('slow').get)
+        self.assertLess(time.time() - start, 0.45)
+        self.assertEqual(SlickConnection(self.server.url).projects('slow').get().name, 'slow')
+
+    def test_deadline_bounds_retries(self):
+        slick = SlickConnection(self.server.url, retry_policy=RetryPolicy(max_attempts=100, backoff_base=0.05,
+                                                                          backoff_multiplier=1, jitter=False),
+                                deadline=0.3)
+        start = time.time()
+        with self.assertRaises(SlickCommunicationError) as raised:
+            slick.projects('broken').get()
+        self.assertLess(time.time() - start, 0.4)
+        self.assertTrue(raised.exception.deadline_exceeded)
+        self.assertEqual(raised.exception.status_code, 503)
+        self.assertTrue(1 < len(self.server.requests) < 10)
+
+    def test_deadline_cuts_timeouts_short(self):
+        slick = SlickConnection(self.server.url, deadline=0.2)
+        start = time.time()
+        with self.assertRaises(SlickCommunicationError) as raised:
+            slick.projects('slow').get()
+        self.assertLess(time.time() - start, 0.45)
+        self.assertTrue(raised.exception.deadline_exceeded)
+
+    def test_deadline_scope(self):
+        """A deadline set with deadline() covers every request made inside it"""
+        slick = SlickConnection(self.server.url, deadline=10)
+        start = time.time()
+        with slick.deadline(0.3):
+            # a longer deadline inside it can't extend it
+            with slick.deadline(5):
+                self.assertRaises(SlickCommunicationError, slick.projects('slow').get)
+            with self.assertRaises(SlickCommunicationError) as raised:
+                slick.projects('broken').get()
+        self.assertTrue(raised.exception.deadline_exceeded)
+        self.assertLess(time.time() - start, 0.45)
+        self.assertEqual(slick.projects('slow').get().name, 'slow')
+
+
+class HedgeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubSlickServer().start()
+        self.count = 0
+        self.lock = threading.Lock()
+
+        def sometimes_slow(request):
+            # every 4th request is stuck for a while, the rest are quick
+            with self.lock:
+                self.count += 1
+                slow = self.count % 4 == 0
+            if slow:
+                time.sleep(0.5)
+            return 200, {'id': '1', 'name': 'slow' if slow else 'fast'}
+        self.server.add_route('GET', '/api/projects/1', sometimes_slow)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_policy(self):
+        policy = HedgePolicy(percentile=50, min_samples=4, min_delay=0.01, max_rate=0.5)
+        self.assertIsNone(policy.delay('slick.projects'))
+        for latency in (0.02, 0.04, 0.03, 0.5):
+            policy.record('slick.projects', latency)
+        self.assertEqual(policy.delay('slick.projects'), 0.03)
+        policy.hedged()
+        # a second hedge would make it 2 of 3 requests, over the max rate
+        self.assertIsNone(policy.delay('slick.projects'))
+        self.assertIsNone(policy.delay('slick.results'))
+        self.assertEqual(policy.stats()['hedge_rate'], 0.25)
+
+    def test_hedged_get(self):
+        slick = SlickConnection(self.server.url, hedge=HedgePolicy(min_samples=3, max_rate=1))
+        start = time.time()
+        projects = [slick.projects('1').get() for _ in range(12)]
+        # the slow requests were answered by their hedges
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEqual([project.name for project in projects], ['fast'] * 12)
+        stats = slick.hedge_stats()
+        self.assertEqual(stats['requests'], 12)
+        self.assertTrue(2 <= stats['hedges'] <= 4)
+        self.assertTrue(stats['hedge_wins'] >= 2)
+        metrics = slick.metrics()['slick.projects']['GET']
+        self.assertEqual((metrics['hedges'], metrics['hedge_wins']), (stats['hedges'], stats['hedge_wins']))
+        slick.close()
+
+    def test_not_hedged(self):
+        slick = SlickConnection(self.server.url)
+        self.assertIsNone(slick.hedge_stats())
+        self.assertEqual(slick.projects('1').get().name, 'fast')
+        self.assertEqual(slick.metrics()['slick.projects']['GET']['hedges'], 0)
+
+
+class FindIterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubSlickServer().start()
+        self.results = [{'id': str(i), 'status': 'PASS', 'log': [{'message': 'x' * 100}] * 10} for i in range(500)]
+        self.server.add_route('GET', '/api/results', lambda request: (200, self.results))
+        self.server.add_route('GET', '/api/testruns', b'[{"id": "1"}, {"id": ')
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_find_iter(self):
+        slick = SlickConnection(self.server.url)
+        slick.results.stream_chunk_size = 1024
+        results = slick.results.find_iter(ResultQuery(testrunid='1'))
+        self.assertEqual(len(self.server.requests), 0)
+        first = next(results)
+        self.assertTrue(isinstance(first, Result))
+        self.assertEqual(first.id, '0')
+        self.assertEqual(len(first.log), 10)
+        self.assertEqual([result.id for result in results], [str(i) for i in range(1, 500)])
+        self.assertEqual(self.server.requests[0].query, 'testrunid=1')
+
+    def test_truncated_response(self):
+        slick = SlickConnection(self.server.url)
+        self.assertRaises(SlickCommunicationError, list, slick.testruns.find_iter())
+
+    def test_lazy(self):
+        slick = SlickConnection(self.server.url)
+        for results in (slick.results.find(lazy=True), list(slick.results.find_iter(lazy=True))):
+            self.assertEqual(len(results), 500)
+            self.assertTrue(isinstance(results[0], Result))
+            self.assertTrue('log' not in vars(results[0]))
+            self.assertEqual(results[0].status, 'PASS')
+            self.assertEqual(results[0].log[0].message, 'x' * 100)
+        self.assertEqual(self.server.requests[0].query, '')
+
+
+class FileUploadTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubSlickServer().start()
+        self.chunks = []
+        self.fail_after = None
+        self.lose_answer = None
+        self.chunk_delay = 0.001
+
+        def create(request):
+            storedfile = request.json()
+            storedfile['id'] = 'f1'
+            storedfile.setdefault('chunkSize', 1000)
+            return 200, storedfile
+
+        def addchunk(request):
+            if self.fail_after is not None and len(self.chunks) >= self.fail_after:
+                return 400, {}
+            time.sleep(self.chunk_delay)
+            self.chunks.append(request.body)
+            if len(self.chunks) == self.lose_answer:
+                return 503, {}
+            return 200, {}
+        self.server.add_route('POST', '/api/files', create)
+        self.server.add_route('POST', '/api/files/f1/addchunk', addchunk)
+        self.server.add_route('PUT', '/api/files/f1', lambda request: (200, request.json()))
+        self.server.add_route('GET', '/api/files/f1', lambda request: (200, {'id': 'f1', 'chunkSize': 1000}))
+        self.data = bytes(bytearray(i % 251 for i in range(100000)))
+        self.tempdir = tempfile.mkdtemp()
+        self.local_file = os.path.join(self.tempdir, 'data.bin')
+        with open(self.local_file, 'wb') as local_file:
+            local_file.write(self.data)
+        self.checkpoint_dir = os.path.join(self.tempdir, 'checkpoints')
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tempdir)
+
+    def test_upload(self):
+        slick = SlickConnection(self.server.url)
+        for max_in_flight in (0, 1, 4):
+            del self.chunks[:]
+            storedfile = slick.files.upload_local_file('data.bin', io.BytesIO(self.data), max_in_flight=max_in_flight)
+            self.assertEqual(b''.join(self.chunks), self.data)
+            self.assertEqual(len(self.chunks), 100)
+            self.assertEqual(storedfile.md5, hashlib.md5(self.data).hexdigest())
+            self.assertEqual(storedfile.length, len(self.data))
+
+    def test_upload_deadline(self):
+        """The deadline covers the whole upload, not each request"""
+        self.chunk_delay = 0.02
+        slick = SlickConnection(self.server.url)
+        for max_in_flight in (0, 4):
+            start = time.time()
+            with self.assertRaises(SlickCommunicationError) as raised:
+                slick.files.upload_local_file(self.local_file, max_in_flight=max_in_flight, deadline=0.3)
+            self.assertTrue(raised.exception.deadline_exceeded)
+            self.assertLess(time.time() - start, 0.5)
+
+    def test_chunk_size(self):
+        slick = SlickConnection(self.server.url)
+        storedfile = slick.files.upload_local_file('data.bin', io.BytesIO(self.data), chunk_size=30000)
+        self.assertEqual(storedfile.chunkSize, 30000)
+        self.assertEqual([len(chunk) for chunk in self.chunks], [30000, 30000, 30000, 10000])
+
+    def test_upload_failure(self):
+        self.fail_after = 5
+        slick = SlickConnection(self.server.url)
+        self.assertRaises(SlickCommunicationError, slick.files.upload_local_file, 'data.bin', io.BytesIO(self.data))
+        self.assertEqual(len(self.chunks), 5)
+        self.assertFalse(any(request.method == 'PUT' for request in self.server.requests))
+
+    def test_chunk_not_retried(self):
+        """A chunk slick stored, but didn't answer for, isn't sent (and appended) again"""
+        self.lose_answer = 5
+        slick = SlickConnection(self.server.url)
+        self.assertRaises(SlickCommunicationError, slick.files.upload_local_file, 'data.bin', io.BytesIO(self.data))
+        self.assertEqual(b''.join(self.chunks), self.data[:5000])
+
+    def test_resume_upload(self):
+        """An interrupted resumable upload should continue after the last acknowledged chunk"""
+        self.fail_after = 30
+        slick = SlickConnection(self.server.url, retry_policy=RetryPolicy(max_attempts=1))
+        self.assertRaises(SlickCommunicationError, slick.files.upload_local_file, self.local_file, resumable=True,
+                          checkpoint_dir=self.checkpoint_dir)
+        self.assertEqual(len(self.chunks), 30)
+        self.assertEqual(len(os.listdir(self.checkpoint_dir)), 1)
+
+        self.fail_after = None
+        storedfile = slick.files.upload_local_file(self.local_file, resumable=True, checkpoint_dir=self.checkpoint_dir)
+        self.assertEqual(b''.join(self.chunks), self.data)
+        self.assertEqual(storedfile.md5, hashlib.md5(self.data).hexdigest())
+        self.assertEqual(len([request for request in self.server.requests if request.path == '/api/files']), 1)
+        self.assertEqual(os.listdir(self.checkpoint_dir), [])
+
+    def test_resume_changed_file(self):
+        """A checkpoint whose data doesn't match the local file anymore should not be resumed"""
+        self.fail_after = 30
+        slick = SlickConnection(self.server.url, retry_policy=RetryPolicy(max_attempts=1))
+        self.assertRaises(SlickCommunicationError, slick.files.upload_local_file, self.local_file, resumable=True,
+                          checkpoint_dir=self.checkpoint_dir)
+        stat = os.stat(self.local_file)
+        with open(self.local_file, 'r+b') as local_file:
+            local_file.write(b'changed')
+        os.utime(self.local_file, (stat.st_atime, stat.st_mtime))
+
+        self.fail_after = None
+        del self.chunks[:]
+        slick.files.upload_local_file(self.local_file, resumable=True, checkpoint_dir=self.checkpoint_dir)
+        self.assertEqual(len(self.chunks), 100)
+        self.assertEqual(len([request for request in self.server.requests if request.path == '/api/files']), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
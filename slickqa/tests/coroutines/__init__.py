@@ -0,0 +1,5 @@
+"""
+Tests written with async def and await, which are a syntax error before python 3.5.  The modules here are imported by
+the test modules one level up (like slickqa/tests/asyncconnection.py) only on a python that can compile them, and none
+of their names look like tests, so a test runner pointed at this directory doesn't import them itself.
+"""
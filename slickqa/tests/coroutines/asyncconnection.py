@@ -0,0 +1,217 @@
+import asyncio
+import io
+import time
+import unittest
+
+from slickqa import AsyncSlickConnection, SlickCommunicationError, Project, Release, Result
+from slickqa.retry import HedgePolicy, TASK_LOCAL_DEADLINES
+from slickqa.tests.stubserver import StubSlickServer
+
+
+def run_loop(coroutine):
+    # asyncio.run needs python 3.7
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class AsyncConnectionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubSlickServer().start()
+        self.server.add_route('GET', '/api/projects', [{'id': '1', 'name': 'first'}])
+        self.server.add_route('GET', '/api/projects/1', {'id': '1', 'name': 'first'})
+        self.server.add_route('POST', '/api/projects/1/releases', lambda request: (200, request.json()))
+        self.server.add_route('PUT', '/api/results/[^/]+', lambda request: (200, request.json()))
+        self.server.add_route('DELETE', '/api/results/[^/]+', {})
+        self.server.add_route('GET', '/api/results/missing', {}, status=404)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def run_async(self, coroutine_function):
+        async def run():
+            async with AsyncSlickConnection(self.server.url) as slick:
+                return await coroutine_function(slick)
+        return run_loop(run())
+
+    def test_same_api_tree(self):
+        """The async connection should have the same attribute tree as SlickConnection"""
+        async def check(slick):
+            self.assertEqual(slick.projects.releases.builds.getUrl(), self.server.url + '/api/projects/releases/builds')
+            self.assertEqual(slick.updates.records.get_name(), 'slick.updates.records')
+            self.assertTrue(hasattr(slick.files, 'upload_local_file'))
+            self.assertTrue(hasattr(slick.testrungroups, 'add_testrun'))
+        self.run_async(check)
+
+    def test_find_and_get(self):
+        async def check(slick):
+            projects = await slick.projects.find()
+            self.assertEqual(projects[0].name, 'first')
+            project = await slick.projects('1').get()
+            self.assertTrue(isinstance(project, Project))
+            self.assertEqual((await slick.projects.findOne()).id, '1')
+            self.assertEqual(slick.metrics()['slick.projects']['GET']['requests'], 3)
+        self.run_async(check)
+
+    def test_find_iter(self):
+        async def check(slick):
+            names = []
+            async for project in slick.projects.find_iter():
+                names.append(project.name)
+            return names
+        self.assertEqual(self.run_async(check), ['first'])
+
+    def test_find_iter_chunks(self):
+        """The response is decoded as it arrives, and released when iterating stops early"""
+        self.server.add_route('GET', '/api/results', [{'id': str(i), 'reason': 'x' * 100} for i in range(50)])
+
+        async def check(slick):
+            slick.results.stream_chunk_size = 64
+            ids = []
+            async for result in slick.results.find_iter():
+                ids.append(result.id)
+            iterator = slick.results.find_iter()
+            first = await iterator.__anext__()
+            iterator.close()
+            with self.assertRaises(StopAsyncIteration):
+                await iterator.__anext__()
+            return ids, first.id
+        ids, first = self.run_async(check)
+        self.assertEqual(ids, [str(i) for i in range(50)])
+        self.assertEqual(first, '0')
+
+    def test_create_nested(self):
+        async def check(slick):
+            release = Release()
+            release.name = 'new release'
+            created = await slick.projects('1').releases(release).create()
+            self.assertTrue(isinstance(created, Release))
+            self.assertEqual(created.name, 'new release')
+        self.run_async(check)
+
+    def test_concurrent_updates(self):
+        """Requests created before being awaited should each go to their own url, over one shared pool"""
+        async def check(slick):
+            results = []
+            for i in range(20):
+                result = Result()
+                result.id = str(i)
+                result.reason = 'reason ' + str(i)
+                results.append(result)
+            updated = await asyncio.gather(*[slick.results(result).update() for result in results])
+            self.assertEqual([result.reason for result in updated], ['reason ' + str(i) for i in range(20)])
+            await slick.results('5').remove()
+        self.run_async(check)
+        paths = sorted(request.path for request in self.server.requests if request.method == 'PUT')
+        self.assertEqual(paths, sorted('/api/results/' + str(i) for i in range(20)))
+        self.assertLessEqual(len(self.server.connections), 10)
+
+    def test_upload(self):
+        data = b'0123456789' * 1000
+        chunks = []
+
+        def addchunk(request):
+            chunks.append(request.body)
+            return 200, {}
+        self.server.add_route('POST', '/api/files', lambda request: (200, dict(request.json(), id='f1')))
+        self.server.add_route('POST', '/api/files/f1/addchunk', addchunk)
+        self.server.add_route('PUT', '/api/files/f1', lambda request: (200, request.json()))
+
+        async def check(slick):
+            return await slick.files.upload_local_file('data.txt', io.BytesIO(data), chunk_size=3000)
+        storedfile = self.run_async(check)
+        self.assertEqual(storedfile.chunkSize, 3000)
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(b''.join(chunks), data)
+
+    def test_cache(self):
+        async def check(slick):
+            for i in range(3):
+                self.assertEqual((await slick.projects('1').get()).name, 'first')
+            release = Release()
+            release.name = 'new release'
+            await slick.projects('1').releases(release).create()
+            await slick.projects('1').get()
+
+        async def run():
+            async with AsyncSlickConnection(self.server.url, cache=True) as slick:
+                await check(slick)
+        run_loop(run())
+        self.assertEqual(len([request for request in self.server.requests if request.method == 'GET']), 2)
+
+    def test_failure(self):
+        async def check(slick):
+            with self.assertRaises(SlickCommunicationError):
+                await slick.results('missing').get()
+        self.run_async(check)
+
+    @unittest.skipUnless(TASK_LOCAL_DEADLINES, "needs contextvars")
+    def test_deadline_per_task(self):
+        """A deadline set by one task doesn't apply to the requests of another"""
+        def slow(request):
+            time.sleep(0.3)
+            return 200, {'id': '3', 'name': 'slow'}
+        self.server.add_route('GET', '/api/projects/3', slow)
+
+        async def with_deadline(slick):
+            with slick.deadline(0.1):
+                await asyncio.sleep(0.05)
+                with self.assertRaises(SlickCommunicationError) as raised:
+                    await slick.projects('3').get()
+            self.assertTrue(raised.exception.deadline_exceeded)
+
+        async def without_deadline(slick):
+            # starts while the other task's deadline is in effect
+            await asyncio.sleep(0.01)
+            return await slick.projects('3').get()
+
+        async def check(slick):
+            _, project = await asyncio.gather(with_deadline(slick), without_deadline(slick))
+            return project.name
+        self.assertEqual(self.run_async(check), 'slow')
+
+    @unittest.skipUnless(TASK_LOCAL_DEADLINES, "needs contextvars")
+    def test_upload_deadline(self):
+        def slow_chunk(request):
+            time.sleep(0.2)
+            return 200, {}
+        self.server.add_route('POST', '/api/files', lambda request: (200, dict(request.json(), id='f1')))
+        self.server.add_route('POST', '/api/files/f1/addchunk', slow_chunk)
+
+        async def check(slick):
+            with self.assertRaises(SlickCommunicationError) as raised:
+                await slick.files.upload_local_file('data.txt', io.BytesIO(b'x' * 5000), chunk_size=1000,
+                                                    deadline=0.3)
+            return raised.exception
+        start = time.time()
+        self.assertTrue(self.run_async(check).deadline_exceeded)
+        self.assertLess(time.time() - start, 0.6)
+
+    def test_hedged_get(self):
+        requests = []
+
+        def sometimes_slow(request):
+            requests.append(request)
+            if len(requests) % 4 == 0:
+                time.sleep(0.5)
+            return 200, {'id': '2', 'name': 'second'}
+        self.server.add_route('GET', '/api/projects/2', sometimes_slow)
+
+        async def run():
+            async with AsyncSlickConnection(self.server.url, hedge=HedgePolicy(min_samples=3, max_rate=1)) as slick:
+                start = time.time()
+                for i in range(8):
+                    self.assertEqual((await slick.projects('2').get()).name, 'second')
+                self.assertLess(time.time() - start, 0.5)
+                return slick.hedge_stats(), slick.metrics()['slick.projects']['GET']
+        stats, metrics = run_loop(run())
+        self.assertTrue(stats['hedges'] >= 1)
+        self.assertTrue(stats['hedge_wins'] >= 1)
+        self.assertEqual((metrics['hedges'], metrics['hedge_wins']), (stats['hedges'], stats['hedge_wins']))
+
+
+if __name__ == "__main__":
+    unittest.main()
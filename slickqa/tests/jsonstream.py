@@ -0,0 +1,49 @@
+import json
+import unittest
+
+from slickqa.jsonstream import JsonArrayStreamDecoder, iter_json_array
+
+
+class JsonArrayStreamDecoderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.items = [{'id': str(i), 'name': u'résult [{,}] "%d"' % i, 'values': [i, i * 1.5, None, True]}
+                      for i in range(50)]
+        self.items.extend([12345, -0.25, 'string, with ] in it', None, False, [], {}])
+        self.document = json.dumps(self.items, indent=1).encode('utf-8')
+
+    def test_whole_document(self):
+        self.assertEqual(list(iter_json_array([self.document])), self.items)
+
+    def test_every_split(self):
+        """Splitting the document anywhere (even inside a multibyte character or a number) should not matter"""
+        for size in (1, 2, 3, 7, 64, 1000):
+            chunks = [self.document[i:i + size] for i in range(0, len(self.document), size)]
+            self.assertEqual(list(iter_json_array(chunks)), self.items)
+
+    def test_items_yielded_as_they_complete(self):
+        decoder = JsonArrayStreamDecoder()
+        self.assertEqual(decoder.feed(b'[{"a": 1}, {"b"'), [{'a': 1}])
+        self.assertEqual(decoder.feed(b': 2}, 1'), [{'b': 2}])
+        self.assertEqual(decoder.feed(b'0]'), [10])
+        decoder.close()
+
+    def test_buffer_bounded_by_item(self):
+        decoder = JsonArrayStreamDecoder()
+        decoder.feed(b'[')
+        for i in range(1000):
+            decoder.feed(json.dumps({'id': i, 'padding': 'x' * 100}).encode('utf-8') + b',')
+            self.assertLess(len(decoder.buffer) - decoder.position, 200)
+
+    def test_empty_array(self):
+        self.assertEqual(list(iter_json_array([b' [ ', b' ] '])), [])
+
+    def test_truncated(self):
+        self.assertRaises(ValueError, list, iter_json_array([b'[{"a": 1}, {"b": ']))
+
+    def test_not_an_array(self):
+        self.assertRaises(ValueError, list, iter_json_array([b'{"a": 1}']))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import threading
+import time
+import unittest
+
+from slickqa import SlickConnection, LogEntry
+from slickqa.logshipper import LogShipper
+from slickqa.retry import RetryPolicy
+from slickqa.tests.stubserver import StubSlickServer
+
+
+def entry(message):
+    log_entry = LogEntry()
+    log_entry.message = message
+    return log_entry
+
+
+class LogShipperTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubSlickServer().start()
+        self.delay = 0
+        self.release = threading.Event()
+        self.release.set()
+
+        def add_log(request):
+            self.release.wait()
+            time.sleep(self.delay)
+            return 200, {}
+        self.server.add_route('POST', '/api/results/rejected/log', {}, status=400)
+        self.server.add_route('POST', '/api/results/[^/]+/log', add_log)
+
+    def tearDown(self):
+        self.release.set()
+        self.server.stop()
+
+    def logs(self, result_id):
+        return [request.json() for request in self.server.requests if request.path == '/api/results/{}/log'.format(
+            result_id)]
+
+    def test_batch_size(self):
+        shipper = LogShipper(SlickConnection(self.server.url), max_batch=10, max_delay=1)
+        for i in range(25):
+            shipper.ship('1', entry(str(i)))
+        time.sleep(0.2)
+        # two full batches are sent right away, the rest waits for max_delay
+        self.assertEqual([len(batch) for batch in self.logs('1')], [10, 10])
+        self.assertTrue(shipper.close(5))
+        self.assertEqual([log['message'] for batch in self.logs('1') for log in batch], [str(i) for i in range(25)])
+
+    def test_batch_delay(self):
+        shipper = LogShipper(SlickConnection(self.server.url), max_delay=0.1)
+        shipper.ship('1', entry('first'))
+        shipper.ship('2', entry('second'))
+        shipper.ship('1', entry('third'))
+        self.assertTrue(shipper.flush(2))
+        self.assertEqual([[log['message'] for log in batch] for batch in self.logs('1')], [['first', 'third']])
+        self.assertEqual(len(self.logs('2')), 1)
+        self.assertEqual(shipper.stats()['batches'], 1)
+        shipper.close()
+
+    def test_never_waits_on_slick(self):
+        self.release.clear()
+        shipper = LogShipper(SlickConnection(self.server.url), max_batch=1, max_queue=5, max_delay=0)
+        start = time.time()
+        shipped = [shipper.ship('1', entry(str(i))) for i in range(20)]
+        self.assertLess(time.time() - start, 0.5)
+        self.assertTrue(shipped[0])
+        self.assertFalse(shipped[-1])
+        self.release.set()
+        self.assertTrue(shipper.close(5))
+        stats = shipper.stats()
+        self.assertEqual(stats['shipped'] + stats['dropped'], 20)
+        self.assertTrue(stats['dropped'] >= 14)
+
+    def test_close_times_out(self):
+        """close doesn't wait longer than it's timeout, even with slick stuck and the queue full"""
+        self.release.clear()
+        shipper = LogShipper(SlickConnection(self.server.url), max_batch=1, max_queue=5, max_delay=0)
+        for i in range(10):
+            shipper.ship('1', entry(str(i)))
+        start = time.time()
+        self.assertFalse(shipper.close(0.3))
+        self.assertLess(time.time() - start, 0.5)
+        self.release.set()
+        shipper.thread.join(5)
+        self.assertFalse(shipper.thread.is_alive())
+
+    def test_failures_counted(self):
+        shipper = LogShipper(SlickConnection(self.server.url, retry_policy=RetryPolicy(max_attempts=1)),
+                             max_delay=0)
+        shipper.ship('rejected', entry('lost'))
+        shipper.ship('1', entry('kept'))
+        self.assertTrue(shipper.close(5))
+        self.assertEqual(shipper.stats()['failed'], 1)
+        self.assertEqual(shipper.stats()['shipped'], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import io
+import unittest
+
+from slickqa import SlickConnection, SlickCommunicationError, Result, Testrun
+from slickqa.metrics import LatencyHistogram, RequestMetrics
+from slickqa.retry import RetryPolicy
+from slickqa.tests.stubserver import StubSlickServer
+
+
+class LatencyHistogramTestCase(unittest.TestCase):
+
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        for i in range(1, 101):
+            histogram.record(i / 1000.0)
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot['count'], 100)
+        self.assertAlmostEqual(snapshot['mean'], 0.0505)
+        self.assertEqual((snapshot['min'], snapshot['max']), (0.001, 0.1))
+        # buckets are at most 19% wide
+        self.assertTrue(0.050 <= snapshot['p50'] <= 0.050 * 1.19, snapshot['p50'])
+        self.assertTrue(0.090 <= snapshot['p90'] <= 0.090 * 1.19, snapshot['p90'])
+        self.assertTrue(0.099 <= snapshot['p99'] <= 0.1, snapshot['p99'])
+
+    def test_empty(self):
+        self.assertEqual(LatencyHistogram().snapshot(), {'count': 0})
+        self.assertEqual(LatencyHistogram().percentile(50), None)
+
+
+class ConnectionMetricsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubSlickServer().start()
+        self.server.add_route('GET', '/api/results', [{'id': '1'}])
+        self.server.add_route('PUT', '/api/results/[^/]+', lambda request: (200, request.json()))
+        self.server.add_route('GET', '/api/results/missing', {}, status=404)
+        self.server.add_route('GET', '/api/results/broken', {}, status=500)
+        self.server.add_route('POST', '/api/files', lambda request: (200, dict(request.json(), id='f1')))
+        self.server.add_route('POST', '/api/files/f1/addchunk', {})
+        self.server.add_route('PUT', '/api/files/f1', lambda request: (200, request.json()))
+        self.server.add_route('POST', '/api/testrungroups/g1/addtestrun/t1', {'id': 'g1'})
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_metrics(self):
+        slick = SlickConnection(self.server.url, retry_policy=RetryPolicy(backoff_base=0))
+        slick.results.find()
+        result = Result()
+        result.id = '1'
+        for i in range(3):
+            slick.results(result).update()
+        self.assertRaises(SlickCommunicationError, slick.results('missing').get)
+        self.assertRaises(SlickCommunicationError, slick.results('broken').get)
+        slick.files.upload_local_file('data.bin', io.BytesIO(b'x' * 2500), chunk_size=1000)
+        testrun = Testrun()
+        testrun.id = 't1'
+        slick.testrungroups('g1').add_testrun(testrun)
+
+        metrics = slick.metrics()
+        self.assertEqual(metrics['slick.results']['GET']['requests'], 3)
+        self.assertEqual(metrics['slick.results']['GET']['retries'], 2)
+        self.assertEqual(metrics['slick.results']['GET']['status_codes'], {200: 1, 404: 1, 500: 3})
+        self.assertEqual(metrics['slick.results']['GET']['latency']['count'], 5)
+        self.assertEqual(metrics['slick.results']['PUT']['requests'], 3)
+        self.assertEqual(metrics['slick.results']['PUT']['bytes_sent'], 3 * len(result.to_json()))
+        self.assertTrue(metrics['slick.results']['PUT']['bytes_received'] > 0)
+        self.assertEqual(metrics['slick.files.addchunk']['POST']['requests'], 3)
+        self.assertEqual(metrics['slick.files.addchunk']['POST']['bytes_sent'], 2500)
+        self.assertEqual(metrics['slick.testrungroups.addtestrun']['POST']['requests'], 1)
+
+    def test_shared_metrics(self):
+        metrics = RequestMetrics()
+        for i in range(2):
+            SlickConnection(self.server.url, request_metrics=metrics).results.find()
+        self.assertEqual(metrics.snapshot()['slick.results']['GET']['requests'], 2)
+        metrics.reset()
+        self.assertEqual(metrics.snapshot(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
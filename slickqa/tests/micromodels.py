@@ -1,8 +1,13 @@
 from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+import copy
+import json
+import pickle
+import sys
 import unittest
 
 from slickqa import micromodels
-from slickqa.micromodels.models import json
+from slickqa.data import LogEntry
 
 
 class ClassCreationTestCase(unittest.TestCase):
@@ -217,6 +222,62 @@ class DateTimeFieldTestCase(unittest.TestCase):
         self.assertEqual(expected, result)
 
 
+class ISO8601TestCase(unittest.TestCase):
+
+    def setUp(self):
+        import datetime
+        from slickqa.micromodels.packages import PySO8601
+        from slickqa.micromodels.packages.PySO8601 import Timezone
+        self.datetime = datetime.datetime
+        self.parse = PySO8601.parse
+        self.PySO8601 = PySO8601
+        self.Timezone = Timezone
+
+    def tearDown(self):
+        self.PySO8601.set_memo_size(0)
+
+    def test_extended_format(self):
+        self.assertEqual(self.datetime(2010, 7, 13, 14, 1, 0, tzinfo=self.Timezone()),
+                         self.parse("2010-07-13T14:01:00Z"))
+        self.assertEqual(self.datetime(2010, 7, 13, 14, 1, 0, tzinfo=self.Timezone("+05:30")),
+                         self.parse("2010-07-13T14:01:00+0530"))
+        self.assertEqual(self.datetime(2010, 7, 13, 14, 1, 0, tzinfo=self.Timezone("-02:00")),
+                         self.parse("2010-07-13T14:01:00-02"))
+        self.assertEqual(self.datetime(2010, 7, 13, 14, 1, 0), self.parse(" 2010-07-13T14:01:00 "))
+        self.assertIsNone(self.parse("2010-07-13T14:01:00").tzinfo)
+
+    def test_fraction(self):
+        self.assertEqual(500000, self.parse("2010-07-13T14:01:00.5Z").microsecond)
+        self.assertEqual(123456, self.parse("2010-07-13T14:01:00.123456Z").microsecond)
+        self.assertEqual(123456, self.parse("2010-07-13T14:01:00.1234567Z").microsecond)
+        self.assertEqual(1000, self.parse("2010-07-13 14:01:00.001").microsecond)
+
+    def test_other_formats(self):
+        self.assertEqual(self.datetime(2010, 7, 13, 14, 1), self.parse("2010-07-13T14:01"))
+        self.assertEqual(self.datetime(2010, 7, 13, 14, 1), self.parse("20100713 14:01"))
+        self.assertEqual(self.datetime(2010, 7, 13), self.parse("2010-07-13"))
+        self.assertEqual(self.datetime(2010, 5, 3), self.parse("2010-123"))
+        self.assertEqual(self.datetime(2010, 1, 1), self.parse("2010"))
+        self.assertEqual(date.today(), self.parse("14:01:00").date())
+
+    def test_invalid(self):
+        from slickqa.micromodels.packages.PySO8601 import ParseError
+        self.assertRaises(ParseError, self.parse, "July 13th")
+        self.assertRaises(ValueError, self.parse, "2010-13-01T00:00:00Z")
+
+    def test_timezones_are_shared(self):
+        self.assertIs(self.parse("2010-07-13T14:01:00-05:00").tzinfo, self.parse("2011-01-01T00:00:00-05:00").tzinfo)
+
+    def test_memo(self):
+        self.PySO8601.set_memo_size(2)
+        first = self.parse("2010-07-13T14:01:00Z")
+        self.assertIs(first, self.parse("2010-07-13T14:01:00Z"))
+        self.parse("2010-07-13T14:02:00Z")
+        self.parse("2010-07-13T14:03:00Z")
+        self.assertEqual(first, self.parse("2010-07-13T14:01:00Z"))
+        self.assertLessEqual(len(self.PySO8601.datetimestamps._memo), 2)
+
+
 class DateFieldTestCase(unittest.TestCase):
 
     def setUp(self):
@@ -523,5 +584,299 @@ class ModelTestCase(unittest.TestCase):
         self.assertEqual(instance.to_dict()['birthday'], today)
 
 
+class DirtyTrackingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        class Entry(micromodels.Model):
+            message = micromodels.StringField()
+
+        class Record(micromodels.Model):
+            id = micromodels.StringField()
+            status = micromodels.StringField()
+            count = micromodels.IntegerField()
+            log = micromodels.ModelCollectionField(Entry)
+        self.Entry = Entry
+        self.Record = Record
+        self.data = {'id': '1', 'status': 'RUNNING', 'count': 1, 'log': [{'message': 'first'}]}
+
+    def test_from_dict_clean(self):
+        """An instance created from a dictionary is in sync with it"""
+        self.assertEqual(self.Record.from_dict(self.data).changed_fields(), set())
+
+    def test_new_instance_dirty(self):
+        record = self.Record()
+        record.status = 'PASS'
+        self.assertEqual(record.changed_fields(), set(['status']))
+
+    def test_changes(self):
+        record = self.Record.from_dict(self.data)
+        record.status = 'PASS'
+        self.assertEqual(record.changed_fields(), set(['status']))
+        self.assertEqual(record.to_changes_dict(), {'status': 'PASS'})
+        record.mark_clean()
+        self.assertEqual(record.to_changes_dict(), {})
+
+    def test_append(self):
+        """Items added to the end of a list are changes, and can be told apart from replacing the list"""
+        record = self.Record.from_dict(self.data)
+        record.log.append(self.Entry.from_dict({'message': 'second'}))
+        self.assertEqual(record.changed_fields(), set(['log']))
+        self.assertEqual([entry.message for entry in record.appended('log')], ['second'])
+        record.mark_clean('log')
+        self.assertEqual(record.appended('log'), None)
+        self.assertEqual(record.changed_fields(), set())
+
+        record.log = [{'message': 'replaced'}]
+        self.assertEqual(record.appended('log'), None)
+        self.assertEqual(record.to_changes_dict(), {'log': [{'message': 'replaced'}]})
+
+    def test_mark_dirty(self):
+        record = self.Record.from_dict(self.data)
+        record.log[0].message = 'changed'
+        self.assertEqual(record.changed_fields(), set())
+        record.mark_dirty('log')
+        self.assertEqual(record.changed_fields(), set(['log']))
+
+
+class JsonBackendTestCase(unittest.TestCase):
+
+    def setUp(self):
+        from slickqa.micromodels import jsonbackend
+        self.jsonbackend = jsonbackend
+        self.default = jsonbackend.get_backend()
+
+    def tearDown(self):
+        self.jsonbackend.set_backend(self.default)
+
+    def test_backends(self):
+        self.assertTrue('json' in self.jsonbackend.available_backends())
+        for name in self.jsonbackend.available_backends():
+            backend = self.jsonbackend.set_backend(name)
+            entry = LogEntry.from_dict(u'{"message": "caf\u00e9", "entryTime": 1500000000000}'.encode('utf-8'),
+                                       is_json=True)
+            self.assertEqual(entry.message, u'caf\u00e9')
+            self.assertTrue(isinstance(entry.to_json_bytes(), bytes))
+            self.assertEqual(json.loads(entry.to_json_bytes().decode('utf-8')), entry.to_dict(serial=True))
+            self.assertEqual(json.loads(entry.to_json()), entry.to_dict(serial=True))
+            self.assertEqual(backend.loads(backend.dumps({1: [None, 2.5]})), {'1': [None, 2.5]}, name)
+
+    def test_stdlib_bytes(self):
+        """json.loads only takes bytes from python 3.6, the backend decodes them itself before that"""
+        backend = self.jsonbackend.StdlibBackend()
+        self.assertEqual(backend.loads_text(u'{"a": "caf\u00e9"}'.encode('utf-8')), {'a': u'caf\u00e9'})
+        self.assertEqual(backend.loads_text('[1]'), [1])
+
+    def test_set_backend(self):
+        self.assertEqual(self.jsonbackend.set_backend('fastest').name, self.jsonbackend.available_backends()[0])
+        self.assertRaises(ValueError, self.jsonbackend.set_backend, 'yaml')
+        backend = self.jsonbackend.StdlibBackend()
+        self.assertTrue(self.jsonbackend.set_backend(backend) is self.jsonbackend.get_backend())
+
+
+class ModelCodecTestCase(unittest.TestCase):
+
+    def setUp(self):
+        class Base(micromodels.Model):
+            id = micromodels.StringField()
+
+        class Item(Base):
+            count = micromodels.IntegerField(source='total')
+            tags = micromodels.FieldCollectionField(micromodels.StringField())
+            child = micromodels.ModelField(Base)
+        self.Base = Base
+        self.Item = Item
+
+    def test_compiled_per_class(self):
+        self.assertEqual(set(name for name, key, convert, wrapped in self.Item._codec.decoders),
+                         set(['id', 'count', 'tags', 'child']))
+        self.assertEqual([name for name, key, convert, wrapped in self.Base._codec.decoders], ['id'])
+
+    def test_round_trip(self):
+        data = {'id': '1', 'total': '3', 'tags': ['a', 'b'], 'child': {'id': '2'}, 'unknown': True}
+        item = self.Item.from_dict(data)
+        self.assertEqual(item.count, 3)
+        self.assertEqual(item.child.id, '2')
+        self.assertEqual(item.to_dict(serial=True), {'id': '1', 'count': 3, 'tags': ['a', 'b'], 'child': {'id': '2'}})
+        self.assertFalse(hasattr(item, 'unknown'))
+
+    def test_none_sub_object_skipped(self):
+        item = self.Item.from_dict({'id': '1', 'child': None})
+        self.assertFalse(hasattr(item, 'child'))
+        self.assertEqual(item.to_dict(), {'id': '1'})
+
+    def test_set_data_marks_changes(self):
+        item = self.Item.from_dict({'id': '1'})
+        item.set_data({'total': 2, 'tags': []})
+        self.assertEqual(item.changed_fields(), set(['count', 'tags']))
+
+
+class CompactLogEntry(LogEntry):
+    _compact = True
+
+
+class CompactModelTestCase(unittest.TestCase):
+
+    def setUp(self):
+        class Point(micromodels.Model):
+            _compact = True
+            x = micromodels.IntegerField()
+            y = micromodels.IntegerField()
+            tags = micromodels.FieldCollectionField(micromodels.StringField())
+
+        class NamedPoint(Point):
+            name = micromodels.StringField()
+        self.Point = Point
+        self.NamedPoint = NamedPoint
+
+    def test_slots(self):
+        self.assertEqual(self.Point.__slots__, ('x', 'y', 'tags', '__dict__'))
+        self.assertEqual(self.NamedPoint.__slots__, ('name',))
+        point = self.NamedPoint.from_dict({'x': 1, 'y': '2', 'name': 'origin'})
+        self.assertEqual((point.x, point.y, point.name), (1, 2, 'origin'))
+        self.assertEqual(point.to_dict(serial=True), {'x': 1, 'y': 2, 'name': 'origin'})
+        self.assertFalse(hasattr(point, 'tags'))
+
+    def test_add_field(self):
+        point = self.Point.from_dict({'x': 1})
+        point.add_field('z', '3', micromodels.IntegerField())
+        point.label = 'not a field'
+        self.assertEqual(point.to_dict(), {'x': 1, 'z': 3})
+        self.assertEqual(point.label, 'not a field')
+
+    def test_changes(self):
+        point = self.Point.from_dict({'x': 1, 'tags': ['a']})
+        self.assertEqual(point.changed_fields(), set())
+        point.y = 2
+        point.tags.append('b')
+        self.assertEqual(point.changed_fields(), set(['y', 'tags']))
+        self.assertEqual(point.appended('tags'), ['b'])
+        point.mark_clean()
+        self.assertEqual(point.to_changes_dict(), {})
+
+    def test_compact_subclass(self):
+        """A compact subclass of a regular model keeps the inherited fields in slots too"""
+        self.assertFalse(LogEntry._compact)
+        self.assertTrue('message' in CompactLogEntry.__slots__)
+        entry = CompactLogEntry.from_dict({'message': 'hello'})
+        self.assertFalse(entry.__dict__)
+        self.assertEqual(entry.to_dict(), {'message': 'hello'})
+
+    def test_copy(self):
+        entry = CompactLogEntry.from_dict({'message': 'hello', 'exceptionStackTrace': ['line 1']})
+        entry.level = 'INFO'
+        for copied in (copy.deepcopy(entry), pickle.loads(pickle.dumps(entry))):
+            self.assertEqual(copied.to_dict(), entry.to_dict())
+            self.assertEqual(copied.changed_fields(), set(['level']))
+
+
+class LazyDecodeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        class Entry(micromodels.Model):
+            _compact = True
+            message = micromodels.StringField()
+
+        class Record(micromodels.Model):
+            id = micromodels.StringField()
+            status = micromodels.StringField()
+            count = micromodels.IntegerField()
+            log = micromodels.ModelCollectionField(Entry)
+            parent = micromodels.ModelField(Entry)
+        self.Entry = Entry
+        self.Record = Record
+        self.data = {'id': '1', 'status': 'PASS', 'count': '2', 'log': [{'message': 'first'}], 'parent': None}
+
+    def test_converted_when_read(self):
+        record = self.Record.from_dict(self.data, lazy=True)
+        self.assertTrue(isinstance(record, self.Record))
+        self.assertEqual(type(record).__name__, 'Record')
+        self.assertEqual(record.status, 'PASS')
+        self.assertEqual(sorted(key for key in vars(record) if not key.startswith('_')), ['status'])
+        self.assertEqual(record.count, 2)
+        self.assertEqual(record.log[0].message, 'first')
+        self.assertFalse(hasattr(record, 'parent'))
+        self.assertRaises(AttributeError, getattr, record, 'missing')
+
+    def test_same_as_eager(self):
+        record = self.Record.from_dict(self.data, lazy=True)
+        self.assertEqual(record.changed_fields(), set())
+        record.status = 'FAIL'
+        self.assertEqual(record.to_dict(serial=True), dict(self.Record.from_dict(self.data).to_dict(serial=True),
+                                                           status='FAIL'))
+        self.assertEqual(record.changed_fields(), set(['status']))
+        # once everything is converted it's a regular instance
+        self.assertTrue(type(record) is self.Record)
+
+    def test_log_appended(self):
+        record = self.Record.from_dict(self.data, lazy=True)
+        record.log.append(self.Entry.from_dict({'message': 'second'}))
+        self.assertEqual([entry.message for entry in record.appended('log')], ['second'])
+
+    def test_compact(self):
+        entry = self.Entry.from_dict({'message': 'hello'}, lazy=True)
+        self.assertEqual(entry.message, 'hello')
+        self.assertEqual(entry.to_dict(), {'message': 'hello'})
+
+    def test_copy(self):
+        entry = LogEntry.from_dict({'message': 'hello'}, lazy=True)
+        for copied in (copy.deepcopy(entry), pickle.loads(pickle.dumps(entry))):
+            self.assertTrue(type(copied) is LogEntry)
+            self.assertEqual(copied.message, 'hello')
+
+
+class ConcurrentDecodeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        class Upper(micromodels.BaseField):
+            # written the old way, populate and to_python only
+            def to_python(self):
+                return self.data.upper()
+
+        class Child(micromodels.Model):
+            name = micromodels.StringField()
+
+        class Parent(micromodels.Model):
+            name = Upper()
+            numbers = micromodels.FieldCollectionField(micromodels.IntegerField())
+            favorite = micromodels.ModelField(Child, related_name='parent')
+            children = micromodels.ModelCollectionField(Child, related_name='parent')
+        self.Parent = Parent
+        self.payloads = [{'name': 'parent %d' % i, 'numbers': [str(i)] * 5, 'favorite': {'name': str(i)},
+                          'children': [{'name': '%d.%d' % (i, j)} for j in range(5)]} for i in range(100)]
+        # switch threads as often as possible, to give them every chance to mix up data
+        if hasattr(sys, 'setswitchinterval'):
+            self.switch_interval = sys.getswitchinterval()
+            sys.setswitchinterval(1e-6)
+        else:
+            # python 2 switches every so many bytecodes instead
+            self.check_interval = sys.getcheckinterval()
+            sys.setcheckinterval(1)
+
+    def tearDown(self):
+        if hasattr(sys, 'setswitchinterval'):
+            sys.setswitchinterval(self.switch_interval)
+        else:
+            sys.setcheckinterval(self.check_interval)
+
+    def decode(self, offset):
+        errors = []
+        for data in self.payloads[offset:] + self.payloads[:offset]:
+            parent = self.Parent.from_dict(data)
+            if parent.name != data['name'].upper() or parent.numbers != [int(n) for n in data['numbers']] or \
+                    parent.favorite.name != data['favorite']['name'] or \
+                    [child.name for child in parent.children] != [child['name'] for child in data['children']] or \
+                    not all(child.parent is parent for child in parent.children + [parent.favorite]):
+                errors.append(data['name'])
+        return errors
+
+    def test_many_threads(self):
+        pool = ThreadPoolExecutor(16)
+        try:
+            errors = list(pool.map(self.decode, range(0, 100, 5)))
+        finally:
+            pool.shutdown()
+        self.assertEqual(errors, [[]] * 20)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,308 @@
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+try:
+    from urllib.parse import parse_qs
+except ImportError:
+    from urlparse import parse_qs
+
+from slickqa import SlickQA, SlickCommunicationError, Result, ResultStatus, RunStatus, Testcase
+from slickqa.tests.stubserver import StubSlickServer
+
+
+class FakeSlick(object):
+    """Just enough of slick (kept in memory) for SlickQA to report to."""
+
+    def __init__(self, server):
+        self.server = server
+        self.lock = threading.Lock()
+        self.next_id = 0
+        self.testcases = {}
+        self.results = {}
+        self.testruns = {}
+        self.delay = 0
+        self.available = True
+        self.project = {'id': 'p1', 'name': 'project', 'components': [],
+                        'releases': [{'id': 'r1', 'name': '1.0', 'builds': [{'id': 'b1', 'name': '1'}]}]}
+        server.add_route('GET', '/api/version', [{'productName': 'slick', 'versionString': '1.0'}])
+        server.add_route('GET', '/api/projects/byname/project', self.project)
+        server.add_route('POST', '/api/testruns', lambda request: self.create(self.testruns, request.json()))
+        server.add_route('PUT', '/api/testruns/([^/]+)', lambda request: self.update(self.testruns, request))
+        server.add_route('GET', '/api/testcases', self.find_testcases)
+        server.add_route('POST', '/api/testcases', lambda request: self.create(self.testcases, request.json()))
+        server.add_route('PUT', '/api/testcases/([^/]+)', lambda request: self.update(self.testcases, request))
+        server.add_route('POST', '/api/results', self.create_result)
+        server.add_route('PUT', '/api/results/([^/]+)', lambda request: self.update(self.results, request))
+        server.add_route('POST', '/api/results/([^/]+)/log', self.add_log)
+
+    def create(self, store, obj):
+        with self.lock:
+            self.next_id += 1
+            obj['id'] = str(self.next_id)
+            store[obj['id']] = obj
+        return 200, obj
+
+    def update(self, store, request):
+        obj = request.json()
+        id = request.path.rsplit('/', 1)[1]
+        with self.lock:
+            if id not in store:
+                return 404, {}
+            store[id].update(obj)
+            return 200, store[id]
+
+    def find_testcases(self, request):
+        query = dict((key, values[0]) for key, values in parse_qs(request.query).items())
+        query.pop('projectid', None)
+        with self.lock:
+            return 200, [testcase for testcase in self.testcases.values()
+                         if all(testcase.get(key) == value for key, value in query.items())]
+
+    def add_log(self, request):
+        id = request.path.split('/')[-2]
+        with self.lock:
+            self.results[id].setdefault('log', []).extend(request.json())
+        return 200, {}
+
+    def create_result(self, request):
+        time.sleep(self.delay)
+        if not self.available:
+            return 503, {}
+        result = request.json()
+        if result['testcase']['name'] == 'rejected':
+            return 400, {}
+        return self.create(self.results, result)
+
+
+class SlickQATestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubSlickServer().start()
+        self.slick = FakeSlick(self.server)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def connect(self):
+        slickqa = SlickQA(self.server.url, 'project', '1.0', '1')
+        self.assertTrue(slickqa.is_connected)
+        return slickqa
+
+    def test_file_result(self):
+        slickqa = self.connect()
+        slickqa.add_log_entry("queued")
+        result = slickqa.file_result("First Test", status=ResultStatus.PASS)
+        self.assertEqual(result.status, ResultStatus.PASS)
+        self.assertEqual(result.log[0].message, "queued")
+        self.assertEqual(len(self.slick.testcases), 1)
+
+        # the second result for the same test should find the existing testcase
+        slickqa.file_result("First Test")
+        self.assertEqual(len(self.slick.testcases), 1)
+        self.assertEqual(len(self.slick.results), 2)
+
+    def test_file_results(self):
+        slickqa = self.connect()
+        names = ["Test {}".format(i % 40) for i in range(100)]
+        filed = slickqa.file_results([{'name': name, 'status': ResultStatus.NO_RESULT,
+                                       'runstatus': RunStatus.TO_BE_RUN} for name in names], max_workers=8)
+        self.assertEqual(len(filed), 100)
+        for name, result in zip(names, filed):
+            self.assertTrue(isinstance(result, Result))
+            self.assertEqual(result.testcase.name, name)
+            self.assertEqual(result.runstatus, RunStatus.TO_BE_RUN)
+        # a testcase is only created once, even when results for it are filed at the same time
+        self.assertEqual(len(self.slick.testcases), 40)
+        self.assertEqual(len(self.slick.results), 100)
+        self.assertEqual(len(set(result.id for result in filed)), 100)
+
+    def test_file_results_failures(self):
+        """One result failing to be filed should not stop the others"""
+        slickqa = self.connect()
+        testcase = Testcase()
+        testcase.automationId = 'auto.test'
+        filed = slickqa.file_results(["one", "rejected", {'name': 'three', 'testdata': testcase}])
+        self.assertEqual(filed[0].testcase.name, "one")
+        self.assertTrue(isinstance(filed[1], SlickCommunicationError))
+        self.assertEqual(filed[2].testcase.name, "three")
+        self.assertEqual(filed[2].testcase.automationId, "auto.test")
+
+    def test_file_results_bad_items(self):
+        """An item without a name, or with testdata that only has an automationKey, shouldn't abort the batch"""
+        slickqa = self.connect()
+        keyed = Testcase()
+        keyed.automationKey = 'key-1'
+        filed = slickqa.file_results(["one", {'status': ResultStatus.PASS}, {'name': 'keyed', 'testdata': keyed},
+                                      "four"])
+        self.assertEqual(filed[0].testcase.name, "one")
+        self.assertTrue(isinstance(filed[1], Exception))
+        self.assertEqual(filed[2].testcase.name, "keyed")
+        self.assertEqual(filed[3].testcase.name, "four")
+        self.assertEqual(len(self.slick.results), 3)
+
+    def test_find_by_automation_key(self):
+        self.slick.testcases['t1'] = {'id': 't1', 'name': 'Keyed Test', 'automationKey': 'key-1'}
+        slickqa = self.connect()
+        testdata = Testcase()
+        testdata.automationKey = 'key-1'
+        result = slickqa.file_result("Keyed Test", testdata=testdata)
+        self.assertEqual(result.testcase.testcaseId, 't1')
+        self.assertEqual(len(self.slick.testcases), 1)
+
+    def test_testcase_catalog(self):
+        """With the catalog, the testcases are only fetched from slick once"""
+        self.slick.testcases['t1'] = {'id': 't1', 'name': 'Existing Test'}
+        self.slick.testcases['t2'] = {'id': 't2', 'name': 'Automated Test', 'automationId': 'auto.test'}
+        slickqa = SlickQA(self.server.url, 'project', '1.0', '1', testcase_catalog=True)
+        self.assertEqual(len(slickqa.catalog), 2)
+        testdata = Testcase()
+        testdata.automationId = 'auto.test'
+        testdata.automationKey = 'auto-key'
+        filed = [slickqa.file_result("Existing Test"), slickqa.file_result("New Test"),
+                 slickqa.file_result("New Test"), slickqa.file_result("Renamed Test", testdata=testdata)]
+        filed += slickqa.file_results(["Test {}".format(i % 5) for i in range(20)])
+
+        self.assertEqual([result.testcase.testcaseId for result in filed[:2]], ['t1', filed[2].testcase.testcaseId])
+        self.assertEqual(filed[3].testcase.testcaseId, 't2')
+        self.assertEqual(self.slick.testcases['t2']['name'], 'Renamed Test')
+        # the new testcases were only created once, and the update is in the catalog
+        self.assertEqual(len(self.slick.testcases), 8)
+        self.assertEqual(slickqa.catalog.get('name', 'Renamed Test').id, 't2')
+        self.assertIsNone(slickqa.catalog.get('name', 'Automated Test'))
+        self.assertEqual(slickqa.catalog.get('automationKey', 'auto-key').id, 't2')
+        self.assertEqual(len([request for request in self.server.requests
+                              if request.method == 'GET' and request.path == '/api/testcases']), 1)
+
+
+    def test_spooled(self):
+        """With a spool, filing results shouldn't wait on slick"""
+        spool_dir = tempfile.mkdtemp()
+        try:
+            slickqa = SlickQA(self.server.url, 'project', '1.0', '1', spool_dir=spool_dir)
+            self.slick.delay = 0.1
+            start = time.time()
+            results = [slickqa.file_result("Test {}".format(i % 2), status=ResultStatus.NO_RESULT) for i in range(5)]
+            self.assertLess(time.time() - start, 0.1)
+            self.assertTrue(results[0].id.startswith('spool-'))
+            results[0].status = ResultStatus.PASS
+            results[0].update()
+            slickqa.finish_testrun()
+            self.assertTrue(slickqa.close(10))
+
+            self.assertEqual(len(self.slick.testcases), 2)
+            self.assertEqual(len(self.slick.results), 5)
+            first = self.slick.results[slickqa.spool.server_id(results[0].id)]
+            self.assertEqual(first['status'], 'PASS')
+            self.assertEqual(first['testcase']['name'], 'Test 0')
+            self.assertTrue(first['testcase']['testcaseId'] in self.slick.testcases)
+            self.assertEqual(self.slick.testruns[slickqa.testrun.id]['state'], RunStatus.FINISHED)
+        finally:
+            shutil.rmtree(spool_dir)
+
+    def test_spool_restart(self):
+        """Results spooled while slick was down are filed by the next run on the same spool"""
+        spool_dir = tempfile.mkdtemp()
+        try:
+            self.slick.available = False
+            first = SlickQA(self.server.url, 'project', '1.0', '1', spool_dir=spool_dir)
+            for i in range(3):
+                first.file_result("Test {}".format(i))
+            self.assertFalse(first.close(0))
+
+            self.slick.available = True
+            second = SlickQA(self.server.url, 'project', '1.0', '1', spool_dir=spool_dir)
+            self.assertTrue(second.close(10))
+            self.assertEqual(second.spool.stats()['failed'], 0)
+            self.assertEqual(sorted(result['testcase']['name'] for result in self.slick.results.values()),
+                             ['Test 0', 'Test 1', 'Test 2'])
+        finally:
+            shutil.rmtree(spool_dir)
+
+    def test_spooled_automation_key(self):
+        """Testdata with only an automationKey can be spooled"""
+        spool_dir = tempfile.mkdtemp()
+        try:
+            slickqa = SlickQA(self.server.url, 'project', '1.0', '1', spool_dir=spool_dir)
+            testdata = Testcase()
+            testdata.automationKey = 'key-1'
+            result = slickqa.file_result("Keyed Test", testdata=testdata)
+            self.assertTrue(result.id.startswith('spool-'))
+            self.assertTrue(slickqa.close(10))
+            self.assertEqual([testcase['automationKey'] for testcase in self.slick.testcases.values()], ['key-1'])
+            self.assertEqual(len(self.slick.results), 1)
+        finally:
+            shutil.rmtree(spool_dir)
+
+
+    def test_init(self):
+        """A new release and build are created, without fetching the project again"""
+        def slowly(response):
+            def respond(request):
+                time.sleep(0.2)
+                return 200, response
+            return respond
+
+        self.server.add_route('GET', '/api/testplans', slowly([]))
+        self.server.add_route('POST', '/api/testplans', lambda request: (200, dict(request.json(), id='tp1')))
+        self.server.add_route('GET', '/api/configurations', slowly([]))
+        self.server.add_route('POST', '/api/configurations', lambda request: (200, dict(request.json(), id='c1')))
+        self.server.add_route('GET', '/api/testrungroups', slowly([{'id': 'g1', 'name': 'group'}]))
+        self.server.add_route('POST', '/api/testrungroups/g1/addtestrun/([^/]+)', {'id': 'g1', 'name': 'group'})
+        self.server.add_route('POST', '/api/projects/p1/releases', lambda request: (200, dict(request.json(), id='r2')))
+        self.server.add_route('POST', '/api/projects/p1/releases/r2/builds',
+                              lambda request: (200, dict(request.json(), id='b2')))
+
+        start = time.time()
+        slickqa = SlickQA(self.server.url, 'project', '2.0', '7', test_plan='plan', environment_name='env',
+                          test_run_group_name='group')
+        # the three lookups were made at the same time
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEqual(slickqa.testplan.id, 'tp1')
+        self.assertEqual(slickqa.environment.id, 'c1')
+        self.assertEqual(slickqa.testrun_group.id, 'g1')
+        self.assertEqual((slickqa.releaseref.releaseId, slickqa.buildref.buildId), ('r2', 'b2'))
+        testrun = self.slick.testruns[slickqa.testrun.id]
+        self.assertEqual((testrun['testplanId'], testrun['config']['configId']), ('tp1', 'c1'))
+        self.assertEqual(len([request for request in self.server.requests
+                              if request.path == '/api/projects/byname/project']), 1)
+
+    def test_reference_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            path = cache_dir + '/references.json'
+            first = SlickQA(self.server.url, 'project', '1.0', '1', reference_cache=path)
+            second = SlickQA(self.server.url, 'project', '1.0', '1', reference_cache=path)
+            self.assertEqual(len([request for request in self.server.requests
+                                  if request.path == '/api/projects/byname/project']), 1)
+            self.assertEqual(second.project.id, 'p1')
+            self.assertEqual(second.releaseref.to_dict(), first.releaseref.to_dict())
+            self.assertEqual(second.buildref.to_dict(), first.buildref.to_dict())
+            result = second.file_result("Cached Test")
+            self.assertEqual((result.project.id, result.release.releaseId, result.build.buildId), ('p1', 'r1', 'b1'))
+
+            # a different build is a different entry
+            self.server.add_route('POST', '/api/projects/p1/releases/r1/builds',
+                                  lambda request: (200, dict(request.json(), id='b2')))
+            SlickQA(self.server.url, 'project', '1.0', '2', reference_cache=path)
+            self.assertEqual(len([request for request in self.server.requests
+                                  if request.path == '/api/projects/byname/project']), 2)
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_log_shipper(self):
+        slickqa = SlickQA(self.server.url, 'project', '1.0', '1', log_shipper=True)
+        slickqa.add_log_entry("before")
+        result = slickqa.file_result("Logging Test")
+        for i in range(5):
+            result.add_log_entry("during {}".format(i))
+        self.assertFalse(hasattr(result, 'log') and result.log)
+        self.assertTrue(slickqa.close(5))
+        self.assertEqual([log['message'] for log in self.slick.results[result.id]['log']],
+                         ['before'] + ['during {}'.format(i) for i in range(5)])
+
+
+if __name__ == "__main__":
+    unittest.main()
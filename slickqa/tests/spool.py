@@ -0,0 +1,175 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from slickqa import SlickConnection, Result, ResultStatus, LogEntry
+from slickqa.retry import RetryPolicy
+from slickqa.spool import Spool
+from slickqa.tests.stubserver import StubSlickServer
+
+
+class SpoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubSlickServer().start()
+        self.directory = tempfile.mkdtemp()
+        self.available = True
+        self.next_id = 0
+
+        def create(request):
+            if not self.available:
+                return 503, {}
+            self.next_id += 1
+            return 200, dict(request.json(), id=str(self.next_id))
+
+        def update(request):
+            if not self.available:
+                return 503, {}
+            return 200, request.json()
+        self.server.add_route('POST', '/api/results', create)
+        self.server.add_route('PUT', '/api/results/[^/]+', update)
+        self.server.add_route('POST', '/api/testruns', {}, status=400)
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def connect(self):
+        return SlickConnection(self.server.url, retry_policy=RetryPolicy(max_attempts=1))
+
+    def sent(self, method):
+        return [request for request in self.server.requests if request.method == method]
+
+    def test_temporary_ids_replaced(self):
+        spool = Spool(self.directory, self.connect(), retry_interval=0.01)
+        result = Result()
+        result.status = ResultStatus.NO_RESULT
+        temp_id = spool.create('results', result)
+        self.assertEqual(result.id, temp_id)
+        result.status = ResultStatus.PASS
+        spool.update('results', result)
+        self.assertTrue(spool.close(5))
+        self.assertEqual(spool.server_id(temp_id), '1')
+        put = self.sent('PUT')[0]
+        self.assertEqual(put.path, '/api/results/1')
+        self.assertEqual(put.json()['status'], 'PASS')
+        self.assertTrue('id' not in self.sent('POST')[0].json())
+
+    def test_log_appended(self):
+        self.server.add_route('POST', '/api/results/([^/]+)/log', {})
+        spool = Spool(self.directory, self.connect(), retry_interval=0.01)
+        result = Result()
+        result.log = []
+        spool.create('results', result)
+        for i in range(3):
+            entry = LogEntry()
+            entry.message = str(i)
+            result.log.append(entry)
+            spool.update('results', result, append=('log',))
+        self.assertTrue(spool.close(5))
+        logs = [request for request in self.server.requests if request.path == '/api/results/1/log']
+        self.assertEqual([request.json()[0]['message'] for request in logs], ['0', '1', '2'])
+        self.assertEqual(self.sent('PUT'), [])
+
+    def test_slick_down(self):
+        """Entries are kept, in order, until slick comes back"""
+        self.available = False
+        spool = Spool(self.directory, self.connect(), retry_interval=0.01, max_retry_interval=0.05)
+        results = []
+        for i in range(5):
+            result = Result()
+            result.reason = str(i)
+            spool.create('results', result)
+            results.append(result)
+        self.assertFalse(spool.flush(0.2))
+        self.assertEqual(spool.pending_count(), 5)
+        self.available = True
+        self.assertTrue(spool.close(5))
+        self.assertEqual([spool.server_id(result.id) for result in results], ['1', '2', '3', '4', '5'])
+        self.assertEqual(os.path.getsize(spool.journal_path), 0)
+
+    def test_survives_restart(self):
+        self.available = False
+        spool = Spool(self.directory, self.connect(), start=False)
+        result = Result()
+        spool.create('results', result)
+        self.assertEqual(spool.update('results', result), None)
+        result.status = ResultStatus.PASS
+        spool.update('results', result)
+        spool.close(0)
+
+        self.available = True
+        restarted = Spool(self.directory, self.connect(), retry_interval=0.01)
+        self.assertEqual(restarted.pending_count(), 2)
+        self.assertTrue(restarted.close(5))
+        self.assertEqual(self.sent('PUT')[0].path, '/api/results/1')
+        self.assertEqual(Spool(self.directory, self.connect(), start=False).pending_count(), 0)
+
+    def test_acknowledgements_compacted(self):
+        spool = Spool(self.directory, self.connect(), retry_interval=0.01, compact_after=3)
+        results = [Result() for i in range(10)]
+        for result in results:
+            spool.create('results', result)
+        self.assertTrue(spool.close(5))
+        with open(spool.acks_path) as acks:
+            self.assertTrue(len(acks.readlines()) < 10)
+        reopened = Spool(self.directory, self.connect(), start=False)
+        self.assertEqual(reopened.acked, 10)
+        self.assertEqual([reopened.server_id(result.id) for result in results], [str(i) for i in range(1, 11)])
+        reopened.close(0)
+
+    def test_incomplete_acknowledgement_ignored(self):
+        spool = Spool(self.directory, self.connect(), retry_interval=0.01)
+        result = Result()
+        spool.create('results', result)
+        self.assertTrue(spool.close(5))
+        with open(spool.acks_path, 'a') as acks:
+            acks.write('{"seq": 2, "id')
+        reopened = Spool(self.directory, self.connect(), retry_interval=0.01)
+        self.assertEqual(reopened.server_id(result.id), '1')
+        reopened.create('results', Result())
+        self.assertTrue(reopened.close(5))
+        self.assertEqual(Spool(self.directory, self.connect(), start=False).acked, 2)
+
+    def test_handler_registered_late(self):
+        """An entry left by a previous run waits for it's handler instead of failing"""
+        spool = Spool(self.directory, self.connect(), start=False)
+        spool.register('custom', lambda data: None)
+        spool.submit('custom', {'value': 1})
+        spool.close(0)
+
+        handled = []
+        restarted = Spool(self.directory, self.connect(), retry_interval=0.01)
+        self.assertFalse(restarted.flush(0.1))
+        restarted.register('custom', handled.append)
+        self.assertTrue(restarted.close(5))
+        self.assertEqual(handled, [{'value': 1}])
+        self.assertEqual(restarted.stats()['failed'], 0)
+
+    def test_incomplete_entry_ignored(self):
+        spool = Spool(self.directory, self.connect(), start=False)
+        spool.create('results', Result())
+        spool.close(0)
+        with open(spool.journal_path, 'a') as journal:
+            journal.write('{"seq": 2, "op": "cre')
+        reopened = Spool(self.directory, self.connect(), start=False)
+        self.assertEqual(reopened.pending_count(), 1)
+        reopened.create('results', Result())
+        reopened.close(0)
+        self.assertEqual(Spool(self.directory, self.connect(), start=False).pending_count(), 2)
+
+    def test_rejected_entry_set_aside(self):
+        spool = Spool(self.directory, self.connect(), retry_interval=0.01)
+        spool.create('testruns', Result())
+        spool.create('results', Result())
+        self.assertTrue(spool.close(5))
+        self.assertEqual(spool.stats(), {'pending': 0, 'replayed': 2, 'failed': 1})
+        with open(spool.failed_path) as failed:
+            self.assertEqual(json.loads(failed.readline())['data']['path'], 'testruns')
+        self.assertEqual(len(self.sent('POST')), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
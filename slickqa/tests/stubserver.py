@@ -0,0 +1,122 @@
+"""
+A tiny threaded http server that answers the way slick would, used by the tests and benchmarks so that the client
+can be exercised without a real slick instance.
+"""
+import json
+import re
+import threading
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+
+class StubRequest(object):
+    """A record of a request the stub server received."""
+
+    def __init__(self, method, path, query, headers, body, client_address):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+        self.client_address = client_address
+
+    def json(self):
+        return json.loads(self.body.decode('utf-8'))
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    wbufsize = -1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        path, _, query = self.path.partition('?')
+        request = StubRequest(self.command, path, query, dict(self.headers.items()), body, self.client_address)
+        status, payload, content_type = self.server.stub.dispatch(request)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        if self.headers.get('Connection', '').lower() == 'close':
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = _handle
+    do_POST = _handle
+    do_PUT = _handle
+    do_DELETE = _handle
+
+
+class StubSlickServer(object):
+    """Serve canned responses on localhost.  Routes are matched (in the order they were added) on the http method and
+    a regular expression matched against the whole path.  A route response can either be a value which is serialized
+    as json, raw bytes, or a callable that takes the StubRequest and returns (status, response).
+
+    Example:
+        with StubSlickServer() as server:
+            server.add_route('GET', '/api/projects', [{'name': 'foo'}])
+            slick = SlickConnection(server.url)
+    """
+
+    def __init__(self):
+        self.routes = []
+        self.requests = []
+        self.connections = set()
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:%d" % self.server.server_address[1]
+
+    def add_route(self, method, path, response, status=200):
+        self.routes.append((method, re.compile(path + '$'), response, status))
+
+    def dispatch(self, request):
+        with self.lock:
+            self.requests.append(request)
+            self.connections.add(request.client_address)
+        for method, path, response, status in self.routes:
+            if method == request.method and path.match(request.path):
+                if callable(response):
+                    status, response = response(request)
+                if isinstance(response, bytes):
+                    return status, response, 'application/octet-stream'
+                return status, json.dumps(response).encode('utf-8'), 'application/json'
+        return 404, b'', 'text/plain'
+
+    def start(self):
+        self.server = _ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+        self.server.stub = self
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()